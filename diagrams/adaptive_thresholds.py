@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Staleness thresholds learned from observed state dwell times (logical flow §8).
+
+The §8 thresholds are one table for every repo. A repo whose builds
+regularly take 90 minutes is remediated while its builds are still
+healthy. A repo whose builds take 8 minutes waits an hour before a hung
+build is noticed. DwellTracker learns the thresholds instead.
+
+The Event Processor calls observe() whenever it records a PR's state. The
+tracker keeps one open dwell per PR, measured from the PR's latest event,
+because that is the timestamp the reconciler's age is measured from. When
+the state changes, the dwell is added to the sketch for its
+``(repo, state)``. A dwell the system itself ended, through a remediation
+or a drift correction, says nothing about the pipeline's own timing, so
+discard() drops it.
+
+Each sketch is a P² estimator (Jain & Chlamtac, 1985): five markers, so
+memory stays constant however many PRs pass through. threshold() is the
+sketch's p99 times ``headroom``, clamped to the state's (floor, ceiling) in
+ADAPTIVE_LIMITS. Until a sketch has ``min_samples`` dwells, and for states
+not in ADAPTIVE_LIMITS, it is the §8 threshold. stale_after(repo) returns
+a whole table in the form of state_machine.STALE_AFTER_SECONDS, for
+StaleIndex and for PRFacts.stale_after.
+
+Run this module to replay fast, typical and slow repos through fixed and
+learned thresholds:
+
+    python adaptive_thresholds.py --prs 3000
+"""
+
+import argparse
+import bisect
+import math
+import random
+
+from state_machine import STALE_AFTER_SECONDS, State
+
+# (floor, ceiling) in minutes for states whose dwell the pipeline decides. CHECKS_FAILED
+# and POLICY_FAILED wait on remediation itself, so they keep their §8 thresholds.
+ADAPTIVE_LIMITS = {
+    State.CREATED: (2, 20),
+    State.CHECKS_RUNNING: (15, 180),
+    State.CHECKS_PASSED: (10, 90),
+    State.POLICY_EVALUATING: (10, 90),
+    State.POLICY_PASSED: (5, 60),
+    State.APPROVED: (5, 45),
+    State.MERGING: (2, 20),
+}
+
+QUANTILE = 0.99
+HEADROOM = 1.25
+MIN_SAMPLES = 50
+REFRESH_EVERY = 50  # new dwells in a repo before its stale_after() table is rebuilt
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile in constant memory (the P² algorithm)."""
+
+    __slots__ = ("p", "count", "_heights", "_positions", "_desired", "_increments")
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self._heights
+        if len(q) < 5:
+            bisect.insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self._desired
+        for i in range(5):
+            desired[i] += self._increments[i]
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])  # linear fallback
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        """The current estimate, or None before any observation."""
+        q = self._heights
+        if self.count > 5:
+            return q[2]
+        return q[min(len(q) - 1, int(self.p * len(q)))] if q else None
+
+
+class DwellTracker:
+    def __init__(self, limits=ADAPTIVE_LIMITS, quantile=QUANTILE, headroom=HEADROOM,
+                 min_samples=MIN_SAMPLES, default=STALE_AFTER_SECONDS):
+        self.limits = {state: (floor * 60.0, ceiling * 60.0) for state, (floor, ceiling) in limits.items()}
+        self.quantile = quantile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.default = default
+        self._sketches = {}  # (repo, state) → P2Quantile
+        self._open = {}      # (repo, pr_number) → (state, timestamp of its latest event)
+        self._tables = {}    # repo → (dwells recorded when built, stale_after table)
+        self._recorded = {}  # repo → dwells recorded
+
+    def observe(self, repo, pr_number, state, timestamp):
+        """The PR is in ``state`` as of an event at ``timestamp``."""
+        key = (repo, pr_number)
+        state = State(state)
+        current = self._open.get(key)
+        if current is not None and current[0] is not state and current[0] in self.limits:
+            sketch = self._sketches.get((repo, current[0]))
+            if sketch is None:
+                sketch = self._sketches[(repo, current[0])] = P2Quantile(self.quantile)
+            sketch.add(max(timestamp - current[1], 0.0))
+            self._recorded[repo] = self._recorded.get(repo, 0) + 1
+        if STALE_AFTER_SECONDS[state] == float("inf"):
+            self._open.pop(key, None)  # MERGED, CLOSED, NEEDS_INTERVENTION
+        else:
+            self._open[key] = (state, timestamp)
+
+    def discard(self, repo, pr_number):
+        """Forget the PR's open dwell: the reconciler is about to end it, or its end was missed."""
+        self._open.pop((repo, pr_number), None)
+
+    def samples(self, repo, state):
+        sketch = self._sketches.get((repo, State(state)))
+        return sketch.count if sketch is not None else 0
+
+    def threshold(self, repo, state):
+        """Seconds after its latest event at which a PR of ``repo`` in ``state`` is stale."""
+        state = State(state)
+        limits = self.limits.get(state)
+        sketch = self._sketches.get((repo, state))
+        if limits is None or sketch is None or sketch.count < self.min_samples:
+            return self.default[state]
+        floor, ceiling = limits
+        return min(max(sketch.value() * self.headroom, floor), ceiling)
+
+    def stale_after(self, repo):
+        """``repo``'s thresholds indexed by State value, rebuilt every REFRESH_EVERY new dwells."""
+        recorded = self._recorded.get(repo, 0)
+        cached = self._tables.get(repo)
+        if cached is not None and recorded - cached[0] < REFRESH_EVERY:
+            return cached[1]
+        table = tuple(self.threshold(repo, state) for state in State)
+        self._tables[repo] = (recorded, table)
+        return table
+
+
+# Median dwell in minutes per state for three kinds of repo (lognormal, sigma 0.5).
+REPO_PROFILES = {
+    "fast": {State.CREATED: 1, State.CHECKS_RUNNING: 8, State.CHECKS_PASSED: 1, State.POLICY_EVALUATING: 3,
+             State.POLICY_PASSED: 2, State.APPROVED: 1, State.MERGING: 0.5},
+    "typical": {State.CREATED: 2, State.CHECKS_RUNNING: 25, State.CHECKS_PASSED: 2, State.POLICY_EVALUATING: 8,
+                State.POLICY_PASSED: 4, State.APPROVED: 2, State.MERGING: 1},
+    "slow": {State.CREATED: 3, State.CHECKS_RUNNING: 45, State.CHECKS_PASSED: 5, State.POLICY_EVALUATING: 20,
+             State.POLICY_PASSED: 6, State.APPROVED: 3, State.MERGING: 1},
+}
+
+
+def replay(tracker, prs, p_hang=0.02, reconcile_every=300.0, seed=4):
+    """Run ``prs`` PRs per repo profile through the pipeline, remediating at each threshold.
+
+    ``tracker`` is None for the fixed §8 thresholds. A remediation restarts
+    the state: a new build, or a new request to the bot. It is premature
+    when the step would have finished without it. Returns per-repo counts.
+    """
+    rng = random.Random(seed)
+    results = {repo: {"remediations": 0, "premature": 0, "wasted_rebuilds": 0, "hung_build_delays": []}
+               for repo in REPO_PROFILES}
+    for n in range(prs * len(REPO_PROFILES)):
+        repo = list(REPO_PROFILES)[n % len(REPO_PROFILES)]
+        result, t = results[repo], 0.0
+        for state, median in REPO_PROFILES[repo].items():
+            while True:
+                if tracker is not None:
+                    tracker.observe(repo, n, state, t)
+                hung = rng.random() < p_hang
+                dwell = math.inf if hung else rng.lognormvariate(math.log(median * 60), 0.5)
+                threshold = tracker.threshold(repo, state) if tracker is not None else STALE_AFTER_SECONDS[state]
+                # The first reconciler run after the deadline catches the PR.
+                noticed = threshold + rng.uniform(0, reconcile_every)
+                if dwell <= noticed:
+                    t += dwell
+                    break
+                result["remediations"] += 1
+                if hung:
+                    if state is State.CHECKS_RUNNING:
+                        result["hung_build_delays"].append(noticed)
+                else:
+                    result["premature"] += 1
+                    result["wasted_rebuilds"] += state is State.CHECKS_RUNNING
+                if tracker is not None:
+                    tracker.discard(repo, n)
+                t += noticed
+        if tracker is not None:
+            tracker.observe(repo, n, State.MERGED, t)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prs", type=int, default=3000, help="PRs per repo profile")
+    parser.add_argument("--hang", type=float, default=0.02, help="chance a step never finishes")
+    args = parser.parse_args(argv)
+
+    tracker = DwellTracker()
+    for label, results in (("fixed §8", replay(None, args.prs, args.hang)),
+                           ("learned", replay(tracker, args.prs, args.hang))):
+        print(f"  {label}")
+        for repo, r in results.items():
+            delays = sorted(r["hung_build_delays"])
+            median_delay = delays[len(delays) // 2] / 60 if delays else float("nan")
+            build = (tracker.threshold(repo, State.CHECKS_RUNNING) if label == "learned"
+                     else STALE_AFTER_SECONDS[State.CHECKS_RUNNING]) / 60
+            print(f"    {repo:<8} {r['remediations']:5d} remediations, {r['premature']:5d} premature"
+                  f" ({r['wasted_rebuilds']} wasted rebuilds); hung builds noticed after {median_delay:4.0f} min"
+                  f" (median), CHECKS_RUNNING threshold {build:.0f} min")
+
+    # P² stays close to the exact quantile in five markers.
+    rng = random.Random(1)
+    sample = [rng.lognormvariate(0, 0.5) for _ in range(20_000)]
+    sketch = P2Quantile(QUANTILE)
+    for x in sample:
+        sketch.add(x)
+    exact = sorted(sample)[int(QUANTILE * len(sample))]
+    assert abs(sketch.value() - exact) / exact < 0.05, (sketch.value(), exact)
+    print(f"  P² p99 of 20,000 samples: {sketch.value():.3f} (exact {exact:.3f})")
+
+
+if __name__ == "__main__":
+    main()
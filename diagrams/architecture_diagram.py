@@ -1,33 +1,34 @@
 #!/usr/bin/env python3
-"""System Architecture diagram using mingrammer/diagrams with AWS service icons."""
-
-import os
-
-# diagrams library writes output relative to cwd — set it to the output dir
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.chdir(OUTPUT_DIR)
-
-from diagrams import Diagram, Cluster, Edge
-from diagrams.aws.compute import Lambda
-from diagrams.aws.integration import SQS, SNS, Eventbridge
-from diagrams.generic.database import SQL
-from diagrams.aws.management import Cloudwatch
-from diagrams.onprem.ci import Jenkins
-from diagrams.onprem.vcs import Github
-
-# Try multiple import paths for APIGateway
-try:
-    from diagrams.aws.network import APIGateway
-except ImportError:
+"""System Architecture diagram using mingrammer/diagrams with AWS service icons.
+
+The diagrams package and its node modules are imported when
+create_architecture() is called, not at import time, so this module is cheap
+to import into a shared process. Run importtime_benchmark.py to measure the
+difference.
+"""
+
+from rendering import parse_args, render
+
+
+def create_architecture():
+    # Deferred so that importing this module stays cheap; see module docstring.
+    from diagrams import Diagram, Cluster, Edge, setdiagram
+    from diagrams.aws.compute import Lambda
+    from diagrams.aws.integration import SQS, SNS, Eventbridge
+    from diagrams.generic.database import SQL
+    from diagrams.aws.management import Cloudwatch
+    from diagrams.onprem.ci import Jenkins
+    from diagrams.onprem.vcs import Github
+
+    # Try multiple import paths for APIGateway
     try:
-        from diagrams.aws.mobile import APIGateway
+        from diagrams.aws.network import APIGateway
     except ImportError:
-        from diagrams.aws.compute import Lambda as APIGateway  # fallback
-
+        try:
+            from diagrams.aws.mobile import APIGateway
+        except ImportError:
+            from diagrams.aws.compute import Lambda as APIGateway  # fallback
 
-def main():
     graph_attr = {
         "fontsize": "20",
         "fontname": "Helvetica Neue",
@@ -46,71 +47,76 @@ def main():
         "fontname": "Helvetica Neue",
     }
 
-    with Diagram(
+    diagram = Diagram(
         "AutoMergeMedic — System Architecture",
         filename="architecture",
-        outformat=["png", "svg"],
         direction="LR",
-        show=False,
         graph_attr=graph_attr,
         node_attr=node_attr,
         edge_attr=edge_attr,
-    ):
+    )
+
+    # Enter the diagram context directly: Diagram.__exit__ would render into
+    # the cwd, but the caller renders the returned graph through rendering.
+    # Nodes get fixed ids (diagrams defaults to random UUIDs) so the DOT
+    # source, and with it the render cache key, is stable between runs.
+    setdiagram(diagram)
+    try:
         # ── Event Sources ───────────────────────────────
         with Cluster("Event Sources", graph_attr={
             "bgcolor": "#edf2ff", "color": "#0984e3", "style": "filled,rounded",
             "fontsize": "14", "fontname": "Helvetica Neue",
         }):
-            gh = Github("GitHub\nWebhooks")
-            comments = Github("PR Comments\n/rebuild /merge")
-            admin = APIGateway("Admin API\nGateway")
+            gh = Github("GitHub\nWebhooks", nodeid="gh")
+            comments = Github("PR Comments\n/rebuild /merge", nodeid="comments")
+            admin = APIGateway("Admin API\nGateway", nodeid="admin")
 
         # ── Routing Layer ───────────────────────────────
         with Cluster("Routing Layer", graph_attr={
             "bgcolor": "#f3edff", "color": "#6c5ce7", "style": "filled,rounded",
             "fontsize": "14", "fontname": "Helvetica Neue",
         }):
-            cmd_queue = SQS("Command\nQueue")
-            car_bridge = Lambda("Car Bridge\n(Router)")
+            cmd_queue = SQS("Command\nQueue", nodeid="cmd_queue")
+            car_bridge = Lambda("Car Bridge\n(Router)", nodeid="car_bridge")
 
         # ── Event Processing ────────────────────────────
         with Cluster("Event Processing", graph_attr={
             "bgcolor": "#edfff8", "color": "#00b894", "style": "filled,rounded",
             "fontsize": "14", "fontname": "Helvetica Neue",
         }):
-            event_proc = Lambda("Event\nProcessor")
+            event_proc = Lambda("Event\nProcessor", nodeid="event_proc")
 
         # ── Data Layer ──────────────────────────────────
         with Cluster("Data Store", graph_attr={
             "bgcolor": "#fff9e6", "color": "#fdcb6e", "style": "filled,rounded",
             "fontsize": "14", "fontname": "Helvetica Neue",
         }):
-            state_table = SQL("PR State\nTable")
-            events_table = SQL("PR Events\nTable")
+            state_table = SQL("PR State\nTable", nodeid="state_table")
+            events_table = SQL("PR Events\nTable", nodeid="events_table")
 
         # ── Self-Healing Engine ─────────────────────────
         with Cluster("Self-Healing Engine", graph_attr={
             "bgcolor": "#ffeded", "color": "#d63031", "style": "filled,rounded",
             "fontsize": "14", "fontname": "Helvetica Neue",
         }):
-            scheduler = Eventbridge("Scheduler")
-            reconciler = Lambda("Reconciler")
-            classifier = Lambda("Classification\nEngine")
-            circuit_breaker = Cloudwatch("Circuit\nBreaker")
+            scheduler = Eventbridge("Scheduler", nodeid="scheduler")
+            reconciler = Lambda("Reconciler", nodeid="reconciler")
+            classifier = Lambda("Classification\nEngine", nodeid="classifier")
+            circuit_breaker = Cloudwatch("Circuit\nBreaker", nodeid="circuit_breaker")
 
         # ── Bot Ecosystem ───────────────────────────────
         with Cluster("Bot Ecosystem", graph_attr={
             "bgcolor": "#f5f5f5", "color": "#636e72", "style": "filled,rounded",
             "fontsize": "14", "fontname": "Helvetica Neue",
         }):
-            jenkins = Jenkins("Jenkins CI")
-            policy_bot = Lambda("Policy\nBot")
-            approver_bot = Lambda("Approver\nBot")
-            automerge_bot = Lambda("Automerge\nBot")
+            jenkins = Jenkins("Jenkins CI", nodeid="jenkins")
+            policy_bot = Lambda("Policy\nBot", nodeid="policy_bot")
+            approver_bot = Lambda("Approver\nBot", nodeid="approver_bot")
+            automerge_bot = Lambda("Automerge\nBot", nodeid="automerge_bot")
 
         # ── Standalone ──────────────────────────────────
-        sns = SNS("Escalation\nAlerts")
-        cw = Cloudwatch("CloudWatch\nMetrics")
+        sns = SNS("Escalation\nAlerts", nodeid="sns")
+        cw = Cloudwatch("CloudWatch\nMetrics", nodeid="cw")
 
         # ── Edges: Event Ingestion ──────────────────────
         gh >> Edge(label="webhook", color="#0984e3") >> car_bridge
@@ -145,6 +151,15 @@ def main():
         # ── Edges: Notifications / Monitoring ───────────
         reconciler >> Edge(label="escalation", color="#d63031", style="dotted") >> sns
         reconciler >> Edge(label="metrics", color="#636e72", style="dotted") >> cw
+    finally:
+        setdiagram(None)
+
+    return diagram.dot
+
+
+def main(argv=None):
+    args = parse_args(argv, __doc__)
+    render(create_architecture(), "architecture", args.formats, force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Remediation circuit breaker over a sliding window (logical flow §15).
+
+Outcomes are counted in a ring of fixed-width time buckets that covers the
+window (15 one-minute buckets by default). The breaker also keeps running
+success and failure totals and the last bucket it has seen. Recording an
+outcome clears only the buckets passed over since then, subtracting them
+from the totals, and then bumps the current bucket. A record() therefore
+costs O(1) when outcomes arrive at least once per bucket and never more
+than O(buckets), however many remediation actions the window holds.
+
+States follow §15. CLOSED trips to OPEN when the failure rate in the
+window is above ``failure_threshold`` with at least ``min_samples``
+actions. OPEN lets nothing through until ``cooldown_seconds`` have
+passed. Then HALF_OPEN lets exactly one probe through: allow() returns a
+probe token, and only a record() carrying that token decides, a success
+closing the breaker and a failure reopening it. Outcomes of actions sent
+before the breaker opened are still counted but decide nothing. If a probe
+never reports back, another is allowed after a further cooldown. reset()
+is the Admin API override: it forces CLOSED and clears the window.
+
+The breaker state is a small fixed-size record kept in a store.
+MemoryBreakerStore serves a single process. SQLiteBreakerStore holds the
+record in one row and updates it inside a write transaction, so several
+reconciler workers share one breaker. A call that leaves the record as it
+was, such as allow() while CLOSED, only reads the row and takes no write
+lock.
+
+circuit_breaker_diagram.py reads its thresholds from BREAKER_CONFIG.
+
+Run this module to time record() and allow() as the number of recorded
+actions grows, and to check the shared store across processes:
+
+    python circuit_breaker.py --actions 1000000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from enum import Enum
+from typing import NamedTuple
+
+
+class BreakerConfig(NamedTuple):
+    failure_threshold: float = 0.5  # trip when failures / total is above this
+    min_samples: int = 5            # ... and the window holds at least this many actions
+    window_seconds: float = 15 * 60
+    bucket_seconds: float = 60
+    cooldown_seconds: float = 10 * 60
+
+    @property
+    def buckets(self):
+        return max(1, int(-(-self.window_seconds // self.bucket_seconds)))
+
+
+BREAKER_CONFIG = BreakerConfig()
+
+
+class BreakerState(str, Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class _Record:
+    """Everything one breaker stores: its state and the ring of buckets."""
+
+    __slots__ = ("state", "opened_at", "probe_at", "probe", "epochs", "last_epoch", "successes",
+                 "failures", "total_successes", "total_failures")
+
+    def __init__(self, buckets):
+        self.state = BreakerState.CLOSED
+        self.opened_at = None
+        self.probe_at = None   # when the HALF_OPEN probe was let through
+        self.probe = None      # ... and the token it was given
+        self.epochs = [-1] * buckets  # bucket number each slot currently counts for
+        self.last_epoch = -1   # newest bucket number recorded so far
+        self.successes = [0] * buckets
+        self.failures = [0] * buckets
+        self.total_successes = 0
+        self.total_failures = 0
+
+    def clear_window(self):
+        buckets = len(self.epochs)
+        self.epochs, self.successes, self.failures = [-1] * buckets, [0] * buckets, [0] * buckets
+        self.last_epoch = -1
+        self.total_successes = self.total_failures = 0
+
+    def to_json(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_json(cls, data):
+        record = cls(len(data["epochs"]))
+        for name in cls.__slots__:
+            setattr(record, name, data[name])
+        record.state = BreakerState(record.state)
+        return record
+
+
+class MemoryBreakerStore:
+    """Breaker state for a single process."""
+
+    def __init__(self):
+        self._records = {}
+
+    def transact(self, name, buckets, update):
+        """Apply ``update(record)`` to the named breaker's record and return its result."""
+        record = self._records.get(name)
+        if record is None or len(record.epochs) != buckets:
+            record = self._records[name] = _Record(buckets)
+        return update(record)
+
+
+class SQLiteBreakerStore:
+    """Breaker state in a SQLite file shared by local reconciler workers.
+
+    transact() first applies the update to a plain read of the row. If the
+    record comes out unchanged, that answer stands and nothing is written.
+    Otherwise the update is applied again under ``BEGIN IMMEDIATE``, so
+    read-modify-write of the record is serialized across processes.
+    ``update`` must therefore depend only on the record it is given.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS circuit_breakers (name TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def _apply(self, name, buckets, update):
+        row = self._db.execute("SELECT record FROM circuit_breakers WHERE name = ?", (name,)).fetchone()
+        record = _Record.from_json(json.loads(row[0])) if row else _Record(buckets)
+        if len(record.epochs) != buckets:
+            record = _Record(buckets)
+        result = update(record)
+        stored = json.dumps(record.to_json())
+        return result, stored, row is not None and stored == row[0]
+
+    def transact(self, name, buckets, update):
+        result, _, unchanged = self._apply(name, buckets, update)
+        if unchanged:
+            return result
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            result, stored, unchanged = self._apply(name, buckets, update)
+            if not unchanged:
+                self._db.execute("INSERT OR REPLACE INTO circuit_breakers (name, record) VALUES (?, ?)",
+                                 (name, stored))
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return result
+
+    def close(self):
+        self._db.close()
+
+
+class CircuitBreaker:
+    def __init__(self, name="remediation", config=BREAKER_CONFIG, store=None, clock=time.time, on_trip=None):
+        self.name = name
+        self.config = config
+        self.store = store if store is not None else MemoryBreakerStore()
+        self.clock = clock
+        self.on_trip = on_trip  # called with the failure rate when CLOSED trips to OPEN
+
+    def _transact(self, update):
+        return self.store.transact(self.name, self.config.buckets, update)
+
+    def _advance(self, record, now):
+        """Clear the slots passed over since the last bucket seen; returns the current bucket number.
+
+        A clock that steps back keeps counting into the newest bucket.
+        """
+        epoch = int(now // self.config.bucket_seconds)
+        if epoch <= record.last_epoch:
+            return record.last_epoch
+        buckets = len(record.epochs)
+        for passed in range(max(record.last_epoch + 1, epoch - buckets + 1), epoch + 1):
+            slot = passed % buckets
+            record.total_successes -= record.successes[slot]
+            record.total_failures -= record.failures[slot]
+            record.epochs[slot], record.successes[slot], record.failures[slot] = -1, 0, 0
+        record.last_epoch = epoch
+        return epoch
+
+    def _open(self, record, now):
+        record.state = BreakerState.OPEN
+        record.opened_at = now
+        record.probe_at = record.probe = None
+
+    def allow(self):
+        """Whether one remediation action may be dispatched now.
+
+        Returns False, or a truthy permit to pass to record() with the
+        action's outcome. In HALF_OPEN the permit is the single probe's
+        token, so it must be followed by record() for that action.
+        """
+        now = self.clock()
+        cooldown = self.config.cooldown_seconds
+
+        def update(record):
+            if record.state is BreakerState.CLOSED:
+                return True
+            if record.state is BreakerState.OPEN:
+                if now - record.opened_at < cooldown:
+                    return False
+                record.state = BreakerState.HALF_OPEN
+            elif record.probe_at is not None and now - record.probe_at < cooldown:
+                return False  # a probe is already out
+            record.probe_at, record.probe = now, uuid.uuid4().hex
+            return record.probe
+
+        return self._transact(update)
+
+    def record(self, success, permit=None):
+        """Report the outcome of a dispatched remediation action; returns the new state.
+
+        ``permit`` is what allow() returned for the action. In HALF_OPEN
+        only the probe's permit closes or reopens the breaker.
+        """
+        now = self.clock()
+        config = self.config
+
+        def update(record):
+            epoch = self._advance(record, now)
+            slot = epoch % len(record.epochs)
+            if record.epochs[slot] != epoch:
+                record.epochs[slot], record.successes[slot], record.failures[slot] = epoch, 0, 0
+            if success:
+                record.successes[slot] += 1
+                record.total_successes += 1
+            else:
+                record.failures[slot] += 1
+                record.total_failures += 1
+
+            if record.state is BreakerState.HALF_OPEN:
+                if record.probe is None or permit != record.probe:
+                    return record.state, None  # not the probe: counted, but it decides nothing
+                if success:
+                    record.state = BreakerState.CLOSED
+                    record.opened_at = record.probe_at = record.probe = None
+                    record.clear_window()
+                else:
+                    self._open(record, now)
+            elif record.state is BreakerState.CLOSED and not success:
+                total = record.total_successes + record.total_failures
+                rate = record.total_failures / total
+                if total >= config.min_samples and rate > config.failure_threshold:
+                    self._open(record, now)
+                    return record.state, rate
+            return record.state, None
+
+        state, tripped = self._transact(update)
+        if tripped is not None and self.on_trip is not None:
+            self.on_trip(tripped)
+        return state
+
+    def reset(self):
+        """Admin API ``/circuit-breaker/reset``: force CLOSED and forget the window."""
+        def update(record):
+            record.state = BreakerState.CLOSED
+            record.opened_at = record.probe_at = record.probe = None
+            record.clear_window()
+        self._transact(update)
+
+    def snapshot(self):
+        """``(state, successes, failures)`` in the current window."""
+        now = self.clock()
+
+        def update(record):
+            self._advance(record, now)
+            return record.state, record.total_successes, record.total_failures
+
+        return self._transact(update)
+
+    @property
+    def state(self):
+        return self.snapshot()[0]
+
+
+def _check_transitions():
+    now = [0.0]
+    config = BREAKER_CONFIG
+    breaker = CircuitBreaker(config=config, clock=lambda: now[0])
+    for _ in range(config.min_samples - 1):
+        breaker.record(False)
+    assert breaker.state is BreakerState.CLOSED, "tripped below min_samples"
+    assert breaker.record(False) is BreakerState.OPEN
+    assert not breaker.allow()
+    now[0] += config.cooldown_seconds
+    probe = breaker.allow()
+    assert probe and breaker.state is BreakerState.HALF_OPEN
+    assert not breaker.allow(), "second probe let through"
+    assert breaker.record(False, probe) is BreakerState.OPEN
+    now[0] += config.cooldown_seconds
+    stale, probe = probe, breaker.allow()
+    assert probe and probe != stale
+    # Late outcomes from actions sent before the breaker opened decide nothing.
+    assert breaker.record(True) is BreakerState.HALF_OPEN, "a non-probe success closed the breaker"
+    assert breaker.record(True, stale) is BreakerState.HALF_OPEN, "an old probe's success closed the breaker"
+    assert breaker.record(False) is BreakerState.HALF_OPEN
+    assert breaker.record(True, probe) is BreakerState.CLOSED
+    # Failures that slide out of the window no longer count.
+    for _ in range(config.min_samples - 1):
+        breaker.record(False)
+    now[0] += config.window_seconds
+    for _ in range(config.min_samples - 1):
+        breaker.record(True)
+    assert breaker.record(False) is BreakerState.CLOSED
+    while breaker.record(False) is BreakerState.CLOSED:
+        pass
+    assert breaker.snapshot() == (BreakerState.OPEN, config.min_samples - 1, config.min_samples)
+    breaker.reset()
+    assert breaker.snapshot() == (BreakerState.CLOSED, 0, 0)
+
+
+def _time_calls(actions):
+    now = [0.0]
+    breaker = CircuitBreaker(config=BreakerConfig(min_samples=10 ** 12), clock=lambda: now[0])
+    step = BREAKER_CONFIG.window_seconds / actions  # spread the actions over one window
+    start = time.perf_counter()
+    for n in range(actions):
+        breaker.record(n % 3 != 0, breaker.allow())
+        now[0] += step
+    return (time.perf_counter() - start) / actions * 1e6, breaker.snapshot()
+
+
+def _shared_worker(path, failures):
+    breaker = CircuitBreaker(store=SQLiteBreakerStore(path))
+    for _ in range(failures):
+        breaker.record(False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    _check_transitions()
+    print("  transitions: CLOSED → OPEN → HALF_OPEN → OPEN → HALF_OPEN → CLOSED, window slide, reset ok")
+
+    for actions in (args.actions // 100, args.actions // 10, args.actions):
+        per_call, (state, successes, failures) = _time_calls(actions)
+        print(f"  {actions:>9} actions in window: {per_call:5.2f} µs per allow()+record()"
+              f"  ({successes} ok / {failures} failed)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "breaker.db")
+        SQLiteBreakerStore(path).close()
+        per_worker = -(-BREAKER_CONFIG.min_samples // args.workers)
+        processes = [multiprocessing.Process(target=_shared_worker, args=(path, per_worker))
+                     for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        store = SQLiteBreakerStore(path)
+        breaker = CircuitBreaker(store=store)
+        state, successes, failures = breaker.snapshot()
+        print(f"  {args.workers} workers × {per_worker} failures on one SQLite breaker: {state.value}"
+              f" ({failures} failures seen)")
+        writes = store._db.total_changes
+        for _ in range(1000):
+            breaker.allow()
+        assert store._db.total_changes == writes, "a refused allow() wrote the record"
+
+
+if __name__ == "__main__":
+    main()
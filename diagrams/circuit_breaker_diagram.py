@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
-"""Circuit Breaker state machine diagram."""
+"""Circuit Breaker state machine diagram.
+
+Thresholds come from BREAKER_CONFIG in circuit_breaker.py.
+"""
 
-import os
 import graphviz
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+from circuit_breaker import BREAKER_CONFIG
+from rendering import parse_args, render
 
 FONT = "Helvetica Neue,Helvetica,Arial"
 
 
-def create_circuit_breaker():
+def _minutes(seconds):
+    return f"{seconds / 60:g} min"
+
+
+def create_circuit_breaker(config=BREAKER_CONFIG):
     g = graphviz.Digraph("circuit_breaker", format="png")
     g.attr(
         rankdir="LR",
@@ -39,10 +44,11 @@ def create_circuit_breaker():
 
     # Transitions
     g.edge("CLOSED", "OPEN",
-           label="  Failure rate > 50%\n  (min 5 actions in window)  ",
+           label=f"  Failure rate > {config.failure_threshold:.0%}\n"
+                 f"  (min {config.min_samples} actions in {_minutes(config.window_seconds)} window)  ",
            color="#d63031", fontcolor="#d63031")
     g.edge("OPEN", "HALF_OPEN",
-           label="  Cooldown elapsed\n  (10 min)  ",
+           label=f"  Cooldown elapsed\n  ({_minutes(config.cooldown_seconds)})  ",
            color="#fdcb6e", fontcolor="#856404")
     g.edge("HALF_OPEN", "CLOSED",
            label="  Probe succeeds  ",
@@ -57,11 +63,9 @@ def create_circuit_breaker():
     return g
 
 
-def main():
-    g = create_circuit_breaker()
-    for fmt in ["png", "svg"]:
-        g.format = fmt
-        g.render(filename=os.path.join(OUTPUT_DIR, "circuit_breaker"), cleanup=True)
+def main(argv=None):
+    args = parse_args(argv, __doc__)
+    render(create_circuit_breaker(), "circuit_breaker", args.formats, force=args.force)
 
 
 if __name__ == "__main__":
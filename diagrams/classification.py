@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Classification Engine — the executable form of logical flow §6.
+
+RULES is the 11-rule priority chain. classify() evaluates it for one stale
+PR; classify_batch() evaluates it for columnar arrays of PRs with NumPy
+masks, one mask per rule, assigned in priority order. Both apply the §7
+retry-budget override afterwards. reconciler_flow_diagram.py draws the
+C1..C11 chain from RULES.
+
+Run this module to check classify_batch() against classify() on randomized
+inputs:
+
+    python classification.py --samples 100000
+"""
+
+import argparse
+import enum
+import random
+import sys
+import time
+from typing import Mapping, NamedTuple, Optional
+
+from state_machine import RETRY_BUDGETS, STALE_AFTER_MINUTES, STALE_AFTER_SECONDS, State
+
+
+class Substatus(enum.IntEnum):
+    """state_substatus values (§1, §4)."""
+
+    NONE = 0
+    # CHECKS_FAILED
+    TRANSIENT = 1
+    PERSISTENT = 2
+    # POLICY_FAILED
+    SOD_FAILURE = 3
+    BUILD_FAILURE = 4
+    BRANCH_PROTECTION_FAILURE = 5
+    OTHER_POLICY_FAILURE = 6
+
+
+class Strategy(enum.IntEnum):
+    NO_ACTION = 0
+    CLOSE_AND_REOPEN = 1
+    UPDATE_BRANCH = 2
+    RETRY_CHECKS = 3
+    RETRIGGER_POLICY_BOT = 4
+    RETRIGGER_SOD_CHECK = 5
+    CLOSE_PR = 6
+    RETRIGGER_APPROVER_BOT = 7
+    RETRIGGER_MERGE = 8
+    NEEDS_INTERVENTION = 9
+
+
+# Strategy → retry_counts key (§7). Strategies without a budget never exhaust.
+BUDGET_KEYS = {
+    Strategy.CLOSE_AND_REOPEN: "close_and_reopen",
+    Strategy.UPDATE_BRANCH: "branch_update",
+    Strategy.RETRY_CHECKS: "rebuild",
+    Strategy.RETRIGGER_POLICY_BOT: "retrigger_policy_bot",
+    Strategy.RETRIGGER_SOD_CHECK: "retrigger_sod_check",
+    Strategy.RETRIGGER_APPROVER_BOT: "retrigger_approver_bot",
+    Strategy.RETRIGGER_MERGE: "retrigger_automerge_bot",
+}
+
+# Column order of the retry_counts matrix passed to classify_batch().
+RETRY_COLUMNS = tuple(RETRY_BUDGETS)
+
+POLICY_BOT_STALE_AFTER = STALE_AFTER_MINUTES[State.POLICY_EVALUATING] * 60
+APPROVER_BOT_STALE_AFTER = STALE_AFTER_MINUTES[State.POLICY_PASSED] * 60
+AUTOMERGE_STALE_AFTER = STALE_AFTER_MINUTES[State.APPROVED] * 60
+
+
+class PRFacts(NamedTuple):
+    """Classifier inputs for one PR: State Table record plus live GitHub state.
+
+    ``bot_responded`` says whether the bot the current state waits on (Policy
+    Bot, Approver Bot, Automerge Bot) has produced an event since the PR
+    entered that state; history_summary.PRSummary.bot_responded() computes it.
+    ``stale_after`` overrides the §8 threshold for the PR's state in rules 5,
+    8, 9 and 10, e.g. with adaptive_thresholds.DwellTracker.threshold().
+    """
+
+    state: State
+    substatus: Substatus = Substatus.NONE
+    age_seconds: float = 0.0
+    merge_conflict: bool = False
+    behind_base: bool = False
+    bot_responded: bool = False
+    retry_counts: Mapping[str, int] = {}
+    stale_after: Optional[float] = None
+
+
+class Classification(NamedTuple):
+    strategy: Strategy
+    reason: Optional[str] = None  # escalation reason when strategy is NEEDS_INTERVENTION
+
+
+class Rule(NamedTuple):
+    number: int
+    question: str                 # diagram label
+    strategy: Strategy
+    reason: Optional[str] = None  # escalation reason when the rule escalates
+
+
+# §6 — evaluated in priority order; the first matching rule wins.
+RULES = (
+    Rule(1, "Merge conflict?", Strategy.CLOSE_AND_REOPEN),
+    Rule(2, "Branch behind?", Strategy.UPDATE_BRANCH),
+    Rule(3, "Checks failed (transient)?", Strategy.RETRY_CHECKS),
+    Rule(4, "Checks failed (persistent)?", Strategy.NEEDS_INTERVENTION,
+         "Checks failed with a persistent (non-transient) failure"),
+    Rule(5, "Policy Bot stale?", Strategy.RETRIGGER_POLICY_BOT),
+    Rule(6, "Policy failed (SOD)?", Strategy.RETRIGGER_SOD_CHECK),
+    Rule(7, "Policy failed (other)?", Strategy.NEEDS_INTERVENTION,
+         "Policy failed for a reason other than SOD"),
+    Rule(8, "Approver Bot stale?", Strategy.RETRIGGER_APPROVER_BOT),
+    Rule(9, "Automerge stale?", Strategy.RETRIGGER_MERGE),
+    Rule(10, "Within threshold?", Strategy.NO_ACTION),
+    Rule(11, "Fallthrough", Strategy.NEEDS_INTERVENTION,
+         "No classification rule matched"),
+)
+
+
+def _matches(rule, pr):
+    """Scalar form of each rule's condition."""
+    n, state, sub, threshold = rule.number, pr.state, pr.substatus, pr.stale_after
+    if n == 1:
+        return pr.merge_conflict
+    if n == 2:
+        return pr.behind_base
+    if n == 3:
+        return state is State.CHECKS_FAILED and sub is Substatus.TRANSIENT
+    if n == 4:
+        return state is State.CHECKS_FAILED
+    if n == 5:
+        return (state in (State.CHECKS_PASSED, State.POLICY_EVALUATING)
+                and pr.age_seconds > (POLICY_BOT_STALE_AFTER if threshold is None else threshold)
+                and not pr.bot_responded)
+    if n == 6:
+        return state is State.POLICY_FAILED and sub is Substatus.SOD_FAILURE
+    if n == 7:
+        return state is State.POLICY_FAILED
+    if n == 8:
+        return (state is State.POLICY_PASSED and not pr.bot_responded
+                and pr.age_seconds > (APPROVER_BOT_STALE_AFTER if threshold is None else threshold))
+    if n == 9:
+        return (state is State.APPROVED and not pr.bot_responded
+                and pr.age_seconds > (AUTOMERGE_STALE_AFTER if threshold is None else threshold))
+    if n == 10:
+        return pr.age_seconds < (STALE_AFTER_SECONDS[state] if threshold is None else threshold)
+    return True
+
+
+def budget_exhausted_reason(strategy, count):
+    key = BUDGET_KEYS[strategy]
+    return f"Retry budget exhausted for {key} ({count}/{RETRY_BUDGETS[key]})"
+
+
+def classify(pr):
+    """Classify one stale PR and apply the retry-budget override."""
+    pr = pr._replace(state=State(pr.state), substatus=Substatus(pr.substatus))
+    rule = next(r for r in RULES if _matches(r, pr))
+    key = BUDGET_KEYS.get(rule.strategy)
+    if key is not None:
+        count = pr.retry_counts.get(key, 0)
+        if count >= RETRY_BUDGETS[key]:
+            return Classification(Strategy.NEEDS_INTERVENTION, budget_exhausted_reason(rule.strategy, count))
+    return Classification(rule.strategy, rule.reason)
+
+
+def classify_batch(state, substatus, age_seconds, merge_conflict, behind_base,
+                   retry_counts, bot_responded=None, stale_after=None):
+    """Classify many PRs at once from columnar arrays.
+
+    ``retry_counts`` is an ``(n, len(RETRY_COLUMNS))`` integer matrix.
+    ``stale_after`` holds each PR's threshold, NaN for the §8 one. Returns
+    ``(strategies, reasons)``: an int8 array of Strategy codes and an object
+    array holding the escalation reason, or None, for each PR.
+
+    Every rule condition is computed as one boolean mask over the whole batch;
+    a PR takes the strategy of the first mask, in priority order, that covers it.
+    """
+    import numpy as np  # optional dependency, only needed for batches
+
+    state = np.asarray(state, dtype=np.int8)
+    substatus = np.asarray(substatus, dtype=np.int8)
+    age = np.asarray(age_seconds, dtype=np.float64)
+    conflict = np.asarray(merge_conflict, dtype=bool)
+    behind = np.asarray(behind_base, dtype=bool)
+    counts = np.asarray(retry_counts, dtype=np.int64).reshape(len(state), len(RETRY_COLUMNS))
+    waiting = (np.ones(len(state), dtype=bool) if bot_responded is None
+               else ~np.asarray(bot_responded, dtype=bool))
+    threshold = np.asarray(STALE_AFTER_SECONDS)[state]
+    if stale_after is not None:
+        override = np.asarray(stale_after, dtype=np.float64)
+        threshold = np.where(np.isnan(override), threshold, override)
+
+    checks_failed = state == State.CHECKS_FAILED
+    policy_failed = state == State.POLICY_FAILED
+    masks = {
+        1: conflict,
+        2: behind,
+        3: checks_failed & (substatus == Substatus.TRANSIENT),
+        4: checks_failed,
+        5: (np.isin(state, (State.CHECKS_PASSED, State.POLICY_EVALUATING))
+            & (age > threshold) & waiting),
+        6: policy_failed & (substatus == Substatus.SOD_FAILURE),
+        7: policy_failed,
+        8: (state == State.POLICY_PASSED) & (age > threshold) & waiting,
+        9: (state == State.APPROVED) & (age > threshold) & waiting,
+        10: age < threshold,
+        11: np.ones(len(state), dtype=bool),
+    }
+
+    strategies = np.empty(len(state), dtype=np.int8)
+    reason_codes = np.full(len(state), -1, dtype=np.int8)  # index into RULES
+    unassigned = np.ones(len(state), dtype=bool)
+    for index, rule in enumerate(RULES):
+        hit = masks[rule.number] & unassigned
+        strategies[hit] = rule.strategy
+        if rule.reason is not None:
+            reason_codes[hit] = index
+        unassigned &= ~hit
+
+    reasons = np.full(len(state), None, dtype=object)
+    for index in np.unique(reason_codes[reason_codes >= 0]):
+        reasons[reason_codes == index] = RULES[index].reason
+
+    # §7 budget override: look up each PR's count for its chosen strategy.
+    budget_column = np.full(len(Strategy), -1, dtype=np.int64)
+    budget_max = np.zeros(len(Strategy), dtype=np.int64)
+    for strategy, key in BUDGET_KEYS.items():
+        budget_column[strategy] = RETRY_COLUMNS.index(key)
+        budget_max[strategy] = RETRY_BUDGETS[key]
+    column = budget_column[strategies]
+    used = counts[np.arange(len(state)), np.maximum(column, 0)]
+    exhausted = (column >= 0) & (used >= budget_max[strategies])
+    for i in np.flatnonzero(exhausted):
+        reasons[i] = budget_exhausted_reason(Strategy(strategies[i]), int(used[i]))
+    strategies[exhausted] = Strategy.NEEDS_INTERVENTION
+
+    return strategies, reasons
+
+
+def random_facts(rng, n):
+    """Randomized PRFacts covering every state, substatus and threshold edge."""
+    ages = sorted({0.0, *(m * 60 for m in STALE_AFTER_MINUTES.values())})
+    facts = []
+    for _ in range(n):
+        age = rng.choice(ages) + rng.choice((-1.0, 0.0, 1.0)) if rng.random() < 0.5 else rng.uniform(0, 7200)
+        facts.append(PRFacts(
+            state=rng.choice(list(State)),
+            substatus=rng.choice(list(Substatus)),
+            age_seconds=max(age, 0.0),
+            merge_conflict=rng.random() < 0.1,
+            behind_base=rng.random() < 0.2,
+            bot_responded=rng.random() < 0.5,
+            retry_counts={key: rng.randint(0, RETRY_BUDGETS[key]) for key in RETRY_COLUMNS},
+            stale_after=rng.choice((None, max(age + rng.choice((-1.0, 0.0, 1.0)), 0.0), rng.uniform(0, 7200))),
+        ))
+    return facts
+
+
+def check_parity(samples, seed):
+    """Compare classify_batch() with classify() on random inputs; return mismatches."""
+    facts = random_facts(random.Random(seed), samples)
+
+    start = time.perf_counter()
+    expected = [classify(pr) for pr in facts]
+    scalar_s = time.perf_counter() - start
+
+    columns = dict(
+        state=[pr.state for pr in facts],
+        substatus=[pr.substatus for pr in facts],
+        age_seconds=[pr.age_seconds for pr in facts],
+        merge_conflict=[pr.merge_conflict for pr in facts],
+        behind_base=[pr.behind_base for pr in facts],
+        bot_responded=[pr.bot_responded for pr in facts],
+        retry_counts=[[pr.retry_counts[key] for key in RETRY_COLUMNS] for pr in facts],
+        stale_after=[float("nan") if pr.stale_after is None else pr.stale_after for pr in facts],
+    )
+    start = time.perf_counter()
+    strategies, reasons = classify_batch(**columns)
+    batch_s = time.perf_counter() - start
+
+    mismatches = [
+        (pr, want, Classification(Strategy(got), reason))
+        for pr, want, got, reason in zip(facts, expected, strategies, reasons)
+        if (want.strategy, want.reason) != (got, reason)
+    ]
+    print(f"  {samples} PRs: scalar {scalar_s * 1000:.1f} ms, batch {batch_s * 1000:.1f} ms")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = check_parity(args.samples, args.seed)
+    for pr, want, got in mismatches[:10]:
+        print(f"  MISMATCH {pr}: scalar={want} batch={got}")
+    if mismatches:
+        print(f"{len(mismatches)} mismatch(es)")
+        sys.exit(1)
+    print("classify_batch() matches classify()")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Command queue deduplication over a coalescing window (logical flow §11).
+
+PR comments, the Admin API and the reconciler all enqueue commands. After
+an outage the same ``/rebuild`` for the same PR often arrives from several
+of them within seconds. The CommandCoalescer sits in the command consumer,
+in front of the Car Bridge. It keeps an index keyed on
+``(repo, pr_number, command)``:
+
+- The first command for a key is dispatched at once and logged straight
+  away as a COMMAND_RECEIVED event with the dispatch result. If the
+  dispatch was accepted, it opens a window of ``window_seconds``. A
+  rejected command (``Routed(accepted=False)``) opens no window, so the
+  next request for the key is dispatched again.
+- A repeat inside the window is not dispatched. Its requester and source
+  are added to the open group.
+- When a window with repeats closes, the repeats are written as one more
+  COMMAND_RECEIVED event, marked ``"dispatched": false`` and pointing at
+  the dispatched command's timestamp. A crash loses only these repeats,
+  which were never dispatched.
+
+A window with repeats is therefore recorded in two events: the dispatched
+command, logged before anything else can fail, and its repeats, joined
+to it by ``coalesced_into``. Windows close only when submit(), expire()
+or close() runs. The command consumer calls expire() on a timer, waiting
+at most wait_time() between calls, so the repeats are logged when their
+window ends even if no other command follows.
+
+Windows all have the same length, so they close in the order they opened.
+The index expires them from a FIFO queue, and each submit() costs O(1)
+amortized. Each command dropped as redundant is a Jenkins or bot call
+saved.
+
+Run this module to replay a post-outage burst of commands:
+
+    python command_dedup.py --prs 500
+"""
+
+import argparse
+import collections
+import random
+import time
+
+from event_writer import PREvent
+
+DEDUP_WINDOW_SECONDS = 60.0
+
+
+class _Group:
+    __slots__ = ("first", "repeats")
+
+    def __init__(self, first):
+        self.first = first
+        self.repeats = []
+
+
+class CommandCoalescer:
+    """Dispatches each distinct command once per window.
+
+    ``dispatch(command)`` delivers a command, e.g. ``CarBridge.route`` on
+    ``command.to_bridge()``. A result with ``accepted`` false counts as
+    rejected. ``append(event)`` receives the COMMAND_RECEIVED
+    PREvents, e.g. ``EventWriter.append``. Commands carry ``repo``,
+    ``pr_number``, ``command``, ``source``, ``requested_by`` and ``timestamp``
+    (slash_commands.CommandMessage).
+    """
+
+    def __init__(self, dispatch, append, window_seconds=DEDUP_WINDOW_SECONDS, clock=time.monotonic):
+        self.dispatch = dispatch
+        self.append = append
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._groups = {}                   # (repo, pr_number, command) → _Group
+        self._expiry = collections.deque()  # (closes_at, key), in the order windows opened
+        self.dispatched = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._groups)
+
+    def submit(self, command):
+        """Dispatch ``command`` unless it repeats one in an open window; True if dispatched."""
+        now = self.clock()
+        self.expire(now)
+        key = (command.repo, command.pr_number, command.command)
+        group = self._groups.get(key)
+        if group is not None:
+            group.repeats.append(command)
+            self.coalesced += 1
+            return False
+        result = self.dispatch(command)
+        self.dispatched += 1
+        self._log(command, [command], {"dispatched": True, "result": _describe(result)})
+        if getattr(result, "accepted", True) is False:
+            self.rejected += 1  # no window: a retry must reach the Car Bridge again
+        else:
+            self._groups[key] = _Group(command)
+            self._expiry.append((now + self.window_seconds, key))
+        return True
+
+    def wait_time(self):
+        """Seconds until the oldest open window closes; None when none is open."""
+        if not self._expiry:
+            return None
+        return max(0.0, self._expiry[0][0] - self.clock())
+
+    def expire(self, now=None):
+        """Close every window that has ended and log its COMMAND_RECEIVED event."""
+        now = self.clock() if now is None else now
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key = self._expiry.popleft()
+            self._close_group(self._groups.pop(key))
+
+    def close(self):
+        """Close every open window, e.g. at shutdown."""
+        while self._expiry:
+            _, key = self._expiry.popleft()
+            self._close_group(self._groups.pop(key))
+
+    def _close_group(self, group):
+        if group.repeats:
+            self._log(group.repeats[-1], group.repeats, {"dispatched": False,
+                                                         "coalesced_into": group.first.timestamp})
+
+    def _log(self, command, requests, fields):
+        self.append(PREvent(command.repo, command.pr_number, command.timestamp, "COMMAND_RECEIVED",
+                            "command-queue", {
+                                "command": command.command,
+                                "requests": [{"requested_by": c.requested_by, "source": c.source,
+                                              "timestamp": c.timestamp} for c in requests],
+                                **fields,
+                            }))
+
+
+def _describe(result):
+    """A JSON-friendly summary of a dispatch result (car_bridge.Routed or anything else)."""
+    if result is None or isinstance(result, (bool, int, float, str)):
+        return result
+    if hasattr(result, "_asdict"):
+        return {k: v for k, v in result._asdict().items() if isinstance(v, (bool, int, float, str, type(None)))}
+    return repr(result)
+
+
+class _SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def main(argv=None):
+    from car_bridge import CarBridge, ROUTES
+    from slash_commands import CommandMessage
+    from state_machine import State
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prs", type=int, default=500)
+    parser.add_argument("--window", type=float, default=DEDUP_WINDOW_SECONDS)
+    args = parser.parse_args(argv)
+
+    # After a Jenkins outage, each failed PR gets /rebuild from one to four
+    # sources: its author, teammates, an Admin API batch and the reconciler.
+    rng = random.Random(5)
+    requesters = [("pr-comment", "author"), ("pr-comment", "teammate"), ("admin-api", "oncall"),
+                  ("reconciler", "reconciler")]
+    clock = _SimulatedClock()
+    burst = []
+    for pr_number in range(args.prs):
+        start = rng.uniform(0, 300)
+        for source, who in rng.sample(requesters, rng.choice((1, 2, 3, 4))):
+            at = start + rng.uniform(0, 20)
+            burst.append(CommandMessage(pr_number, "codegenie/service", "/rebuild", source, who, 1.7e9 + at))
+    burst.sort(key=lambda c: c.timestamp)
+
+    calls = collections.Counter()
+    handlers = {destination: (lambda m, d=destination: calls.update((d,))) for destination in set(ROUTES.values())}
+    bridge = CarBridge(handlers)
+    events, logged_at = [], []
+
+    def log(event):
+        events.append(event)
+        logged_at.append(clock.now)
+
+    coalescer = CommandCoalescer(lambda c: bridge.route(c.to_bridge(), State.CHECKS_FAILED), log,
+                                 args.window, clock)
+
+    def sleep_until(until):
+        """The consumer's timer: close windows as they end, up to ``until``."""
+        while True:
+            wait = coalescer.wait_time()
+            if wait is None or clock.now + wait > until:
+                break
+            clock.now += wait
+            coalescer.expire()
+
+    for command in burst:
+        sleep_until(command.timestamp - 1.7e9)
+        clock.now = command.timestamp - 1.7e9
+        coalescer.submit(command)
+    sleep_until(float("inf"))
+    assert not coalescer, "a window was left open"
+    # Repeats are logged when their window ends, not when some later command arrives.
+    assert all(at - (event.payload["coalesced_into"] - 1.7e9) <= args.window + 1e-6
+               for event, at in zip(events, logged_at) if not event.payload["dispatched"])
+
+    dropped = coalescer.coalesced / len(burst)
+    saved = 1 - calls["jenkins"] / len(burst)
+    recorded = sum(len(e.payload["requests"]) for e in events)
+    print(f"  {len(burst)} /rebuild commands for {args.prs} PRs: {coalescer.dispatched} dispatched,"
+          f" {coalescer.coalesced} coalesced ({dropped:.0%})")
+    print(f"  Jenkins calls: {calls['jenkins']} instead of {len(burst)} ({saved:.0%} saved);"
+          f" {len(events)} COMMAND_RECEIVED events recording {recorded} requesters")
+    assert recorded == len(burst) and calls["jenkins"] == coalescer.dispatched
+
+    # A rejected command opens no window: the same command a second later is routed again.
+    rejecting = CommandCoalescer(lambda c: bridge.route(c.to_bridge(), State.MERGED), events.append, args.window, clock)
+    for command in burst[:50]:
+        rejecting.submit(command)
+    assert rejecting.dispatched == rejecting.rejected == 50 and not rejecting.coalesced
+    print(f"  rejected by the Car Bridge: {rejecting.rejected} of 50 dispatched, none coalesced")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Columnar local event log with memory-mapped replay (logical flow §5).
+
+An event log is a directory of segments. Each segment is a pair of files:
+
+    NNNNNN.rec   fixed-width records (RECORD_DTYPE), appended in write order
+    NNNNNN.pay   JSON payloads back to back; a record holds offset + length
+
+``event_type`` and ``source`` are stored as one-byte codes into the fixed
+EVENT_TYPES and SOURCES vocabularies. Repositories are interned per log
+in ``repos.json``. Timestamps are int64 microseconds. Readers map each .rec
+file and view it with ``numpy.frombuffer``, so opening the log reads no
+records and parses no JSON. history() gathers only the PR's own rows into
+a small array. A payload is decoded only when payload() asks for it.
+
+A crash can leave a torn record at the end of the newest .rec file.
+Readers ignore it, and the writer truncates it away on open, so later
+appends stay aligned.
+
+EventLogStore adapts the log to the EventWriter store interface, so
+write-behind batches can land here. Run this module to compare a history
+scan over the log with one over JSON records:
+
+    python event_log.py --events 200000
+"""
+
+import argparse
+import json
+import mmap
+import os
+import random
+import time
+
+from event_writer import PREvent
+
+# Codes are persisted: only ever append to these vocabularies.
+EVENT_TYPES = (
+    "PR_OPENED", "PR_CLOSED", "PR_MERGED",
+    "CHECKS_STARTED", "CHECKS_PASSED", "CHECKS_FAILED",
+    "POLICY_STARTED", "POLICY_PASSED", "POLICY_FAILED",
+    "APPROVAL_GRANTED",
+    "MERGE_ATTEMPTED", "MERGE_SUCCEEDED", "MERGE_FAILED",
+    "REMEDIATION_BRANCH_UPDATE",
+    "REMEDIATION_REBUILD",
+    "REMEDIATION_RETRIGGER_POLICY",
+    "REMEDIATION_RETRIGGER_APPROVER",
+    "REMEDIATION_RETRIGGER_MERGE",
+    "REMEDIATION_CLOSE_AND_REOPEN",
+    "ESCALATED_NEEDS_INTERVENTION",
+    "COMMAND_RECEIVED",
+    "STATE_DRIFT_CORRECTED",
+)
+SOURCES = (
+    "github-webhook", "codegenie", "policy-bot", "approver-bot",
+    "automerge-bot", "reconciler", "command-queue", "admin-api",
+)
+EVENT_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+SOURCE_CODES = {name: code for code, name in enumerate(SOURCES)}
+
+# Field layout of one .rec record (32 bytes, little-endian).
+RECORD_FIELDS = [
+    ("timestamp_us", "<i8"),
+    ("payload_offset", "<u8"),
+    ("pr_number", "<u4"),
+    ("payload_length", "<u4"),
+    ("repo", "<u2"),
+    ("event_type", "u1"),
+    ("source", "u1"),
+    ("ttl_s", "<u4"),  # 0 = no ttl
+]
+
+SEGMENT_RECORDS = 1 << 16
+
+
+def record_dtype():
+    import numpy as np  # optional dependency, only needed for the columnar log
+
+    return np.dtype(RECORD_FIELDS)
+
+
+class EventLogWriter:
+    """Appends events to the newest segment, starting a new one every ``segment_records``."""
+
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS):
+        import numpy as np
+
+        self._np = np
+        self.directory = directory
+        self.segment_records = segment_records
+        self._dtype = record_dtype()
+        os.makedirs(directory, exist_ok=True)
+        self._repos_path = os.path.join(directory, "repos.json")
+        self.repos = []
+        if os.path.exists(self._repos_path):
+            with open(self._repos_path) as f:
+                self.repos = json.load(f)
+        self._repo_codes = {repo: code for code, repo in enumerate(self.repos)}
+        segments = _segment_ids(directory)
+        self._segment = segments[-1] if segments else 0
+        self._records_in_segment = _segment_length(directory, self._segment, self._dtype)
+        if segments:
+            self._truncate_torn_tail()
+
+    def _truncate_torn_tail(self):
+        """Cut the newest segment back to its whole records and the payloads they point to."""
+        rec_path, pay_path = _segment_paths(self.directory, self._segment)
+        count, itemsize = self._records_in_segment, self._dtype.itemsize
+        payload_end = 0
+        with open(rec_path, "r+b") as f:
+            f.truncate(count * itemsize)
+            if count:
+                f.seek((count - 1) * itemsize)
+                last = self._np.frombuffer(f.read(itemsize), dtype=self._dtype)[0]
+                payload_end = int(last["payload_offset"]) + int(last["payload_length"])
+        if os.path.exists(pay_path) and os.path.getsize(pay_path) > payload_end:
+            with open(pay_path, "r+b") as f:
+                f.truncate(payload_end)
+
+    def _repo_code(self, repo):
+        code = self._repo_codes.get(repo)
+        if code is None:
+            code = self._repo_codes[repo] = len(self.repos)
+            self.repos.append(repo)
+            tmp = self._repos_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.repos, f)
+            os.replace(tmp, self._repos_path)
+        return code
+
+    def append(self, events):
+        """Append a batch of PREvents. Unknown event types or sources raise ValueError."""
+        events = list(events)
+        while events:
+            if self._records_in_segment >= self.segment_records:
+                self._segment += 1
+                self._records_in_segment = 0
+            room = self.segment_records - self._records_in_segment
+            self._append_to_segment(events[:room])
+            events = events[room:]
+
+    def _append_to_segment(self, events):
+        rec_path, pay_path = _segment_paths(self.directory, self._segment)
+        records = self._np.zeros(len(events), dtype=self._dtype)
+        payloads = []
+        offset = os.path.getsize(pay_path) if os.path.exists(pay_path) else 0
+        for i, event in enumerate(events):
+            try:
+                event_type = EVENT_TYPE_CODES[event.event_type]
+                source = SOURCE_CODES[event.source]
+            except KeyError as exc:
+                raise ValueError(f"{exc.args[0]!r} is not in the event log vocabulary") from None
+            payload = json.dumps(event.payload, separators=(",", ":")).encode() if event.payload else b""
+            records[i] = (round(event.event_timestamp * 1_000_000), offset, event.pr_number, len(payload),
+                          self._repo_code(event.repo), event_type, source, int(event.ttl or 0))
+            payloads.append(payload)
+            offset += len(payload)
+        # Payloads first: a record never points past the end of its .pay file.
+        with open(pay_path, "ab") as f:
+            f.write(b"".join(payloads))
+        with open(rec_path, "ab") as f:
+            f.write(records.tobytes())
+        self._records_in_segment += len(events)
+
+
+class EventLog:
+    """Read-only view over every segment of an event log, through mmap."""
+
+    def __init__(self, directory):
+        import numpy as np
+
+        self._np = np
+        self.directory = directory
+        dtype = record_dtype()
+        repos_path = os.path.join(directory, "repos.json")
+        self.repos = []
+        if os.path.exists(repos_path):
+            with open(repos_path) as f:
+                self.repos = json.load(f)
+        self._repo_codes = {repo: code for code, repo in enumerate(self.repos)}
+        self._maps = []
+        self.segments = []   # record arrays, views onto the mapped .rec files
+        self._payloads = []  # mapped .pay files
+        for segment in _segment_ids(directory):
+            rec_path, pay_path = _segment_paths(directory, segment)
+            count = _segment_length(directory, segment, dtype)
+            self.segments.append(np.frombuffer(self._map(rec_path), dtype=dtype, count=count))
+            self._payloads.append(self._map(pay_path))
+        self._index = None
+
+    def _map(self, path):
+        if os.path.getsize(path) == 0:
+            return b""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def close(self):
+        self.segments, self._payloads, self._index = [], [], None
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(len(records) for records in self.segments)
+
+    def _build_index(self):
+        """(repo, pr_number) → [(segment, row indices)], built once with a stable sort per segment."""
+        np = self._np
+        index = {}
+        for segment, records in enumerate(self.segments):
+            keys = (records["repo"].astype(np.uint64) << 32) | records["pr_number"]
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            for start, stop in zip(starts, np.r_[starts[1:], len(order)]):
+                key = int(sorted_keys[start])
+                index.setdefault((key >> 32, key & 0xFFFFFFFF), []).append((segment, order[start:stop]))
+        self._index = index
+
+    def history(self, repo, pr_number):
+        """A PR's records, oldest write first, gathered into one structured array (a copy)."""
+        if self._index is None:
+            self._build_index()
+        code = self._repo_codes.get(repo)
+        parts = self._index.get((code, pr_number), []) if code is not None else []
+        if not parts:
+            return self._np.zeros(0, dtype=record_dtype())
+        return self._np.concatenate([self.segments[segment][rows] for segment, rows in parts])
+
+    def locate(self, repo, pr_number):
+        """``(segment, row)`` of each record history() returns, in the same order."""
+        if self._index is None:
+            self._build_index()
+        code = self._repo_codes.get(repo)
+        parts = self._index.get((code, pr_number), []) if code is not None else []
+        return [(segment, int(row)) for segment, rows in parts for row in rows]
+
+    def histories(self):
+        """Yield ``((repo, pr_number), records)`` for every PR in the log."""
+        if self._index is None:
+            self._build_index()
+        for (code, pr_number) in self._index:
+            yield (self.repos[code], pr_number), self.history(self.repos[code], pr_number)
+
+    def payload(self, segment, record):
+        """Decode one record's JSON payload from its segment's side buffer."""
+        start = int(record["payload_offset"])
+        raw = self._payloads[segment][start:start + int(record["payload_length"])]
+        return json.loads(raw) if raw else {}
+
+    def events(self, repo, pr_number):
+        """A PR's history as PREvents, payloads included. Slower: decodes every payload."""
+        if self._index is None:
+            self._build_index()
+        code = self._repo_codes.get(repo)
+        result = []
+        for segment, rows in self._index.get((code, pr_number), []) if code is not None else []:
+            for record in self.segments[segment][rows]:
+                result.append(PREvent(
+                    repo, pr_number, int(record["timestamp_us"]) / 1_000_000,
+                    EVENT_TYPES[record["event_type"]], SOURCES[record["source"]],
+                    self.payload(segment, record), int(record["ttl_s"]) or None,
+                ))
+        return result
+
+
+class EventLogStore:
+    """EventWriter store that appends each batch to a columnar event log."""
+
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS):
+        self._writer = EventLogWriter(directory, segment_records)
+
+    def write_batch(self, events):
+        self._writer.append(events)
+        return []
+
+
+def _segment_ids(directory):
+    return sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith(".rec"))
+
+
+def _segment_paths(directory, segment):
+    base = os.path.join(directory, f"{segment:06d}")
+    return base + ".rec", base + ".pay"
+
+
+def _segment_length(directory, segment, dtype):
+    """Whole records in a segment; a torn trailing record from a crash is ignored."""
+    rec_path, _ = _segment_paths(directory, segment)
+    return os.path.getsize(rec_path) // dtype.itemsize if os.path.exists(rec_path) else 0
+
+
+def main(argv=None):
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--prs", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    events = [
+        PREvent(f"codegenie/service-{pr % 40}", pr, 1_700_000_000 + n, rng.choice(EVENT_TYPES),
+                rng.choice(SOURCES), {"check": "jenkins/build", "log": "x" * rng.randint(50, 2000)})
+        for n, pr in enumerate(rng.randrange(args.prs) for _ in range(args.events))
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "events.jsonl")
+        with open(json_path, "w") as f:
+            for event in events:
+                f.write(json.dumps(event._asdict()) + "\n")
+        EventLogWriter(os.path.join(directory, "log")).append(events)
+
+        # What the classifier needs per PR: last event type and time, and a failure count.
+        start = time.perf_counter()
+        summary_json = {}
+        with open(json_path) as f:
+            for line in f:
+                record = json.loads(line)
+                key = (record["repo"], record["pr_number"])
+                failures = summary_json.get(key, (0, 0, 0))[2] + (record["event_type"] == "CHECKS_FAILED")
+                summary_json[key] = (record["event_type"], round(record["event_timestamp"] * 1_000_000), failures)
+        json_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        failed_code = EVENT_TYPE_CODES["CHECKS_FAILED"]
+        with EventLog(os.path.join(directory, "log")) as log:
+            summary_log = {
+                key: (EVENT_TYPES[records["event_type"][-1]], int(records["timestamp_us"][-1]),
+                      int((records["event_type"] == failed_code).sum()))
+                for key, records in log.histories()
+            }
+        log_s = time.perf_counter() - start
+
+        sizes = os.path.getsize(json_path), sum(
+            os.path.getsize(os.path.join(directory, "log", name)) for name in os.listdir(os.path.join(directory, "log")))
+
+    if summary_json != summary_log:
+        raise SystemExit("event log and JSON histories disagree")
+    print(f"  {args.events} events, {len(summary_log)} PRs")
+    print(f"  JSON lines  {json_s:7.2f}s  {sizes[0] / 1e6:7.1f} MB")
+    print(f"  event log   {log_s:7.2f}s  {sizes[1] / 1e6:7.1f} MB  (payloads not decoded)")
+
+
+if __name__ == "__main__":
+    main()
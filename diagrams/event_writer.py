@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Write-behind batching for the append-only Events Table (logical flow §5, §13 STEP 5).
+
+The Event Processor and the reconciler call EventWriter.append() and return
+immediately. A background thread groups the buffered events into batches
+of up to 25 (the DynamoDB BatchWriteItem limit). A batch is written as soon
+as it is full, or once its oldest event has waited ``flush_interval``
+seconds.
+
+Ordering: a batch never holds two events of the same PR. Items the store
+returns unprocessed (throttling, partial failure) go back to the front of
+the buffer. A PR's events therefore reach the store in the order they were
+appended, even across retries.
+
+flush() waits for everything appended so far; close(), or leaving the
+``with`` block, flushes and stops the thread. Two stores are provided:
+SQLiteEventStore, for local runs and tests, and DynamoDBEventStore, which
+imports boto3 lazily.
+
+Run this module to compare single-item and batched writes on SQLite:
+
+    python event_writer.py --events 5000
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import NamedTuple, Optional
+
+BATCH_SIZE = 25  # DynamoDB BatchWriteItem maximum
+
+
+class PREvent(NamedTuple):
+    """One Events Table record (§5)."""
+
+    repo: str
+    pr_number: int
+    event_timestamp: float
+    event_type: str
+    source: str
+    payload: dict = {}
+    ttl: Optional[float] = None
+
+
+class SQLiteEventStore:
+    """Events Table in SQLite; ``":memory:"`` by default. Every batch is one transaction."""
+
+    def __init__(self, path=":memory:"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pr_events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " repo TEXT NOT NULL, pr_number INTEGER NOT NULL, event_timestamp REAL NOT NULL,"
+            " event_type TEXT NOT NULL, source TEXT NOT NULL, payload TEXT NOT NULL, ttl REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pr_events_pr ON pr_events (repo, pr_number, seq)")
+        self._db.commit()
+
+    def write_batch(self, events):
+        """Insert ``events``; return the ones not written (always none here)."""
+        rows = [(e.repo, e.pr_number, e.event_timestamp, e.event_type, e.source, json.dumps(e.payload), e.ttl)
+                for e in events]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO pr_events (repo, pr_number, event_timestamp, event_type, source, payload, ttl)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return []
+
+    def events(self, repo, pr_number):
+        """A PR's events in the order they were written."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT repo, pr_number, event_timestamp, event_type, source, payload, ttl FROM pr_events"
+                " WHERE repo = ? AND pr_number = ? ORDER BY seq", (repo, pr_number)).fetchall()
+        return [PREvent(*row[:5], json.loads(row[5]), row[6]) for row in rows]
+
+    def close(self):
+        self._db.close()
+
+
+class DynamoDBEventStore:
+    """Events Table in DynamoDB: partition key ``pr`` ("repo#number"), sort key ``event_key``.
+
+    ``event_key`` is the zero-padded timestamp followed by the event type
+    and a digest of the source and payload. Keys sort by time, and two
+    events that share a timestamp no longer overwrite each other. A retried
+    write of the same event produces the same key, so it stays idempotent.
+    """
+
+    def __init__(self, table_name, client=None):
+        if client is None:
+            import boto3  # optional dependency, only needed against AWS
+            client = boto3.client("dynamodb")
+        self.table_name = table_name
+        self._client = client
+
+    @staticmethod
+    def event_key(event):
+        digest = hashlib.sha1(json.dumps([event.source, event.payload], sort_keys=True).encode()).hexdigest()
+        return f"{event.event_timestamp:020.6f}#{event.event_type}#{digest[:12]}"
+
+    @classmethod
+    def _item(cls, event):
+        item = {
+            "pr": {"S": f"{event.repo}#{event.pr_number}"},
+            "event_key": {"S": cls.event_key(event)},
+            "event_timestamp": {"N": repr(event.event_timestamp)},
+            "event_type": {"S": event.event_type},
+            "source": {"S": event.source},
+            "payload": {"S": json.dumps(event.payload)},
+        }
+        if event.ttl is not None:
+            item["ttl"] = {"N": str(int(event.ttl))}
+        return item
+
+    def write_batch(self, events):
+        """BatchWriteItem; return the events DynamoDB reports as unprocessed."""
+        by_key = {(f"{e.repo}#{e.pr_number}", self.event_key(e)): e for e in events}
+        response = self._client.batch_write_item(RequestItems={
+            self.table_name: [{"PutRequest": {"Item": self._item(e)}} for e in events],
+        })
+        unprocessed = response.get("UnprocessedItems", {}).get(self.table_name, [])
+        return [by_key[(r["PutRequest"]["Item"]["pr"]["S"], r["PutRequest"]["Item"]["event_key"]["S"])]
+                for r in unprocessed]
+
+
+class EventWriter:
+    def __init__(self, store, batch_size=BATCH_SIZE, flush_interval=0.05,
+                 retry_backoff=0.05, max_backoff=2.0, max_close_attempts=10):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.max_close_attempts = max_close_attempts
+        self._pending = collections.deque()  # (monotonic append time, event)
+        self._in_flight = 0
+        self._flushing = 0        # callers waiting in flush()
+        self._closed = False
+        self._failures = 0        # consecutive writes that left items unwritten
+        self._retry_at = 0.0
+        self.last_error = None
+        self.written = 0
+        self.batches = 0
+        self.retried = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, event):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EventWriter is closed")
+            self._pending.append((time.monotonic(), event))
+            # Wake the writer to start the flush timer, or because a batch is full.
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every event appended so far is written; False on timeout."""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout=None):
+        """Flush, then stop the writer thread. Raises if events could not be written."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._pending:
+            raise RuntimeError(f"{len(self._pending)} event(s) not written: {self.last_error}")
+
+    def _take_batch(self):
+        """Pop up to batch_size pending events, at most one per PR, keeping the rest in order."""
+        batch, skipped, prs = [], [], set()
+        # Bound the scan so a burst on a few PRs cannot make this quadratic.
+        while self._pending and len(batch) < self.batch_size and len(skipped) < 4 * self.batch_size:
+            entry = self._pending.popleft()
+            key = (entry[1].repo, entry[1].pr_number)
+            if key in prs:
+                skipped.append(entry)
+            else:
+                prs.add(key)
+                batch.append(entry)
+        self._pending.extendleft(reversed(skipped))
+        return batch
+
+    def _wait_time(self):
+        """Seconds until the next batch is due; 0 if now, None if nothing is pending."""
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        if now < self._retry_at:
+            return self._retry_at - now
+        if len(self._pending) >= self.batch_size or self._flushing or self._closed:
+            return 0
+        return max(self._pending[0][0] + self.flush_interval - now, 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while (wait := self._wait_time()) != 0:
+                    if wait is None and self._closed:
+                        return
+                    self._cond.wait(wait)
+                batch = self._take_batch()
+                self._in_flight = len(batch)
+
+            events = [event for _, event in batch]
+            try:
+                unprocessed = set(map(id, self.store.write_batch(events)))
+            except Exception as exc:  # throttling, network: retry the whole batch
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                unprocessed = set(map(id, events))
+
+            with self._cond:
+                self.batches += 1
+                self.written += len(batch) - len(unprocessed)
+                # Unprocessed events go back to the front with their append times.
+                self._pending.extendleft(reversed([entry for entry in batch if id(entry[1]) in unprocessed]))
+                self._in_flight = 0
+                if unprocessed:
+                    self.retried += len(unprocessed)
+                    self._failures += 1
+                    if self._closed and self._failures >= self.max_close_attempts:
+                        return  # close() reports what is left
+                    self._retry_at = time.monotonic() + min(
+                        self.retry_backoff * 2 ** (self._failures - 1), self.max_backoff)
+                else:
+                    self._failures = 0
+                self._cond.notify_all()
+
+
+def _benchmark(events, prs, batch_size, flush_interval):
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteEventStore(os.path.join(directory, "events.db"))
+        start = time.perf_counter()
+        with EventWriter(store, batch_size=batch_size, flush_interval=flush_interval) as writer:
+            for n in range(events):
+                writer.append(PREvent("codegenie/service", n % prs, time.time(), "CHECKS_STARTED",
+                                      "github-webhook", {"n": n}))
+        seconds = time.perf_counter() - start
+        ordered = all([e.payload["n"] for e in store.events("codegenie/service", pr)]
+                      == list(range(pr, events, prs)) for pr in range(prs))
+        store.close()
+    return seconds, writer.batches, ordered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--prs", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    for label, batch_size, interval in (("single-item puts", 1, 0.0), ("batched (25)", BATCH_SIZE, 0.05)):
+        seconds, batches, ordered = _benchmark(args.events, args.prs, batch_size, interval)
+        print(f"  {label:<18} {seconds:7.2f}s  {batches:6d} writes  per-PR order {'kept' if ordered else 'BROKEN'}")
+
+
+if __name__ == "__main__":
+    main()
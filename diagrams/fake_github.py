@@ -0,0 +1,188 @@
+"""Local fake of GitHub's GraphQL and REST endpoints for exercising github_poller.py.
+
+Answers the aliased ``repository { pullRequest }`` queries that
+build_query() produces, and the REST reads of poll_rest() with ETags and
+free 304s. PR data is derived from the PR number, so it is
+deterministic, and a handful of PRs are deliberately conflicting, behind,
+failing or missing. Every response carries GitHub-style rate-limit
+headers from a points budget. ``throttle_every`` answers every n-th
+request with a 403 and ``Retry-After``, the way the secondary rate limit does.
+
+    async with FakeGitHub(latency=0.05) as server:
+        async with GitHubPoller("token", url=server.url) as poller:
+            ...
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+
+# alias, owner variable, name variable, PR number
+ALIAS = re.compile(r"(pr\d+): repository\(owner: \$(\w+), name: \$(\w+)\) \{\s*pullRequest\(number: (\d+)\)")
+
+
+def fake_pull_request(pr_number, revision=0):
+    """Deterministic ``pullRequest`` node for a PR number, or None if it "does not exist".
+
+    Bumping ``revision`` adds a label, standing in for a change on GitHub.
+    """
+    if pr_number % 97 == 96:
+        return None
+    failing = pr_number % 7 == 3
+    pending = pr_number % 5 == 0
+    contexts = [{"name": "jenkins/build", "conclusion": "FAILURE" if failing else "SUCCESS"},
+                {"context": "policy-bot", "state": "PENDING" if pending else "SUCCESS"}]
+    labels = [{"name": "codegenie"}] + ([{"name": "sod-2-approval"}] if pr_number % 4 == 0 else [])
+    if revision:
+        labels.append({"name": f"revision-{revision}"})
+    conflicting = pr_number % 11 == 10
+    return {
+        "state": "MERGED" if pr_number % 31 == 30 else "OPEN",
+        "headRefOid": f"{pr_number:040x}",
+        "mergeable": "CONFLICTING" if conflicting else "MERGEABLE",
+        "mergeStateStatus": "DIRTY" if conflicting else "BEHIND" if pr_number % 13 == 12 else "CLEAN",
+        "reviewDecision": "APPROVED" if pr_number % 3 == 0 else "REVIEW_REQUIRED",
+        "labels": {"nodes": labels},
+        "commits": {"nodes": [{"commit": {"statusCheckRollup": {
+            "state": "FAILURE" if failing else "PENDING" if pending else "SUCCESS",
+            "contexts": {"nodes": contexts},
+        }}}]},
+    }
+
+
+def fake_rest_resources(node, pr_number):
+    """The REST payloads poll_rest() reads, derived from a GraphQL node: path suffix → body."""
+    contexts = node["commits"]["nodes"][0]["commit"]["statusCheckRollup"]["contexts"]["nodes"]
+    merge_state = ("dirty" if node["mergeable"] == "CONFLICTING"
+                   else "behind" if node["mergeStateStatus"] == "BEHIND" else "clean")
+    sha = node["headRefOid"]
+    return {
+        f"pulls/{pr_number}": {
+            "state": "closed" if node["state"] != "OPEN" else "open",
+            "merged": node["state"] == "MERGED",
+            "head": {"sha": sha},
+            "mergeable_state": merge_state,
+            "labels": node["labels"]["nodes"],
+        },
+        f"commits/{sha}/check-runs": {"check_runs": [
+            {"name": c["name"], "status": "completed", "conclusion": c["conclusion"].lower()}
+            for c in contexts if "name" in c]},
+        f"commits/{sha}/status": {"statuses": [
+            {"context": c["context"], "state": c["state"].lower()} for c in contexts if "context" in c]},
+        f"pulls/{pr_number}/reviews": (
+            [{"user": {"login": "approver-bot"}, "state": "APPROVED"}]
+            if node["reviewDecision"] == "APPROVED" else []),
+    }
+
+
+REST_PATH = re.compile(r"/repos/[^/]+/[^/]+/((?:pulls|commits)/.+)$")
+PR_NUMBER = re.compile(r"pulls/(\d+)|commits/([0-9a-f]{40})/")
+
+
+class FakeGitHub:
+    def __init__(self, latency=0.0, limit=5000, reset_after=3600, throttle_every=0, retry_after=1):
+        self.latency = latency
+        self.limit = limit
+        self.remaining = limit
+        self.reset_at = time.time() + reset_after
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.not_modified = 0
+        self.revisions = {}  # pr_number → revision, see change()
+        self.url = None
+        self.rest_url = None
+        self._runner = None
+
+    def change(self, pr_number):
+        """Make a PR differ from what clients have seen, invalidating its ETags."""
+        self.revisions[pr_number] = self.revisions.get(pr_number, 0) + 1
+
+    def _rate_limit_headers(self, cost):
+        self.remaining = max(self.remaining - cost, 0)
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(self.reset_at)),
+        }
+
+    async def _throttled(self):
+        """Count and delay a request; return a secondary-limit 403 when it is due."""
+        from aiohttp import web
+
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if self.throttle_every and self.requests % self.throttle_every == 0:
+            return web.json_response({"message": "You have exceeded a secondary rate limit."},
+                                     status=403, headers={"Retry-After": str(self.retry_after)})
+        return None
+
+    async def _rest(self, request):
+        from aiohttp import web
+
+        throttled = await self._throttled()
+        if throttled is not None:
+            return throttled
+        resource = REST_PATH.search(request.path).group(1)
+        # Commit resources are addressed by sha; the fake sha is the PR number in hex.
+        pulls, sha = PR_NUMBER.match(resource).groups()
+        pr_number = int(pulls) if pulls else int(sha, 16)
+        node = fake_pull_request(pr_number, self.revisions.get(pr_number, 0))
+        body = fake_rest_resources(node, pr_number).get(resource) if node else None
+        if body is None:
+            return web.json_response({"message": "Not Found"}, status=404, headers=self._rate_limit_headers(1))
+        payload = json.dumps(body).encode()
+        etag = '"%s"' % hashlib.sha1(payload).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            # Conditional hits are free: no rate-limit points are spent.
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag, **self._rate_limit_headers(0)})
+        headers = {"ETag": etag, **self._rate_limit_headers(1)}
+        return web.Response(body=payload, content_type="application/json", headers=headers)
+
+    async def _graphql(self, request):
+        from aiohttp import web
+
+        throttled = await self._throttled()
+        if throttled is not None:
+            return throttled
+        request_body = await request.json()
+        query, variables = request_body["query"], request_body.get("variables") or {}
+        data, errors = {}, []
+        aliases = ALIAS.findall(query)
+        for alias, owner, name, number in aliases:
+            if owner not in variables or name not in variables:
+                return web.json_response({"errors": [{"message": f"Variable ${owner} or ${name} is not defined"}]},
+                                         status=200)
+            node = fake_pull_request(int(number), self.revisions.get(int(number), 0))
+            data[alias] = {"pullRequest": node}
+            if node is None:
+                errors.append({"type": "NOT_FOUND", "path": [alias, "pullRequest"],
+                               "message": f"Could not resolve to a PullRequest with the number of {number}."})
+        cost = max(1, len(aliases) // 100)
+        headers = self._rate_limit_headers(cost)
+        data["rateLimit"] = {"cost": cost, "remaining": self.remaining, "resetAt": self.reset_at}
+        body = {"data": data}
+        if errors:
+            body["errors"] = errors
+        return web.json_response(body, headers=headers)
+
+    async def __aenter__(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/graphql", self._graphql)
+        app.router.add_get("/repos/{owner}/{name}/{resource:.+}", self._rest)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.rest_url = f"http://127.0.0.1:{port}"
+        self.url = f"{self.rest_url}/graphql"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._runner.cleanup()
@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
-"""Generate all AutoMergeMedic diagrams (PNG + SVG)."""
+"""Generate all AutoMergeMedic diagrams (PNG + SVG by default, see ``--formats``).
 
+By default every graphviz builder is imported once and rendered from this
+interpreter (``--mode inprocess``). ``--mode subprocess`` runs each diagram
+script in its own interpreter, and ``--benchmark`` times both paths.
+"""
+
+import argparse
+import importlib
 import os
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
+from rendering import OUTPUT_DIR, SCRIPT_DIR, add_render_arguments, render
 
 SCRIPTS = [
     "circuit_breaker_diagram.py",
@@ -16,33 +24,161 @@ SCRIPTS = [
     "sequence_diagrams.py",
 ]
 
+# Output name → (module, builder). Each builder returns a graphviz.Digraph.
+REGISTRY = {
+    "circuit_breaker": ("circuit_breaker_diagram", "create_circuit_breaker"),
+    "state_machine": ("state_machine_diagram", "create_state_machine"),
+    "architecture": ("architecture_diagram", "create_architecture"),
+    "reconciler_flow": ("reconciler_flow_diagram", "create_reconciler_flow"),
+    "sequence_happy_path": ("sequence_diagrams", "create_happy_path"),
+    "sequence_self_healing": ("sequence_diagrams", "create_self_healing"),
+    "sequence_command_queue": ("sequence_diagrams", "create_command_queue"),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of diagrams to render at the same time (default: CPU count)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["inprocess", "subprocess"],
+        default="inprocess",
+        help="render from this interpreter, or run one interpreter per script",
+    )
+    add_render_arguments(parser)
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="run both modes uncached and print a timing report",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
 
-def main():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+def python_executable():
     venv_python = os.path.join(SCRIPT_DIR, "..", ".venv", "bin", "python3")
-    python_exe = venv_python if os.path.exists(venv_python) else sys.executable
+    return venv_python if os.path.exists(venv_python) else sys.executable
+
+
+def run_script(python_exe, script, script_args=()):
+    """Run one diagram script in its own interpreter; return its stderr on failure."""
+    result = subprocess.run(
+        [python_exe, os.path.join(SCRIPT_DIR, script), *script_args],
+        capture_output=True,
+        text=True,
+        cwd=SCRIPT_DIR,
+    )
+    return result.stderr.strip() if result.returncode != 0 else None
+
+
+def render_registered(name, formats, force=False):
+    """Build and render one registry entry; return an error message on failure."""
+    module_name, builder = REGISTRY[name]
+    try:
+        module = importlib.import_module(module_name)
+        render(getattr(module, builder)(), name, formats, force=force)
+    except Exception as exc:
+        return f"{type(exc).__name__}: {exc}"
+    return None
+
+
+def run_tasks(tasks, jobs):
+    """Run ``(label, fn)`` tasks through a bounded pool; return ``(label, error)`` pairs.
+
+    Each task spends most of its time waiting on a child process (a script
+    interpreter or ``dot``), so worker threads are enough to bound how many
+    run at once. Results come back in task order, keeping the summary stable.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(tasks)))) as pool:
+        errors = pool.map(lambda task: task[1](), tasks)
+        return list(zip([label for label, _ in tasks], errors))
+
+
+def script_args(formats, force):
+    return ["--formats", ",".join(formats)] + (["--force"] if force else [])
+
 
+def subprocess_tasks(python_exe, formats, force):
+    args = script_args(formats, force)
+    return [(script, lambda script=script: run_script(python_exe, script, args))
+            for script in SCRIPTS]
+
+
+def inprocess_tasks(formats, force):
+    # Import every builder module up front, in this thread, so the one-time
+    # import cost is paid once and never races between workers. A module that
+    # fails to import is left to its tasks, whose own import reports it as FAILED.
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    for module_name in dict.fromkeys(module for module, _ in REGISTRY.values()):
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+
+    return [(name, lambda name=name: render_registered(name, formats, force)) for name in REGISTRY]
+
+
+def report(results):
+    """Print the per-diagram OK/FAILED lines and return the failed labels."""
     failed = []
-    for script in SCRIPTS:
-        script_path = os.path.join(SCRIPT_DIR, script)
-        print(f"  Generating: {script} ...", end=" ", flush=True)
-        result = subprocess.run(
-            [python_exe, script_path],
-            capture_output=True,
-            text=True,
-            cwd=SCRIPT_DIR,
-        )
-        if result.returncode != 0:
+    for label, error in results:
+        print(f"  Generating: {label} ...", end=" ", flush=True)
+        if error is not None:
             print("FAILED")
-            print(f"    stderr: {result.stderr.strip()}")
-            failed.append(script)
+            print(f"    stderr: {error}")
+            failed.append(label)
         else:
             print("OK")
+    return failed
+
+
+def generate(mode, jobs, python_exe, formats, force=False):
+    """Generate every diagram in the given mode; return ``(failed, seconds)``."""
+    start = time.perf_counter()
+    if mode == "inprocess":
+        tasks = inprocess_tasks(formats, force)
+    else:
+        tasks = subprocess_tasks(python_exe, formats, force)
+    print(f"  Running {len(tasks)} {mode} task(s) with {min(jobs, len(tasks))} job(s)")
+    failed = report(run_tasks(tasks, jobs))
+    return failed, time.perf_counter() - start
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    python_exe = python_executable()
+
+    if args.benchmark:
+        # Subprocess first: its children never share this interpreter's imports,
+        # so running it before the in-process path keeps the comparison fair.
+        # Both runs bypass the render cache so they do the same Graphviz work.
+        timings = {}
+        failed = []
+        for mode in ("subprocess", "inprocess"):
+            mode_failed, timings[mode] = generate(mode, args.jobs, python_exe, args.formats, force=True)
+            failed += mode_failed
+            print()
+        baseline = timings["subprocess"]
+        print("Timing report")
+        for mode, seconds in timings.items():
+            speedup = f"  ({baseline / seconds:.1f}x)" if seconds else ""
+            print(f"  {mode:<12} {seconds:7.2f}s{speedup}")
+    else:
+        failed, _ = generate(args.mode, args.jobs, python_exe, args.formats, args.force)
 
     print()
     if failed:
-        print(f"{len(failed)} script(s) failed: {', '.join(failed)}")
+        print(f"{len(failed)} diagram(s) failed: {', '.join(failed)}")
         sys.exit(1)
     else:
         files = [f for f in os.listdir(OUTPUT_DIR) if not f.startswith(".")]
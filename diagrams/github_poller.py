@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""GitHub poller for reconciler STEP 3a, "trust but verify" (logical flow §9).
+
+STEP 3a needs, for every stale PR, its open/closed/merged status, check
+results, mergeability, branch-behind status, review decision and labels.
+Fetched one REST call at a time that is 5+ round trips per PR. This poller
+instead asks for all of them in one GraphQL query per batch of PRs, using
+one aliased ``repository { pullRequest }`` block per PR. Repository owners
+and names are passed as GraphQL variables, never spliced into the query. Batches run
+concurrently on one pooled aiohttp session, and the number of batches in
+flight is bounded.
+
+GitHub's rate-limit headers drive backpressure (RateLimitGate). Requests
+are spaced out as the remaining budget runs low, and they stop until the
+reset time once only the reserve is left. A 403 or 429 with
+``Retry-After`` (secondary limit) or with no budget remaining (primary
+limit) pauses every worker, not just the one that hit it, and the request
+is retried. Only NOT_FOUND errors mark a PR as missing; any other GraphQL
+error fails the batch.
+
+aiohttp is an optional dependency, imported when a GitHubPoller is opened.
+Run this module to benchmark serial against batched polling, using the
+local fake server in fake_github.py:
+
+    python github_poller.py --prs 2000 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import NamedTuple, Optional
+
+API_URL = "https://api.github.com/graphql"
+REST_URL = "https://api.github.com"
+
+# One aliased block per PR; the whole batch is a single GraphQL request.
+PR_FIELDS = """
+      state
+      headRefOid
+      mergeable
+      mergeStateStatus
+      reviewDecision
+      labels(first: 20) { nodes { name } }
+      commits(last: 1) {
+        nodes {
+          commit {
+            statusCheckRollup {
+              state
+              contexts(first: 50) {
+                nodes {
+                  ... on CheckRun { name conclusion }
+                  ... on StatusContext { context state }
+                }
+              }
+            }
+          }
+        }
+      }"""
+
+FAILED_CONCLUSIONS = frozenset({"FAILURE", "TIMED_OUT", "CANCELLED", "ACTION_REQUIRED", "STARTUP_FAILURE", "ERROR"})
+
+
+class GitHubError(RuntimeError):
+    pass
+
+
+class PRSnapshot(NamedTuple):
+    """Live GitHub state of one PR, as STEP 3b and the classifier consume it."""
+
+    repo: str                   # "owner/name"
+    pr_number: int
+    status: str                 # OPEN · CLOSED · MERGED
+    head_sha: str
+    checks: Optional[str]       # rollup: SUCCESS · FAILURE · PENDING · ERROR · EXPECTED, None if no checks
+    failed_checks: tuple
+    merge_conflict: bool
+    behind_base: bool
+    review_decision: Optional[str]  # APPROVED · CHANGES_REQUESTED · REVIEW_REQUIRED
+    labels: tuple
+
+
+def build_query(prs):
+    """GraphQL ``(query, variables)`` for a batch of ``(repo, pr_number)`` pairs, aliased pr0..prN.
+
+    Each repository gets one ``$ownerN``/``$nameN`` variable pair, shared by its PRs.
+    """
+    repos, variables, blocks = {}, {}, []
+    for i, (repo, pr_number) in enumerate(prs):
+        n = repos.get(repo)
+        if n is None:
+            n = repos[repo] = len(repos)
+            variables[f"owner{n}"], variables[f"name{n}"] = repo.split("/", 1)
+        blocks.append(
+            f"  pr{i}: repository(owner: $owner{n}, name: $name{n}) {{\n"
+            f"    pullRequest(number: {int(pr_number)}) {{{PR_FIELDS}\n    }}\n  }}"
+        )
+    declarations = ", ".join(f"${variable}: String!" for variable in variables)
+    query = (f"query({declarations}) {{\n" if variables else "query {\n") + \
+        "  rateLimit { cost remaining resetAt }\n" + "\n".join(blocks) + "\n}"
+    return query, variables
+
+
+def parse_snapshot(repo, pr_number, node):
+    """Build a PRSnapshot from one aliased ``pullRequest`` node."""
+    rollup = None
+    commits = node["commits"]["nodes"]
+    if commits:
+        rollup = commits[0]["commit"]["statusCheckRollup"]
+    failed = ()
+    if rollup is not None:
+        failed = tuple(
+            context.get("name") or context.get("context")
+            for context in rollup["contexts"]["nodes"]
+            if (context.get("conclusion") or context.get("state")) in FAILED_CONCLUSIONS
+        )
+    return PRSnapshot(
+        repo=repo,
+        pr_number=pr_number,
+        status=node["state"],
+        head_sha=node["headRefOid"],
+        checks=rollup["state"] if rollup is not None else None,
+        failed_checks=failed,
+        merge_conflict=node["mergeable"] == "CONFLICTING",
+        behind_base=node["mergeStateStatus"] == "BEHIND",
+        review_decision=node["reviewDecision"],
+        labels=tuple(label["name"] for label in node["labels"]["nodes"]),
+    )
+
+
+def _rollup(conclusions):
+    """Combine check conclusions the way GitHub's statusCheckRollup does."""
+    if not conclusions:
+        return None
+    if any(c in FAILED_CONCLUSIONS for c in conclusions):
+        return "FAILURE"
+    if any(c in ("PENDING", "QUEUED", "IN_PROGRESS", "EXPECTED", None) for c in conclusions):
+        return "PENDING"
+    return "SUCCESS"
+
+
+def _review_decision(reviews):
+    latest = {}
+    for review in reviews:
+        if review["state"] in ("APPROVED", "CHANGES_REQUESTED", "DISMISSED"):
+            latest[review["user"]["login"]] = review["state"]
+    if "CHANGES_REQUESTED" in latest.values():
+        return "CHANGES_REQUESTED"
+    return "APPROVED" if "APPROVED" in latest.values() else "REVIEW_REQUIRED"
+
+
+def parse_rest_snapshot(repo, pr_number, pull, check_runs, status, reviews):
+    """Build a PRSnapshot from the four REST payloads poll_rest() reads."""
+    contexts = [(run["name"], (run["conclusion"] or run["status"]).upper()) for run in check_runs["check_runs"]]
+    contexts += [(s["context"], s["state"].upper()) for s in status["statuses"]]
+    return PRSnapshot(
+        repo=repo,
+        pr_number=pr_number,
+        status="MERGED" if pull["merged"] else pull["state"].upper(),
+        head_sha=pull["head"]["sha"],
+        checks=_rollup([conclusion for _, conclusion in contexts]),
+        failed_checks=tuple(name for name, conclusion in contexts if conclusion in FAILED_CONCLUSIONS),
+        merge_conflict=pull["mergeable_state"] == "dirty",
+        behind_base=pull["mergeable_state"] == "behind",
+        review_decision=_review_decision(reviews),
+        labels=tuple(label["name"] for label in pull["labels"]),
+    )
+
+
+class RateLimitGate:
+    """Shared backpressure for every request the poller sends.
+
+    ``reserve`` points are never spent, so that webhooks and commands sharing
+    the token can still make calls. Below ``slow_below`` points, requests are
+    spaced evenly over the time left until the limit resets.
+    """
+
+    def __init__(self, reserve=200, slow_below=1000):
+        self.reserve = reserve
+        self.slow_below = slow_below
+        self._resume_at = 0.0
+        self._interval = 0.0
+        self._next_slot = 0.0
+        self.waited = 0.0  # seconds spent waiting, summed over requests
+
+    async def wait(self):
+        now = time.time()
+        delay = self._resume_at - now
+        if self._interval:
+            slot = max(now, self._next_slot, self._resume_at)
+            self._next_slot = slot + self._interval
+            delay = slot - now
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    def observe(self, headers):
+        """Adjust pacing from a response's rate-limit headers."""
+        now = time.time()
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            self._resume_at = max(self._resume_at, now + float(retry_after))
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        remaining, reset = int(remaining), float(reset)
+        if remaining <= self.reserve:
+            self._resume_at = max(self._resume_at, reset)
+            self._interval = 0.0
+        elif remaining < self.slow_below:
+            self._interval = max(reset - now, 0.0) / (remaining - self.reserve)
+        else:
+            self._interval = 0.0
+
+
+class GitHubPoller:
+    """Async context manager that polls PRs in batched GraphQL requests.
+
+        async with GitHubPoller(token) as poller:
+            snapshots = await poller.poll([("org/repo", 123), ...])
+    """
+
+    def __init__(self, token, url=API_URL, batch_size=50, concurrency=8,
+                 max_attempts=4, gate=None, timeout=30, rest_url=REST_URL, cache=None):
+        self.token = token
+        self.url = url
+        self.rest_url = rest_url
+        self.cache = cache
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.gate = gate or RateLimitGate()
+        self.timeout = timeout
+        self.requests = 0
+        self._session = None
+
+    async def __aenter__(self):
+        import aiohttp  # optional dependency, only needed for polling
+
+        self._aiohttp = aiohttp
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                "Authorization": f"bearer {self.token}",
+                # mergeStateStatus (BEHIND) is behind the merge-info preview.
+                "Accept": "application/vnd.github.merge-info-preview+json",
+            },
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _send(self, method, url, **kwargs):
+        """Send one request, retrying rate limits and transient errors.
+
+        Returns ``(status, headers, body bytes)`` for any 2xx, 304 or 404.
+        """
+        aiohttp = self._aiohttp
+        for attempt in range(1, self.max_attempts + 1):
+            await self.gate.wait()
+            self.requests += 1
+            try:
+                async with self._session.request(method, url, **kwargs) as response:
+                    self.gate.observe(response.headers)
+                    if response.status in (403, 429) and ("Retry-After" in response.headers
+                                                          or response.headers.get("X-RateLimit-Remaining") == "0"):
+                        continue  # the gate now holds every worker until Retry-After or X-RateLimit-Reset
+                    if response.status >= 500 and attempt < self.max_attempts:
+                        await asyncio.sleep(2 ** (attempt - 1))
+                        continue
+                    body = await response.read()
+                    if response.status >= 400 and response.status != 404:
+                        raise GitHubError(f"GitHub {method} {url} returned {response.status}: {body.decode()}")
+                    return response.status, response.headers, body
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.max_attempts:
+                    raise
+                await asyncio.sleep(2 ** (attempt - 1))
+        raise GitHubError(f"GitHub {method} {url} failed after {self.max_attempts} attempts")
+
+    async def _post(self, query, variables):
+        """Send one GraphQL request and return the decoded response."""
+        status, _, body = await self._send("POST", self.url, json={"query": query, "variables": variables})
+        if status != 200:
+            raise GitHubError(f"GitHub GraphQL returned {status}: {body.decode()}")
+        return json.loads(body)
+
+    async def _get(self, path):
+        """Conditional REST GET through the response cache; None on 404."""
+        url = self.rest_url + path
+        headers = {"Accept": "application/vnd.github+json"}
+        cached = None
+        if self.cache is not None:
+            # Keep the entry the ETag came from: a concurrent store() may evict it before the 304.
+            cached = self.cache.lookup(url)
+            headers.update(self.cache.conditional_headers(cached))
+        status, response_headers, body = await self._send("GET", url, headers=headers)
+        if status == 404:
+            return None
+        if status == 304:
+            body = self.cache.not_modified(url, cached)
+        elif self.cache is not None:
+            self.cache.store(url, response_headers.get("ETag"), body)
+        return json.loads(body)
+
+    async def _poll_batch(self, batch, semaphore):
+        async with semaphore:
+            result = await self._post(*build_query(batch))
+        data = result.get("data") or {}
+        if not data and result.get("errors"):
+            raise GitHubError(f"GitHub GraphQL errors: {result['errors']}")
+        errors = {}  # alias → error types reported for it
+        for error in result.get("errors") or ():
+            path = error.get("path") or [None]
+            errors.setdefault(path[0], set()).add(error.get("type"))
+        snapshots = {}
+        for i, (repo, pr_number) in enumerate(batch):
+            # A missing repository or PR comes back as null with a NOT_FOUND error;
+            # any other error means the PR's state is unknown, not that it is gone.
+            node = (data.get(f"pr{i}") or {}).get("pullRequest")
+            if node is None and errors.get(f"pr{i}", {"NOT_FOUND"}) != {"NOT_FOUND"}:
+                raise GitHubError(f"GitHub GraphQL error for {repo}#{pr_number}: {sorted(map(str, errors[f'pr{i}']))}")
+            snapshots[(repo, pr_number)] = parse_snapshot(repo, pr_number, node) if node else None
+        return snapshots
+
+    async def _poll_rest(self, repo, pr_number, semaphore):
+        async with semaphore:
+            pull = await self._get(f"/repos/{repo}/pulls/{pr_number}")
+            if pull is None:
+                return None
+            sha = pull["head"]["sha"]
+            check_runs, status, reviews = await asyncio.gather(
+                self._get(f"/repos/{repo}/commits/{sha}/check-runs"),
+                self._get(f"/repos/{repo}/commits/{sha}/status"),
+                self._get(f"/repos/{repo}/pulls/{pr_number}/reviews"),
+            )
+        return parse_rest_snapshot(repo, pr_number, pull, check_runs, status, reviews)
+
+    async def poll_rest(self, prs):
+        """Like poll(), with four conditional REST reads per PR instead of GraphQL.
+
+        Costs more requests than poll() on a cold cache, but every read of an
+        unchanged resource is a 304 that the rate limit does not count.
+        """
+        prs = list(dict.fromkeys(prs))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._poll_rest(repo, n, semaphore) for repo, n in prs))
+        return dict(zip(prs, results))
+
+    async def poll(self, prs):
+        """Return ``{(repo, pr_number): PRSnapshot or None}`` for every PR."""
+        prs = list(dict.fromkeys(prs))
+        batches = [prs[i:i + self.batch_size] for i in range(0, len(prs), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        snapshots = {}
+        for result in await asyncio.gather(*(self._poll_batch(batch, semaphore) for batch in batches)):
+            snapshots.update(result)
+        return snapshots
+
+
+def poll_prs(prs, token, **options):
+    """Blocking wrapper around GitHubPoller.poll() for synchronous callers."""
+    async def run():
+        async with GitHubPoller(token, **options) as poller:
+            return await poller.poll(prs)
+    return asyncio.run(run())
+
+
+async def _benchmark(args):
+    from fake_github import FakeGitHub
+    from response_cache import ResponseCache
+
+    prs = [(f"codegenie/service-{n % 40}", n) for n in range(args.prs)]
+    cases = [
+        ("serial, 1 PR per request", dict(batch_size=1, concurrency=1)),
+        (f"batched ({args.batch_size}/request, {args.concurrency} in flight)",
+         dict(batch_size=args.batch_size, concurrency=args.concurrency)),
+    ]
+    results = {}
+    async with FakeGitHub(latency=args.latency) as server:
+        for label, options in cases:
+            if options["batch_size"] == 1 and args.prs > args.serial_limit:
+                # Serial polling of every PR would take minutes; time a sample and scale.
+                sample = prs[:args.serial_limit]
+                scale = args.prs / len(sample)
+            else:
+                sample, scale = prs, 1
+            start = time.perf_counter()
+            async with GitHubPoller("fake-token", url=server.url, **options) as poller:
+                snapshots = await poller.poll(sample)
+                requests = poller.requests
+            seconds = (time.perf_counter() - start) * scale
+            results[label] = snapshots
+            note = f" (extrapolated from {len(sample)})" if scale != 1 else ""
+            print(f"  {label:<36} {seconds:8.2f}s  {round(requests * scale):6d} requests{note}")
+
+    serial, batched = results.values()
+    if any(batched[key] != snapshot for key, snapshot in serial.items()):
+        raise SystemExit("batched and serial polling disagree")
+
+    # Conditional REST reads: a cold run, then a run after 5% of PRs changed.
+    print()
+    cache = ResponseCache()
+    async with FakeGitHub(latency=args.latency, limit=1_000_000) as server:
+        for label in ("REST, cold cache", "REST, warm cache (5% changed)"):
+            if cache:
+                for _, n in prs[::20]:
+                    server.change(n)
+            spent = server.remaining
+            start = time.perf_counter()
+            async with GitHubPoller("fake-token", url=server.url, rest_url=server.rest_url,
+                                    concurrency=args.concurrency * 4, cache=cache) as poller:
+                snapshots = await poller.poll_rest(prs)
+                requests = poller.requests
+            seconds = time.perf_counter() - start
+            spent -= server.remaining
+            print(f"  {label:<36} {seconds:8.2f}s  {requests:6d} requests  {spent:6d} rate-limit points")
+        async with GitHubPoller("fake-token", url=server.url, **cases[1][1]) as poller:
+            if snapshots != await poller.poll(prs):
+                raise SystemExit("REST and GraphQL polling disagree")
+    print(f"  cache: {cache.metrics()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prs", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server round-trip seconds")
+    parser.add_argument("--serial-limit", type=int, default=200, help="PRs to time in serial mode")
+    args = parser.parse_args(argv)
+
+    query, variables = build_query([('codegenie/x") { id } pr1: repository(owner: "y', 1)])
+    assert '"' not in query and variables["name0"].startswith('x")'), "a repository name reached the query text"
+    asyncio.run(_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Per-PR history summaries, kept up to date as events are appended (logical flow §6).
+
+Classification rules 5, 8 and 9 ask whether the awaited bot has responded:
+is there a Policy Bot event after checks passed, an approval after policy
+passed, a merge attempt after approval? Answering by rescanning the full
+event history costs O(events) per PR per run. Instead, the Event Processor
+calls SummaryStore.record() next to each Events Table append (§13 STEP 5).
+A summary holds the last timestamp of each event type, the current state,
+and when that state was entered, so bot_responded() is O(1).
+
+An event that arrives late, older than the PR's latest event, still
+updates ``last_seen``, but it does not move the state.
+
+The summaries can always be rebuilt by replaying an event log (event_log.py),
+for backfills or after a schema change. ``check`` writes random events,
+some of them late, and verifies that the rebuild matches incremental upkeep:
+
+    python history_summary.py rebuild LOG_DIR summaries.json
+    python history_summary.py check --events 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from state_machine import State
+
+# State a PR is in after each event type, for events that move it (§2, §13 STEP 3).
+# STATE_DRIFT_CORRECTED carries the corrected state in payload["state"].
+EVENT_STATES = {
+    "PR_OPENED": State.CREATED,
+    "CHECKS_STARTED": State.CHECKS_RUNNING,
+    "CHECKS_PASSED": State.CHECKS_PASSED,
+    "CHECKS_FAILED": State.CHECKS_FAILED,
+    "POLICY_STARTED": State.POLICY_EVALUATING,
+    "POLICY_PASSED": State.POLICY_PASSED,
+    "POLICY_FAILED": State.POLICY_FAILED,
+    "APPROVAL_GRANTED": State.APPROVED,
+    "MERGE_ATTEMPTED": State.MERGING,
+    "MERGE_SUCCEEDED": State.MERGED,
+    "PR_MERGED": State.MERGED,
+    "PR_CLOSED": State.CLOSED,
+    "ESCALATED_NEEDS_INTERVENTION": State.NEEDS_INTERVENTION,
+}
+
+# Rules 5, 8, 9: state → (event the wait starts from, events that count as the bot responding).
+# In POLICY_EVALUATING, Policy Bot has started, so only a verdict counts.
+AWAITED_RESPONSES = {
+    State.CHECKS_PASSED: ("CHECKS_PASSED", ("POLICY_STARTED", "POLICY_PASSED", "POLICY_FAILED")),
+    State.POLICY_EVALUATING: ("CHECKS_PASSED", ("POLICY_PASSED", "POLICY_FAILED")),
+    State.POLICY_PASSED: ("POLICY_PASSED", ("APPROVAL_GRANTED",)),
+    State.APPROVED: ("APPROVAL_GRANTED", ("MERGE_ATTEMPTED", "MERGE_SUCCEEDED", "MERGE_FAILED")),
+}
+
+
+class PRSummary:
+    __slots__ = ("state", "state_entered_at", "last_event_at", "last_seen")
+
+    def __init__(self, state=None, state_entered_at=None, last_event_at=None, last_seen=None):
+        self.state = state
+        self.state_entered_at = state_entered_at
+        self.last_event_at = last_event_at
+        self.last_seen = last_seen or {}  # event_type → latest timestamp
+
+    def __eq__(self, other):
+        return isinstance(other, PRSummary) and self.to_json() == other.to_json()
+
+    def __repr__(self):
+        return f"PRSummary({self.to_json()})"
+
+    def record(self, event_type, timestamp, state=None):
+        """Fold one event in. ``state`` overrides the state implied by EVENT_STATES."""
+        if timestamp >= self.last_seen.get(event_type, float("-inf")):
+            self.last_seen[event_type] = timestamp
+        latest = self.last_event_at is None or timestamp >= self.last_event_at
+        if latest:
+            self.last_event_at = timestamp
+        state = state if state is not None else EVENT_STATES.get(event_type)
+        if latest and state is not None and state is not self.state:
+            self.state = state
+            self.state_entered_at = timestamp
+
+    def last(self, event_type):
+        return self.last_seen.get(event_type)
+
+    def seen_after(self, event_types, anchor):
+        """Whether any of ``event_types`` happened after the latest ``anchor`` event."""
+        since = self.last_seen.get(anchor)
+        return since is not None and any(self.last_seen.get(t, float("-inf")) > since for t in event_types)
+
+    def bot_responded(self):
+        """The classifier's ``bot_responded`` input: has the awaited bot acted yet?
+
+        True for states that do not wait on a bot, so rules 5, 8 and 9 only
+        fire where they apply.
+        """
+        awaited = AWAITED_RESPONSES.get(self.state)
+        if awaited is None:
+            return True
+        anchor, responses = awaited
+        return self.seen_after(responses, anchor)
+
+    def to_json(self):
+        return {
+            "state": self.state.name if self.state is not None else None,
+            "state_entered_at": self.state_entered_at,
+            "last_event_at": self.last_event_at,
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        state = State[data["state"]] if data["state"] is not None else None
+        return cls(state, data["state_entered_at"], data["last_event_at"], dict(data["last_seen"]))
+
+
+def _event_state(event_type, payload):
+    if event_type == "STATE_DRIFT_CORRECTED":
+        return State[payload["state"]] if payload.get("state") else None
+    return None
+
+
+class SummaryStore:
+    """Summaries keyed by ``(repo, pr_number)``."""
+
+    def __init__(self):
+        self._summaries = {}
+
+    def __len__(self):
+        return len(self._summaries)
+
+    def __eq__(self, other):
+        return isinstance(other, SummaryStore) and self._summaries == other._summaries
+
+    def get(self, repo, pr_number):
+        return self._summaries.get((repo, pr_number))
+
+    def items(self):
+        return self._summaries.items()
+
+    def record(self, event, state=None):
+        """Fold a PREvent into its PR's summary; call it with every Events Table append."""
+        summary = self._summaries.get((event.repo, event.pr_number))
+        if summary is None:
+            summary = self._summaries[(event.repo, event.pr_number)] = PRSummary()
+        summary.record(event.event_type, event.event_timestamp,
+                       state if state is not None else _event_state(event.event_type, event.payload))
+        return summary
+
+    def discard(self, repo, pr_number):
+        """Drop a summary, e.g. when the PR's State Table record expires."""
+        self._summaries.pop((repo, pr_number), None)
+
+    def save(self, path):
+        """Write every summary to ``path`` as JSON, atomically."""
+        data = [[repo, pr_number, summary.to_json()] for (repo, pr_number), summary in self._summaries.items()]
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".summaries-", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        with open(path) as f:
+            for repo, pr_number, data in json.load(f):
+                store._summaries[(repo, pr_number)] = PRSummary.from_json(data)
+        return store
+
+    @classmethod
+    def rebuild(cls, log_dir):
+        """Replay every event in an event log, in write order per PR."""
+        from event_log import EVENT_TYPES, EventLog
+
+        store = cls()
+        drift = EVENT_TYPES.index("STATE_DRIFT_CORRECTED")
+        with EventLog(log_dir) as log:
+            for (repo, pr_number), records in log.histories():
+                summary = store._summaries[(repo, pr_number)] = PRSummary()
+                for record, (segment, row) in zip(records, log.locate(repo, pr_number)):
+                    state = None
+                    if record["event_type"] == drift:
+                        state = _event_state("STATE_DRIFT_CORRECTED", log.payload(segment, record))
+                    summary.record(EVENT_TYPES[record["event_type"]], int(record["timestamp_us"]) / 1_000_000, state)
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="rebuild every summary from an event log")
+    rebuild.add_argument("log_dir")
+    rebuild.add_argument("output")
+    check = commands.add_parser("check", help="compare a rebuild with incremental upkeep on random events")
+    check.add_argument("--events", type=int, default=20_000)
+    check.add_argument("--prs", type=int, default=500)
+    check.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        _check(args.events, args.prs, args.seed)
+        return
+    start = time.perf_counter()
+    store = SummaryStore.rebuild(args.log_dir)
+    store.save(args.output)
+    print(f"  Rebuilt {len(store)} summaries in {time.perf_counter() - start:.2f}s → {args.output}")
+
+
+def _check(events, prs, seed):
+    """Rebuild from a log must equal incremental upkeep, and late events must not move the state."""
+    from event_log import EventLogWriter
+    from event_writer import PREvent
+
+    rng = random.Random(seed)
+    types = list(EVENT_STATES) + ["MERGE_FAILED", "REMEDIATION_REBUILD", "STATE_DRIFT_CORRECTED"]
+    incremental = SummaryStore()
+    with tempfile.TemporaryDirectory() as log_dir:
+        writer = EventLogWriter(log_dir, segment_records=4096)
+        batch = []
+        for n in range(events):
+            key = (f"codegenie/service-{n % 7}", rng.randrange(prs))
+            # About one event in ten arrives up to ten minutes late.
+            timestamp = 1_700_000_000 + n - (rng.randrange(600) if rng.random() < 0.1 else 0)
+            event_type = rng.choice(types)
+            payload = {"state": rng.choice(list(State)).name} if event_type == "STATE_DRIFT_CORRECTED" else {}
+            event = PREvent(*key, timestamp, event_type, "reconciler", payload)
+            before = incremental.get(*key)
+            before = (before.state, before.state_entered_at, before.last_event_at) if before else (None, None, None)
+            summary = incremental.record(event)
+            if before[2] is not None and timestamp < before[2]:
+                assert (summary.state, summary.state_entered_at) == before[:2], (key, event, summary)
+            batch.append(event)
+            if len(batch) == 25:
+                writer.append(batch)
+                batch = []
+        writer.append(batch)
+        start = time.perf_counter()
+        rebuilt = SummaryStore.rebuild(log_dir)
+        elapsed = time.perf_counter() - start
+    assert rebuilt == incremental, "rebuild differs from incremental upkeep"
+    print(f"  {events} events, {len(rebuilt)} PRs: rebuild ({elapsed:.2f}s) matches incremental upkeep;"
+          f" late events never moved the state")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Startup benchmark for architecture_diagram.py using ``python -X importtime``.
+
+Compares importing the module (the diagrams package is deferred until
+create_architecture() runs) with importing the diagrams modules it used to
+pull in at module level.
+"""
+
+import os
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# What `import architecture_diagram` used to import eagerly.
+EAGER_IMPORTS = [
+    "diagrams",
+    "diagrams.aws.compute",
+    "diagrams.aws.integration",
+    "diagrams.generic.database",
+    "diagrams.aws.management",
+    "diagrams.onprem.ci",
+    "diagrams.onprem.vcs",
+    "diagrams.aws.network",
+]
+
+CASES = [
+    ("lazy (current)", "import architecture_diagram"),
+    ("eager (previous)", "import architecture_diagram; " + "; ".join(f"import {m}" for m in EAGER_IMPORTS)),
+]
+
+RUNS = 5
+
+
+def import_time_us(code):
+    """Total import time in microseconds reported by ``-X importtime`` for ``code``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=SCRIPT_DIR,
+        check=True,
+    )
+    total = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        self_us = line.split(":", 1)[1].split("|", 1)[0].strip()
+        if self_us.isdigit():
+            total += int(self_us)
+    return total
+
+
+def main():
+    print(f"  -X importtime, best of {RUNS} runs")
+    results = {}
+    for label, code in CASES:
+        results[label] = min(import_time_us(code) for _ in range(RUNS))
+        print(f"  {label:<18} {results[label] / 1000:8.1f} ms")
+    lazy, eager = results.values()
+    print(f"  {'saving':<18} {(eager - lazy) / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
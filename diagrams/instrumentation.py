@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Reconciler instrumentation: per-stage latency histograms and counters (logical flow §9; story 10.1).
+
+Each §9 run is split into RECONCILER_STAGES. A run gets one RunTimer, and
+the reconciler calls ``timer.lap(stage)`` as each piece of work ends. A lap
+is one perf_counter_ns() call plus an addition, because every lap starts
+where the previous one ended. Per-PR steps therefore add up over the run
+at almost no cost. finish() records each stage's total for the run, and
+the whole run, into a LatencyHistogram.
+
+LatencyHistogram is HDR-style. Values are integer nanoseconds in
+log-linear buckets: 16 sub-buckets per power of two, so any quantile is
+within 6.25% of the true value. The histogram is a fixed array of counts,
+with no allocation per value. Counters, such as remediations by strategy,
+carry Prometheus-style labels.
+
+Timing is sampled per run (``sample_rate``), so an unsampled run pays for
+no-op laps only. Counters are always kept. Metrics exports Prometheus text
+exposition (prometheus_text()) and CloudWatch Embedded Metric Format
+documents (emf()), one per stage, so CloudWatch keeps the distribution.
+EMF accepts at most 100 values per metric, so adjacent buckets are merged
+down to EMF_MAX_VALUES.
+
+Run this module to time the simulator's reconciler runs at each sampling
+setting, and to print both export formats. On a shared machine, run-to-run
+drift is larger than 1%, so the A/B timings are informational only. The
+overhead figure is built from its parts instead: the laps and runs a
+simulation makes, times the measured cost of a lap and of starting and
+finishing a run. The module asserts that this estimate stays under 1% at
+the default sampling rate. The in-memory simulation is the worst case,
+because the reconciler's dependencies there cost nothing:
+
+    python instrumentation.py --fleet 10000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+
+_now = time.perf_counter_ns
+# §9 steps a run's time is split into.
+RECONCILER_STAGES = (
+    "query",        # STEP 1, stale PRs from the index
+    "breaker",      # STEP 2
+    "github_poll",  # STEP 3a
+    "drift",        # STEP 3b
+    "classify",     # STEP 3c
+    "budget",       # STEP 3d, including escalation
+    "dispatch",     # STEP 3e
+    "record",       # STEP 3f, State Table and index writes
+)
+
+SUB_BUCKET_BITS = 4
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_BUCKETS = 64 * _SUB_BUCKETS
+
+SAMPLE_RATE = 0.1  # share of runs timed; counters are always kept
+
+EMF_MAX_VALUES = 100  # CloudWatch limit on Values per metric
+
+# Prometheus histogram bucket bounds, in seconds.
+EXPORT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                  1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _bucket(ns):
+    if ns < 2 * _SUB_BUCKETS:
+        return max(ns, 0)
+    shift = ns.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * _SUB_BUCKETS + (ns >> shift)
+
+
+def _lower_bound(index):
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift = index // _SUB_BUCKETS - 1
+    return (index - shift * _SUB_BUCKETS) << shift
+
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond durations."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, ns):
+        self.counts[_bucket(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if ns > self.max:
+            self.max = ns
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def buckets(self):
+        """``(lower_ns, upper_ns, count)`` for each non-empty bucket, in order."""
+        return [(_lower_bound(i), _lower_bound(i + 1), c) for i, c in enumerate(self.counts) if c]
+
+    def quantile(self, q):
+        """Nanoseconds at quantile ``q`` (bucket midpoint, clamped to min and max); None if empty."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for lower, upper, count in self.buckets():
+            seen += count
+            if seen >= rank:
+                return min(max((lower + upper) // 2, self.min), self.max)
+        return self.max
+
+
+class RunTimer:
+    """Splits one reconciler run into stages; laps must follow the work they time."""
+
+    __slots__ = ("_metrics", "_totals", "_start", "_last")
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+        self._totals = dict.fromkeys(metrics.stages, 0)
+        self._start = self._last = _now()
+
+    def lap(self, stage):
+        """Charge the time since the previous lap (or the run's start) to ``stage``."""
+        now = _now()
+        self._totals[stage] += now - self._last
+        self._last = now
+
+    def skip(self):
+        """Leave the time since the previous lap uncharged, e.g. work outside the run."""
+        self._last = _now()
+
+    def finish(self):
+        histograms = self._metrics.histograms
+        for stage, ns in self._totals.items():
+            histograms[stage].record(ns)
+        histograms["run"].record(_now() - self._start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+    def skip(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _emf_distribution(buckets, limit=EMF_MAX_VALUES):
+    """``(values_ms, counts)`` from HDR buckets, merging runs of adjacent buckets to at most ``limit`` values.
+
+    A merged value is the count-weighted mean of its buckets' midpoints, so the sum is kept.
+    """
+    group = -(-len(buckets) // limit)
+    values, counts = [], []
+    for start in range(0, len(buckets), group):
+        chunk = buckets[start:start + group]
+        count = sum(c for _, _, c in chunk)
+        values.append(sum((lower + upper) / 2e6 * c for lower, upper, c in chunk) / count)
+        counts.append(count)
+    return values, counts
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    def __init__(self, sample_rate=SAMPLE_RATE, stages=RECONCILER_STAGES, seed=None):
+        self.sample_rate = sample_rate
+        self.stages = stages
+        self.histograms = {name: LatencyHistogram() for name in stages + ("run",)}
+        self.counters = {}  # (name, ((label, value), ...)) → count
+        self._rng = random.Random(seed)
+
+    def run(self):
+        """A RunTimer for the next reconciler run, or a no-op one if the run is not sampled."""
+        if self.sample_rate >= 1.0 or self._rng.random() < self.sample_rate:
+            return RunTimer(self)
+        return _NULL_TIMER
+
+    def count(self, name, value=1, **labels):
+        key = (name, _labels(labels)) if labels else (name, ())
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        """Start a new export period."""
+        self.histograms = {name: LatencyHistogram() for name in self.histograms}
+        self.counters = {}
+
+    def prometheus_text(self, prefix="reconciler"):
+        """Prometheus text exposition format."""
+        lines = [f"# HELP {prefix}_stage_seconds Time spent per reconciler run in each §9 step.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, histogram in self.histograms.items():
+            cumulative, buckets = 0, histogram.buckets()
+            for bound in EXPORT_BUCKETS:
+                # HDR buckets never straddle the coarser export bounds by more than 6.25%.
+                while buckets and buckets[0][1] <= bound * 1e9:
+                    cumulative += buckets.pop(0)[2]
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.total / 1e9}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter, labels), value in sorted(self.counters.items(), key=lambda item: str(item[0])):
+                if counter == name:
+                    rendered = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{prefix}_{name}_total{{{rendered}}} {value}" if rendered
+                                 else f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def emf(self, namespace="SelfHealingPR/Reconciler", timestamp=None):
+        """CloudWatch Embedded Metric Format documents, one JSON line each.
+
+        Stage durations are sent as ``Values``/``Counts`` pairs (bucket
+        midpoints in milliseconds, at most EMF_MAX_VALUES of them), so
+        CloudWatch computes percentiles from the whole distribution.
+        """
+        timestamp = int((time.time() if timestamp is None else timestamp) * 1000)
+        documents = []
+        for stage, histogram in self.histograms.items():
+            if not histogram.count:
+                continue
+            values, counts = _emf_distribution(histogram.buckets())
+            documents.append({
+                "_aws": {"Timestamp": timestamp, "CloudWatchMetrics": [{
+                    "Namespace": namespace, "Dimensions": [["Stage"]],
+                    "Metrics": [{"Name": "Duration", "Unit": "Milliseconds"}],
+                }]},
+                "Stage": stage,
+                "Duration": {
+                    "Values": values,
+                    "Counts": counts,
+                    "Min": histogram.min / 1e6, "Max": histogram.max / 1e6,
+                    "Count": histogram.count, "Sum": histogram.total / 1e6,
+                },
+            })
+        for (name, labels), value in self.counters.items():
+            documents.append(dict({
+                "_aws": {"Timestamp": timestamp, "CloudWatchMetrics": [{
+                    "Namespace": namespace, "Dimensions": [[k for k, _ in labels]],
+                    "Metrics": [{"Name": name, "Unit": "Count"}],
+                }]},
+                name: value,
+            }, **{k: str(v) for k, v in labels}))
+        return [json.dumps(document, ensure_ascii=False) for document in documents]
+
+
+class _CountingMetrics(Metrics):
+    """Counts laps instead of timing them; for the overhead estimate."""
+
+    laps = 0
+
+    def run(self):
+        metrics = self
+
+        class Timer(_NullTimer):
+            __slots__ = ()
+
+            def lap(self, stage):
+                metrics.laps += 1
+
+        return Timer()
+
+
+def main(argv=None):
+    from simulator import Simulation
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="simulations per setting; the fastest counts")
+    args = parser.parse_args(argv)
+
+    # The simulation is deterministic, so every setting times the same reconciler runs.
+    # Settings alternate and the collector is paused, so neither drift nor GC lands on one.
+    settings = (("off", 0.0), (f"sampled {SAMPLE_RATE:.0%}", SAMPLE_RATE), ("every run", 1.0))
+    timings = dict.fromkeys((label for label, _ in settings), float("inf"))
+    gc.disable()
+    try:
+        for _ in range(args.repeat):
+            for label, sample_rate in settings:
+                metrics = Metrics(sample_rate, seed=1)
+                simulation = Simulation(args.fleet, metrics=metrics)
+                simulation.run()
+                timings[label] = min(timings[label], sum(simulation.run_seconds))
+                gc.collect()
+    finally:
+        gc.enable()
+
+    # The same cost from its parts: laps and runs times what each costs.
+    counting = _CountingMetrics(0.0)
+    Simulation(args.fleet, metrics=counting).run()
+    runs = len(simulation.run_seconds)
+    n = 1_000_000
+    laps = []
+    for timer in (_NULL_TIMER, RunTimer(Metrics())):
+        lap = timer.lap
+        start = time.perf_counter()
+        for _ in range(n):
+            lap("classify")
+        laps.append((time.perf_counter() - start) / n)
+    # A run's fixed cost: Metrics.run() (the sampling draw) plus finish(), unsampled and sampled.
+    starts = []
+    for sample_rate in (0.0, 1.0):
+        scratch = Metrics(sample_rate, seed=1)
+        start = time.perf_counter()
+        for _ in range(n // 10):
+            scratch.run().finish()
+        starts.append((time.perf_counter() - start) / (n // 10))
+    print(f"  {runs} reconciler runs over {args.fleet:,} PRs, {counting.laps:,} laps;"
+          f" a lap costs {laps[1] * 1e9:.0f} ns timed, {laps[0] * 1e9:.0f} ns untimed;"
+          f" a run {starts[1] * 1e9:.0f} ns timed, {starts[0] * 1e9:.0f} ns untimed")
+    baseline = timings["off"] - counting.laps * laps[0] - runs * starts[0]
+    estimates = {}
+    for label, sample_rate in settings:
+        estimates[label] = (counting.laps * (sample_rate * laps[1] + (1 - sample_rate) * laps[0])
+                            + runs * (sample_rate * starts[1] + (1 - sample_rate) * starts[0])) / baseline
+        print(f"    {label:<12} {timings[label] * 1000:7.1f} ms  estimated {estimates[label]:.2%} over"
+              f" uninstrumented  (A/B {timings[label] / timings['off'] - 1:+.2%} over off, informational)")
+    sampled = estimates[f"sampled {SAMPLE_RATE:.0%}"]
+    assert sampled < 0.01, f"sampled instrumentation costs {sampled:.2%} of reconciler time"
+
+    run = metrics.histograms["run"]
+    print(f"  run p50 {run.quantile(0.5) / 1e6:.2f} ms  p99 {run.quantile(0.99) / 1e6:.2f} ms;"
+          f" slowest stage at p99: {max(RECONCILER_STAGES, key=lambda s: metrics.histograms[s].quantile(0.99))}")
+    text = metrics.prometheus_text()
+    print("\n".join("    " + line for line in text.splitlines() if 'stage="classify"' in line and "le=" not in line
+                    or line.startswith("reconciler_remediations_total")))
+    print("    " + metrics.emf()[RECONCILER_STAGES.index("classify")][:160] + " …")
+    assert all(len(json.loads(d).get("Duration", {}).get("Values", ())) <= EMF_MAX_VALUES for d in metrics.emf())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Priority scheduling in front of Car Bridge dispatch (logical flow §11).
+
+Commands used to be handled FIFO, so a human's ``/merge`` on a critical
+CVE PR could wait behind hundreds of reconciler ``/rebuild`` commands.
+The PriorityScheduler orders work by a deadline:
+
+    deadline = enqueued_at + SOURCE_DELAY[source]
+               - SEVERITY_CREDIT[severity] - age credit
+
+The earliest deadline is dispatched first. A PR comment has no delay, the
+Admin API 15 minutes and the reconciler an hour. A more severe
+vulnerability earns credit, and so does a PR that has been open for a
+long time. The credits are smaller than the gaps between sources, so
+source ranks first, then severity, then age. A PR comment's deadline can
+fall before it was enqueued; only the order matters. The deadline is fixed at
+enqueue time, so waiting is the aging: reconciler work enqueued at t runs
+before anything enqueued after t + SOURCE_DELAY["reconciler"]. Interactive
+commands therefore jump a batch drain, and the drain still finishes even
+if interactive traffic would otherwise use all the capacity. push() and
+pop() are heap operations, O(log n).
+
+The scheduler keeps a queue-wait histogram per source class (wait_histograms).
+
+Run this module to simulate a reconciler batch drain with interactive
+commands arriving, FIFO against priority order:
+
+    python priority_scheduler.py --batch 2000
+"""
+
+import argparse
+import bisect
+import heapq
+import itertools
+import random
+import time
+
+# Seconds a command's deadline is pushed back, by source (§11 Command Message ``source``).
+SOURCE_DELAY = {
+    "pr-comment": 0.0,
+    "admin-api": 15 * 60.0,
+    "reconciler": 60 * 60.0,
+}
+PRIORITY_CLASSES = tuple(SOURCE_DELAY)
+
+# Seconds of credit by vulnerability severity (the severities of story 1.3).
+SEVERITY_CREDIT = {"critical": 240.0, "high": 120.0, "medium": 60.0, "low": 0.0}
+
+AGE_CREDIT_PER_HOUR = 2.0  # seconds of credit per hour the PR has been open
+MAX_AGE_CREDIT = 120.0
+
+WAIT_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)  # seconds, upper bounds
+
+
+class WaitHistogram:
+    """Counts of queue waits in WAIT_BUCKETS, plus an overflow bucket."""
+
+    def __init__(self, bounds=WAIT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (inf for the overflow bucket)."""
+        if not self.total:
+            return None
+        rank = q * self.total
+        for bound, seen in zip(self.bounds + (float("inf"),), itertools.accumulate(self.counts)):
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def __repr__(self):
+        return f"WaitHistogram(n={self.total}, p50≤{self.quantile(0.5)}s, p99≤{self.quantile(0.99)}s, max={self.max:.1f}s)"
+
+
+def deadline(enqueued_at, source, severity=None, pr_age_seconds=0.0):
+    credit = SEVERITY_CREDIT.get(severity, 0.0) + min(pr_age_seconds / 3600 * AGE_CREDIT_PER_HOUR, MAX_AGE_CREDIT)
+    # No clamp at enqueued_at: a PR comment's credit must still rank it within its source.
+    return enqueued_at + SOURCE_DELAY[source] - credit
+
+
+class PriorityScheduler:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []  # (deadline, sequence, enqueued_at, source, item)
+        self._sequence = itertools.count()  # FIFO among equal deadlines
+        self.wait_histograms = {source: WaitHistogram() for source in PRIORITY_CLASSES}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item, source, severity=None, pr_age_seconds=0.0):
+        """Queue ``item``; ``severity`` is the PR's vulnerability severity, if known."""
+        now = self.clock()
+        heapq.heappush(self._heap, (deadline(now, source, severity, pr_age_seconds), next(self._sequence),
+                                    now, source, item))
+
+    def pop(self):
+        """The most urgent item, or None when the queue is empty."""
+        if not self._heap:
+            return None
+        _, _, enqueued_at, source, item = heapq.heappop(self._heap)
+        self.wait_histograms[source].record(self.clock() - enqueued_at)
+        return item
+
+
+class FIFOScheduler(PriorityScheduler):
+    """Arrival order; the benchmark baseline."""
+
+    def push(self, item, source, severity=None, pr_age_seconds=0.0):
+        now = self.clock()
+        heapq.heappush(self._heap, (now, next(self._sequence), now, source, item))
+
+
+class _SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(scheduler_class, batch, rate, interactive_every, seed=3):
+    """Drain a reconciler batch queued at t=0 at ``rate`` per second.
+
+    PR comments and Admin API commands arrive every ``interactive_every``
+    seconds on average while the batch drains.
+    """
+    rng = random.Random(seed)
+    clock = _SimulatedClock()
+    scheduler = scheduler_class(clock)
+    severities = list(SEVERITY_CREDIT)
+    for n in range(batch):
+        scheduler.push(("/rebuild", n), "reconciler", rng.choice(severities), rng.uniform(0, 72 * 3600))
+    arrivals, t = [], 0.0
+    while True:
+        t += rng.expovariate(1 / interactive_every)
+        if t > batch / rate:
+            break
+        arrivals.append((t, "pr-comment" if rng.random() < 0.7 else "admin-api", rng.choice(severities)))
+    arrivals.reverse()
+    while len(scheduler) or arrivals:
+        while arrivals and arrivals[-1][0] <= clock.now:
+            at, source, severity = arrivals.pop()
+            scheduler.push(("/merge", at), source, severity)
+        scheduler.pop()
+        clock.now += 1 / rate
+    return scheduler.wait_histograms, clock.now
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=2000, help="reconciler commands queued at once")
+    parser.add_argument("--rate", type=float, default=5.0, help="commands dispatched per second")
+    parser.add_argument("--interactive-every", type=float, default=10.0,
+                        help="mean seconds between PR-comment or Admin API commands")
+    args = parser.parse_args(argv)
+
+    # Within every source, more severe and older PRs come first.
+    for source in PRIORITY_CLASSES:
+        ranked = [deadline(0.0, source, severity) for severity in SEVERITY_CREDIT]
+        assert ranked == sorted(set(ranked)), (source, ranked)
+        assert deadline(0.0, source, "low", 72 * 3600) < deadline(0.0, source, "low"), source
+    for label, scheduler_class in (("FIFO", FIFOScheduler), ("priority", PriorityScheduler)):
+        histograms, drained = simulate(scheduler_class, args.batch, args.rate, args.interactive_every)
+        print(f"  {label} (queue empty after {drained:.0f}s)")
+        for source, histogram in histograms.items():
+            if histogram.total:
+                print(f"    {source:<11} {histogram}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
-"""Reconciler Decision Flow diagram — step-by-step logic with classification engine."""
+"""Reconciler Decision Flow diagram — step-by-step logic with classification engine.
+
+The C1..C11 classification chain is drawn from classification.RULES.
+"""
 
-import os
 import graphviz
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+from classification import RULES, Strategy
+from rendering import parse_args, render
 
 FONT = "Helvetica Neue,Helvetica,Arial"
 
@@ -75,17 +76,9 @@ def create_reconciler_flow():
     node(g, "CLASSIFY", "Classification Engine\n(priority order)", "engine")
 
     # Classification chain
-    node(g, "C1", "1. Merge conflict?\n→ CLOSE_AND_REOPEN", "classify")
-    node(g, "C2", "2. Branch behind?\n→ UPDATE_BRANCH", "classify")
-    node(g, "C3", "3. Checks failed (transient)?\n→ RETRY_CHECKS", "classify")
-    node(g, "C4", "4. Checks failed (persistent)?\n→ NEEDS_INTERVENTION", "classify")
-    node(g, "C5", "5. Policy Bot stale?\n→ RETRIGGER_POLICY", "classify")
-    node(g, "C6", "6. SOD failure?\n(Policy Bot or Approver Bot)\n→ RETRIGGER_SOD", "classify")
-    node(g, "C7", "7. Permanent policy failure?\n(foreign commit · invalid file)\n→ CLOSE_PR", "classify")
-    node(g, "C8", "8. Approver Bot stale?\n→ RETRIGGER_APPROVER", "classify")
-    node(g, "C9", "9. Automerge stale?\n→ RETRIGGER_MERGE", "classify")
-    node(g, "C10", "10. Within threshold?\n→ NO_ACTION", "noact")
-    node(g, "C11", "11. Fallthrough\n→ NEEDS_INTERVENTION", "classify")
+    for rule in RULES:
+        category = "noact" if rule.strategy is Strategy.NO_ACTION else "classify"
+        node(g, f"C{rule.number}", f"{rule.number}. {rule.question}\n→ {rule.strategy.name}", category)
 
     node(g, "BUDGET", "Retry budget\nexhausted?", "decision")
     node(g, "ESCALATE", "→ NEEDS_INTERVENTION\nSend escalation notification", "alert")
@@ -126,25 +119,22 @@ def create_reconciler_flow():
     chain_no = dict(color="#636e72", fontcolor="#636e72", penwidth="1.0")
     chain_yes = dict(color="#00b894", fontcolor="#00b894", penwidth="1.5")
 
-    g.edge("CLASSIFY", "C1", **edge_default)
-    g.edge("C1", "C2", label="no", **chain_no)
-    g.edge("C2", "C3", label="no", **chain_no)
-    g.edge("C3", "C4", label="no", **chain_no)
-    g.edge("C4", "C5", label="no", **chain_no)
-    g.edge("C5", "C6", label="no", **chain_no)
-    g.edge("C6", "C7", label="no", **chain_no)
-    g.edge("C7", "C8", label="no", **chain_no)
-    g.edge("C8", "C9", label="no", **chain_no)
-    g.edge("C9", "C10", label="no", **chain_no)
-    g.edge("C10", "C11", label="no", **chain_no)
-
-    # "yes" branches → budget or escalation
-    for c in ["C1", "C2", "C3", "C5", "C6", "C7", "C8", "C9"]:
-        g.edge(c, "BUDGET", label="yes", **chain_yes)
-
-    g.edge("C4", "ESCALATE", label="yes", color="#d63031", fontcolor="#d63031", penwidth="1.5")
-    g.edge("C11", "ESCALATE", label="matched", color="#d63031", fontcolor="#d63031", penwidth="1.5")
-    g.edge("C10", "NEXT", label="yes", color="#636e72", fontcolor="#636e72", penwidth="1.0")
+    g.edge("CLASSIFY", f"C{RULES[0].number}", **edge_default)
+    for rule, following in zip(RULES, RULES[1:]):
+        g.edge(f"C{rule.number}", f"C{following.number}", label="no", **chain_no)
+
+    # "yes" branches → budget, escalation, or nothing to do
+    for rule in RULES:
+        if rule.strategy is not Strategy.NO_ACTION and rule.reason is None:
+            g.edge(f"C{rule.number}", "BUDGET", label="yes", **chain_yes)
+
+    chain_escalate = dict(color="#d63031", fontcolor="#d63031", penwidth="1.5")
+    for rule in RULES:
+        if rule.reason is not None:
+            label = "matched" if rule is RULES[-1] else "yes"
+            g.edge(f"C{rule.number}", "ESCALATE", label=label, **chain_escalate)
+        elif rule.strategy is Strategy.NO_ACTION:
+            g.edge(f"C{rule.number}", "NEXT", label="yes", color="#636e72", fontcolor="#636e72", penwidth="1.0")
 
     # ── Edges: Budget & Dispatch ───────────────────────
 
@@ -166,11 +156,9 @@ def create_reconciler_flow():
     return g
 
 
-def main():
-    g = create_reconciler_flow()
-    for fmt in ["png", "svg"]:
-        g.format = fmt
-        g.render(filename=os.path.join(OUTPUT_DIR, "reconciler_flow"), cleanup=True)
+def main(argv=None):
+    args = parse_args(argv, __doc__)
+    render(create_reconciler_flow(), "reconciler_flow", args.formats, force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Remediation dispatch with one circuit breaker and one rate limit per dependency (logical flow §9 STEP 4, §15).
+
+Each remediation strategy targets one downstream dependency: Jenkins,
+Policy Bot, the SOD Validator, Approver Bot, Automerge Bot, or the GitHub
+API (STRATEGY_TARGETS, following the Car Bridge routes in §12). The
+Dispatcher keeps a FIFO queue per dependency. Each dependency also has its
+own CircuitBreaker (circuit_breaker.py) and its own token bucket. An action
+is sent only when its dependency's bucket holds a token and its breaker
+allows it. A Jenkins outage therefore opens the Jenkins breaker and holds
+only the Jenkins queue, while branch updates and bot retriggers keep
+flowing.
+
+The token bucket also paces recovery. After the batch rebuild of §19,
+queued /rebuild commands drain at DISPATCH_LIMITS["jenkins"] with no manual
+pacing.
+
+A failed send goes to the back of its queue. Once an action has failed
+its strategy's §7 budget of attempts (max_attempts()), it is not requeued
+again: the Dispatcher passes it to ``on_exhausted(action, attempts)``, so
+the reconciler's budget and escalation path decides what happens next.
+
+Breakers are named ``remediation:<dependency>``, so a shared
+SQLiteBreakerStore gives every reconciler worker the same per-dependency
+view.
+
+Run this module to simulate a Jenkins outage followed by a batch rebuild:
+
+    python remediation_dispatch.py --jenkins-rate 0.2
+"""
+
+import argparse
+import collections
+import time
+from typing import NamedTuple
+
+from circuit_breaker import BREAKER_CONFIG, BreakerState, CircuitBreaker
+from classification import BUDGET_KEYS, Strategy
+from state_machine import RETRY_BUDGETS
+
+# Strategy → the dependency its action calls (§10, §12).
+STRATEGY_TARGETS = {
+    Strategy.RETRY_CHECKS: "jenkins",
+    Strategy.RETRIGGER_POLICY_BOT: "policy_bot",
+    Strategy.RETRIGGER_SOD_CHECK: "sod_validator",
+    Strategy.RETRIGGER_APPROVER_BOT: "approver_bot",
+    Strategy.RETRIGGER_MERGE: "automerge_bot",
+    Strategy.UPDATE_BRANCH: "github",
+    Strategy.CLOSE_AND_REOPEN: "github",
+    Strategy.CLOSE_PR: "github",
+}
+
+DEPENDENCIES = tuple(dict.fromkeys(STRATEGY_TARGETS.values()))
+
+
+class DispatchLimit(NamedTuple):
+    rate: float  # tokens added per second
+    burst: int   # bucket capacity
+
+
+# Per-dependency pacing. Jenkins builds are the expensive ones.
+DISPATCH_LIMITS = {
+    "jenkins": DispatchLimit(rate=0.2, burst=3),
+    "policy_bot": DispatchLimit(rate=1.0, burst=5),
+    "sod_validator": DispatchLimit(rate=1.0, burst=5),
+    "approver_bot": DispatchLimit(rate=1.0, burst=5),
+    "automerge_bot": DispatchLimit(rate=0.5, burst=3),
+    "github": DispatchLimit(rate=2.0, burst=10),
+}
+
+
+class RemediationAction(NamedTuple):
+    repo: str
+    pr_number: int
+    strategy: Strategy
+
+
+def max_attempts(strategy):
+    """Failed sends allowed per action: the strategy's §7 budget, or one for strategies without a budget."""
+    return RETRY_BUDGETS.get(BUDGET_KEYS.get(strategy), 1)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def ready(self):
+        self._refill()
+        return self._tokens >= 1
+
+    def take(self):
+        """Spend one token; False if none is available."""
+        if not self.ready():
+            return False
+        self._tokens -= 1
+        return True
+
+    def wait_time(self):
+        """Seconds until a token is available."""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+
+class Dispatcher:
+    """Routes remediation actions to ``send(action)``, one queue per dependency.
+
+    ``send`` returns whether the dependency accepted the action; an
+    exception counts as a failure. Outcomes feed the dependency's breaker.
+    An action that fails max_attempts() times goes to ``on_exhausted``.
+    """
+
+    def __init__(self, send, limits=DISPATCH_LIMITS, breaker_config=BREAKER_CONFIG, breaker_store=None,
+                 clock=time.time, bucket_clock=time.monotonic, on_exhausted=None):
+        self.send = send
+        self.on_exhausted = on_exhausted
+        self.queues = {dependency: collections.deque() for dependency in limits}
+        self.buckets = {dependency: TokenBucket(limit.rate, limit.burst, bucket_clock)
+                        for dependency, limit in limits.items()}
+        self.breakers = {dependency: CircuitBreaker(f"remediation:{dependency}", breaker_config,
+                                                    breaker_store, clock)
+                         for dependency in limits}
+        self.sent = collections.Counter()
+        self.failed = collections.Counter()
+        self.exhausted = collections.Counter()
+        self._attempts = collections.Counter()  # action → failed sends so far
+
+    def __len__(self):
+        return sum(map(len, self.queues.values()))
+
+    def submit(self, action):
+        self.queues[STRATEGY_TARGETS[action.strategy]].append(action)
+
+    def dispatch_ready(self):
+        """Send every queued action whose dependency has a token and a closed (or probing) breaker."""
+        dispatched = 0
+        for dependency, queue in self.queues.items():
+            bucket, breaker = self.buckets[dependency], self.breakers[dependency]
+            while queue and bucket.ready():
+                permit = breaker.allow()
+                if not permit:
+                    break
+                bucket.take()
+                action = queue.popleft()
+                try:
+                    ok = bool(self.send(action))
+                except Exception:
+                    ok = False
+                breaker.record(ok, permit)
+                (self.sent if ok else self.failed)[dependency] += 1
+                dispatched += 1
+                if ok:
+                    self._attempts.pop(action, None)
+                    continue
+                self._attempts[action] += 1
+                if self._attempts[action] < max_attempts(action.strategy):
+                    queue.append(action)  # retried after the others, or once the breaker recovers
+                    continue
+                self.exhausted[dependency] += 1
+                attempts = self._attempts.pop(action)
+                if self.on_exhausted is not None:
+                    self.on_exhausted(action, attempts)
+        return dispatched
+
+    def wait_time(self):
+        """Seconds until some queued dependency has a token; None when every queue is empty."""
+        waits = [self.buckets[dependency].wait_time() for dependency, queue in self.queues.items() if queue]
+        return min(waits) if waits else None
+
+    def drain(self, deadline=None, sleep=time.sleep, idle_poll=1.0):
+        """Dispatch until every queue is empty or ``deadline`` (in ``clock`` time) passes.
+
+        When tokens are available but every breaker holding work is OPEN,
+        this checks again every ``idle_poll`` seconds, so the HALF_OPEN probe
+        goes out soon after the cooldown.
+        """
+        clock = self.breakers[next(iter(self.breakers))].clock
+        while (wait := self.wait_time()) is not None:
+            if deadline is not None and clock() >= deadline:
+                return False
+            if not self.dispatch_ready():
+                sleep(wait if wait > 0 else idle_poll)
+        return True
+
+
+class _SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jenkins-rate", type=float, default=DISPATCH_LIMITS["jenkins"].rate,
+                        help="rebuilds per second")
+    parser.add_argument("--prs", type=int, default=15, help="PRs rebuilt after the outage (§19)")
+    args = parser.parse_args(argv)
+
+    clock = _SimulatedClock()
+    jenkins_up = [False]
+    dispatch_times = collections.defaultdict(list)
+
+    def send(action):
+        dependency = STRATEGY_TARGETS[action.strategy]
+        dispatch_times[dependency].append(clock.now)
+        return dependency != "jenkins" or jenkins_up[0]
+
+    limits = dict(DISPATCH_LIMITS, jenkins=DispatchLimit(args.jenkins_rate, DISPATCH_LIMITS["jenkins"].burst))
+    dispatcher = Dispatcher(send, limits, clock=clock, bucket_clock=clock)
+
+    # Jenkins is down: rebuilds fail while bot retriggers and branch updates go through.
+    strategies = [Strategy.RETRY_CHECKS, Strategy.RETRIGGER_POLICY_BOT, Strategy.UPDATE_BRANCH,
+                  Strategy.RETRIGGER_APPROVER_BOT]
+    for n in range(40):
+        dispatcher.submit(RemediationAction("codegenie/service", n, strategies[n % len(strategies)]))
+    dispatcher.drain(deadline=120, sleep=clock.sleep)
+    print(f"  Jenkins down for 120s: jenkins breaker {dispatcher.breakers['jenkins'].state.value},"
+          f" {len(dispatcher.queues['jenkins'])} rebuilds held;"
+          f" other dependencies sent {sum(dispatcher.sent.values())}, queued {len(dispatcher) - len(dispatcher.queues['jenkins'])}")
+
+    # §19: Jenkins is back, the breaker is reset, and a batch rebuild is queued.
+    jenkins_up[0] = True
+    dispatcher.breakers["jenkins"].reset()
+    dispatcher.queues["jenkins"].clear()
+    dispatch_times["jenkins"].clear()
+    start = clock.now
+    for n in range(args.prs):
+        dispatcher.submit(RemediationAction("codegenie/service", 1000 + n, Strategy.RETRY_CHECKS))
+    dispatcher.drain(sleep=clock.sleep)
+    times = dispatch_times["jenkins"]
+    burst = limits["jenkins"].burst
+    paced = times[burst:]
+    rate = (len(paced) - 1) / (paced[-1] - paced[0]) if len(paced) > 1 else float("nan")
+    print(f"  batch rebuild: {len(times)} PRs drained in {clock.now - start:.0f}s simulated,"
+          f" {burst} at once then {rate:.2f}/s (configured {args.jenkins_rate}/s);"
+          f" jenkins breaker {dispatcher.breakers['jenkins'].state.value}")
+    assert dispatcher.breakers["jenkins"].state is BreakerState.CLOSED
+
+    # A dependency that never recovers: each action is handed back after its §7 budget.
+    clock = _SimulatedClock()
+    handed_back = []
+    dispatcher = Dispatcher(lambda action: False, limits, clock=clock, bucket_clock=clock,
+                            on_exhausted=lambda action, attempts: handed_back.append(attempts))
+    for n in range(3):
+        dispatcher.submit(RemediationAction("codegenie/service", 2000 + n, Strategy.RETRY_CHECKS))
+    dispatcher.drain(sleep=clock.sleep)
+    print(f"  Jenkins never recovers: {len(handed_back)} rebuilds handed back to the budget path after"
+          f" {handed_back} failed sends, {clock.now / 60:.0f} min simulated; none left queued")
+    assert handed_back == [max_attempts(Strategy.RETRY_CHECKS)] * 3 and not len(dispatcher)
+
+
+if __name__ == "__main__":
+    main()
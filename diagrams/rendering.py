@@ -0,0 +1,143 @@
+"""Shared Graphviz rendering for the AutoMergeMedic diagram scripts.
+
+Each graph is laid out once per render: a single ``dot`` call writes every
+requested format (one ``-T``/``-o`` pair per format) instead of one layout
+pass per format.
+
+Renders are incremental: ``output/.render-cache.json`` records a hash of each
+output's DOT source, format, DPI and Graphviz version, and ``render()`` skips
+formats whose hash matches and whose output file is still there.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+
+import graphviz
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
+MANIFEST = os.path.join(OUTPUT_DIR, ".render-cache.json")
+
+FORMATS = ("png", "svg")
+
+DEFAULT_DPI = "96"  # Graphviz's own default when a graph sets none
+DPI_ATTR = re.compile(r'\bdpi="?([0-9.]+)')
+
+_manifest_lock = threading.Lock()
+
+
+def format_list(value):
+    """argparse type for ``--formats png,svg,pdf``."""
+    formats = tuple(dict.fromkeys(fmt.strip().lower() for fmt in value.split(",") if fmt.strip()))
+    unknown = [fmt for fmt in formats if fmt not in graphviz.FORMATS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"unsupported output format(s): {', '.join(unknown) or value!r}")
+    return formats
+
+
+def add_render_arguments(parser):
+    """Add the rendering options shared by every diagram script and generate_all."""
+    parser.add_argument(
+        "--formats",
+        type=format_list,
+        default=FORMATS,
+        help=f"comma-separated output formats (default: {','.join(FORMATS)})",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="re-run Graphviz even when the render cache says outputs are current",
+    )
+
+
+def parse_args(argv=None, description=None):
+    """Parse the command-line options shared by every diagram script."""
+    parser = argparse.ArgumentParser(description=description)
+    add_render_arguments(parser)
+    return parser.parse_args(argv)
+
+
+@functools.lru_cache(maxsize=None)
+def graphviz_version():
+    """Installed Graphviz version, looked up once per process."""
+    return ".".join(str(part) for part in graphviz.version())
+
+
+def cache_key(source, fmt):
+    """Hash everything that determines the bytes ``dot`` writes for one output."""
+    dpi = DPI_ATTR.search(source)
+    digest = hashlib.sha256()
+    for part in (source, fmt, dpi.group(1) if dpi else DEFAULT_DPI, graphviz_version()):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_manifest(entries):
+    """Merge ``entries`` into the manifest and replace it atomically.
+
+    The lock serialises renders in one interpreter. Scripts running in
+    separate processes can still race; the loser's entries are dropped,
+    which only costs a re-render next time.
+    """
+    with _manifest_lock:
+        manifest = load_manifest()
+        manifest.update(entries)
+        tmp = f"{MANIFEST}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp, MANIFEST)
+
+
+def run_dot(source, engine, outputs):
+    """Lay ``source`` out once and write it to every ``{fmt: path}`` in ``outputs``.
+
+    Graphviz pairs the n-th ``-T`` with the n-th ``-o``, so one process runs
+    the layout and then emits each format from it.
+    """
+    cmd = [graphviz.backend.DOT_BINARY, f"-K{engine}"]
+    for fmt, path in outputs.items():
+        cmd += [f"-T{fmt}", "-o", path]
+    result = subprocess.run(cmd, input=source.encode("utf-8"), capture_output=True)
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", "replace").strip()
+        raise RuntimeError(f"{cmd[0]} exited with status {result.returncode}: {stderr}")
+
+
+def render(g, name, formats=FORMATS, force=False):
+    """Render a graph to ``output/<name>.<fmt>`` for each format.
+
+    Returns the formats that were actually rendered; cached ones are skipped
+    unless ``force`` is set.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    manifest = load_manifest()
+    source = g.source
+    outputs, entries = {}, {}
+    for fmt in formats:
+        output = f"{name}.{fmt}"
+        path = os.path.join(OUTPUT_DIR, output)
+        key = cache_key(source, fmt)
+        if not force and manifest.get(output) == key and os.path.exists(path):
+            continue
+        outputs[fmt] = path
+        entries[output] = key
+    if outputs:
+        run_dot(source, g.engine, outputs)
+        update_manifest(entries)
+    return list(outputs)
@@ -0,0 +1,108 @@
+"""ETag response cache for GitHub REST reads (reconciler STEP 3a).
+
+GitHub answers a conditional request (``If-None-Match: <etag>``) for an
+unchanged resource with 304 Not Modified. A 304 does not count against the
+rate limit, so a PR that has not changed since the last run costs nothing.
+ResponseCache stores the body and ETag of each URL. It evicts least-recently
+used entries once the total body size passes ``max_bytes``, and it persists
+to JSON so the ETags survive between reconciler runs.
+
+metrics() reports the counters:
+
+    hits       — 304s answered from the cache
+    misses     — 200s, whether the URL was cached or not
+    evictions  — entries dropped to stay under max_bytes
+"""
+
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self._entries = OrderedDict()  # url → (etag, body bytes), least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def lookup(self, url):
+        """The cached ``(etag, body)`` for ``url``, or None."""
+        return self._entries.get(url)
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Headers that make a GET conditional on ``entry``, as returned by lookup()."""
+        return {"If-None-Match": entry[0]} if entry else {}
+
+    def not_modified(self, url, entry):
+        """Record a 304 for ``url`` and return the body of ``entry``, the lookup() the request was built from.
+
+        Other requests may have stored bodies, and evicted ``entry``, while
+        this one was in flight; the 304 is still an answer to its ETag.
+        """
+        if self._entries.get(url) is entry:
+            self._entries.move_to_end(url)
+        self.hits += 1
+        return entry[1]
+
+    def store(self, url, etag, body):
+        """Record a 200 for ``url`` with its raw ``body``; responses without an ETag are not kept."""
+        self.misses += 1
+        self._discard(url)
+        if not etag or len(body) > self.max_bytes:
+            return
+        self._entries[url] = (etag, body)
+        self.bytes += len(body)
+        self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def _discard(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def metrics(self):
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+    def save(self, path=None):
+        """Write the entries, in LRU order, to ``path`` as JSON, atomically."""
+        path = path or self.path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".response-cache-", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump([[url, etag, body.decode()] for url, (etag, body) in self._entries.items()], f)
+        os.replace(tmp, path)
+
+    def _load(self, path):
+        with open(path) as f:
+            for url, etag, body in json.load(f):
+                body = body.encode()
+                self._entries[url] = (etag, body)
+                self.bytes += len(body)
+        self._evict()
@@ -5,12 +5,9 @@ Uses graphviz with ranked subgraphs to approximate swim-lane sequence diagrams.
 Generates 3 separate diagrams: happy path, self-healing, command queue.
 """
 
-import os
 import graphviz
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+from rendering import parse_args, render
 
 FONT = "Helvetica Neue,Helvetica,Arial"
 
@@ -49,13 +46,6 @@ def add_step(g, step_id, label, color="#0984e3"):
            penwidth="1", width="0", height="0")
 
 
-def render(g, name):
-    """Render to PNG + SVG."""
-    for fmt in ["png", "svg"]:
-        g.format = fmt
-        g.render(filename=os.path.join(OUTPUT_DIR, name), cleanup=True)
-
-
 # ─── Diagram 1: Happy Path ─────────────────────────────────
 
 
@@ -258,14 +248,15 @@ def create_command_queue():
     return g
 
 
-def main():
+def main(argv=None):
+    args = parse_args(argv, __doc__)
     for name, creator in [
         ("sequence_happy_path", create_happy_path),
         ("sequence_self_healing", create_self_healing),
         ("sequence_command_queue", create_command_queue),
     ]:
         g = creator()
-        render(g, name)
+        render(g, name, args.formats, force=args.force)
 
 
 if __name__ == "__main__":
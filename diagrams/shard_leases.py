@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Sharded reconciler runs with lease-based shard ownership (logical flow §9 STEP 3).
+
+The stale set is split into SHARDS by a stable hash of (repo, pr_number).
+Any number of worker processes run the same reconciler pass. A worker
+claims a shard by acquiring its lease: a conditional write that succeeds
+only if the lease is free or expired, and the shard is not already done
+for this run. The worker renews the lease, also conditionally, before
+each PR, saving a checkpoint of the PRs it has finished. While a PR is
+being processed, a heartbeat thread keeps renewing the lease every third
+of its TTL, so slow work does not lose the shard. If a renewal fails, the
+worker stops work on that shard at once. A completed shard is marked done
+for the run and is not claimed again. A crashed worker's shard is picked
+up by another worker once its lease expires. The new owner resumes after
+the checkpoint, so only the PR that was in flight is processed again.
+
+A worker can still outlive its lease: a long pause stops the heartbeat,
+the shard moves on, and the paused worker then finishes its PR. Each
+acquisition therefore bumps the lease's fencing ``token``, and commands
+carry it. The dispatch consumer must accept a command only while its
+token is still the shard's current one (holds()), checked atomically with
+the dispatch. With that check, a PR is never remediated twice at the same
+time.
+
+Run this module to check, with real processes, that no PR is ever
+dispatched twice at once and that every PR is dispatched exactly once,
+except for the PR a crashed worker was holding. ``--slow`` makes one PR
+take three lease TTLs. ``--pause`` stops one worker's heartbeat and holds
+it until its shard is taken over, so its late dispatch must be fenced off:
+
+    python shard_leases.py --workers 4 --prs 2000 --crash --slow --pause
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+SHARDS = 64
+LEASE_SECONDS = 30.0
+
+
+def shard_of(repo, pr_number, shards=SHARDS):
+    """Stable across processes and restarts, unlike ``hash()``."""
+    digest = hashlib.blake2b(f"{repo}#{pr_number}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class Lease(NamedTuple):
+    shard: int
+    owner: str
+    token: int
+    expires_at: float
+    run_id: str
+    checkpoint: tuple = None  # last (repo, pr_number) finished in this run, by any holder
+
+
+class SQLiteLeaseStore:
+    """Leases in a SQLite file shared by local worker processes."""
+
+    def __init__(self, path):
+        # Shared with the heartbeat thread; sqlite3 serializes calls on one connection.
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shard_leases ("
+            " shard INTEGER PRIMARY KEY, owner TEXT NOT NULL, token INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, completed_run TEXT, checkpoint_run TEXT, checkpoint_repo TEXT,"
+            " checkpoint_pr INTEGER)"
+        )
+
+    def acquire(self, shard, owner, run_id, ttl=LEASE_SECONDS, now=None):
+        """Claim ``shard`` if it is free or expired and not done for ``run_id``; None otherwise."""
+        now = time.time() if now is None else now
+        expires_at = now + ttl
+        row = self._db.execute(
+            "INSERT INTO shard_leases (shard, owner, token, expires_at) VALUES (?, ?, 1, ?)"
+            " ON CONFLICT (shard) DO UPDATE SET owner = excluded.owner, token = token + 1,"
+            "   expires_at = excluded.expires_at"
+            " WHERE expires_at < ? AND completed_run IS NOT ?"
+            " RETURNING token, checkpoint_run, checkpoint_repo, checkpoint_pr",
+            (shard, owner, expires_at, now, run_id),
+        ).fetchone()
+        if row is None:
+            return None
+        token, checkpoint_run, repo, pr_number = row
+        checkpoint = (repo, pr_number) if checkpoint_run == run_id and repo is not None else None
+        return Lease(shard, owner, token, expires_at, run_id, checkpoint)
+
+    def renew(self, lease, ttl=LEASE_SECONDS, now=None):
+        """Extend a lease still held by its owner, saving its checkpoint; None if it was lost."""
+        now = time.time() if now is None else now
+        expires_at = now + ttl
+        repo, pr_number = lease.checkpoint or (None, None)
+        updated = self._db.execute(
+            "UPDATE shard_leases SET expires_at = ?, checkpoint_run = ?, checkpoint_repo = ?, checkpoint_pr = ?"
+            " WHERE shard = ? AND owner = ? AND token = ? AND expires_at >= ?",
+            (expires_at, lease.run_id, repo, pr_number, lease.shard, lease.owner, lease.token, now),
+        ).rowcount
+        return lease._replace(expires_at=expires_at) if updated else None
+
+    def holds(self, lease):
+        """Whether ``lease`` is still the shard's current lease (its token has not been superseded)."""
+        row = self._db.execute("SELECT token FROM shard_leases WHERE shard = ?", (lease.shard,)).fetchone()
+        return row is not None and row[0] == lease.token
+
+    def complete(self, lease, run_id):
+        """Release a finished shard and mark it done for ``run_id``."""
+        return self._db.execute(
+            "UPDATE shard_leases SET expires_at = 0, completed_run = ?"
+            " WHERE shard = ? AND owner = ? AND token = ?",
+            (run_id, lease.shard, lease.owner, lease.token),
+        ).rowcount == 1
+
+    def completed(self, run_id):
+        """Shards already done for ``run_id``."""
+        return {row[0] for row in self._db.execute(
+            "SELECT shard FROM shard_leases WHERE completed_run = ?", (run_id,))}
+
+
+class DynamoDBLeaseStore:
+    """Leases as items in a DynamoDB table keyed on ``shard`` (N), using condition expressions."""
+
+    def __init__(self, table_name, client=None):
+        if client is None:
+            import boto3  # optional dependency, only needed against AWS
+            client = boto3.client("dynamodb")
+        self.table_name = table_name
+        self._client = client
+        self._conditional_failed = client.exceptions.ConditionalCheckFailedException
+
+    def acquire(self, shard, owner, run_id, ttl=LEASE_SECONDS, now=None):
+        now = time.time() if now is None else now
+        expires_at = now + ttl
+        try:
+            response = self._client.update_item(
+                TableName=self.table_name,
+                Key={"shard": {"N": str(shard)}},
+                UpdateExpression="SET #owner = :owner, expires_at = :expires ADD #token :one",
+                ConditionExpression="attribute_not_exists(shard) OR"
+                                    " (expires_at < :now AND (attribute_not_exists(completed_run)"
+                                    " OR completed_run <> :run))",
+                ExpressionAttributeNames={"#owner": "owner", "#token": "token"},
+                ExpressionAttributeValues={
+                    ":owner": {"S": owner}, ":expires": {"N": repr(expires_at)}, ":one": {"N": "1"},
+                    ":now": {"N": repr(now)}, ":run": {"S": run_id},
+                },
+                ReturnValues="ALL_NEW",
+            )
+        except self._conditional_failed:
+            return None
+        item = response["Attributes"]
+        checkpoint = None
+        if item.get("checkpoint_run", {}).get("S") == run_id:
+            checkpoint = (item["checkpoint_repo"]["S"], int(item["checkpoint_pr"]["N"]))
+        return Lease(shard, owner, int(item["token"]["N"]), expires_at, run_id, checkpoint)
+
+    def renew(self, lease, ttl=LEASE_SECONDS, now=None):
+        now = time.time() if now is None else now
+        expires_at = now + ttl
+        update, values = "SET expires_at = :expires", {}
+        if lease.checkpoint is not None:
+            update += ", checkpoint_run = :run, checkpoint_repo = :repo, checkpoint_pr = :pr"
+            values = {":run": {"S": lease.run_id}, ":repo": {"S": lease.checkpoint[0]},
+                      ":pr": {"N": str(lease.checkpoint[1])}}
+        try:
+            self._client.update_item(
+                TableName=self.table_name,
+                Key={"shard": {"N": str(lease.shard)}},
+                UpdateExpression=update,
+                ConditionExpression="#owner = :owner AND #token = :token AND expires_at >= :now",
+                ExpressionAttributeNames={"#owner": "owner", "#token": "token"},
+                ExpressionAttributeValues={
+                    ":expires": {"N": repr(expires_at)}, ":owner": {"S": lease.owner},
+                    ":token": {"N": str(lease.token)}, ":now": {"N": repr(now)}, **values,
+                },
+            )
+        except self._conditional_failed:
+            return None
+        return lease._replace(expires_at=expires_at)
+
+    def holds(self, lease):
+        item = self._client.get_item(TableName=self.table_name, Key={"shard": {"N": str(lease.shard)}},
+                                     ConsistentRead=True, ProjectionExpression="#token",
+                                     ExpressionAttributeNames={"#token": "token"}).get("Item")
+        return item is not None and int(item["token"]["N"]) == lease.token
+
+    def complete(self, lease, run_id):
+        try:
+            self._client.update_item(
+                TableName=self.table_name,
+                Key={"shard": {"N": str(lease.shard)}},
+                UpdateExpression="SET expires_at = :zero, completed_run = :run",
+                ConditionExpression="#owner = :owner AND #token = :token",
+                ExpressionAttributeNames={"#owner": "owner", "#token": "token"},
+                ExpressionAttributeValues={
+                    ":zero": {"N": "0"}, ":run": {"S": run_id},
+                    ":owner": {"S": lease.owner}, ":token": {"N": str(lease.token)},
+                },
+            )
+        except self._conditional_failed:
+            return False
+        return True
+
+    def completed(self, run_id):
+        paginator = self._client.get_paginator("scan")
+        pages = paginator.paginate(
+            TableName=self.table_name, FilterExpression="completed_run = :run",
+            ExpressionAttributeValues={":run": {"S": run_id}}, ProjectionExpression="shard",
+        )
+        return {int(item["shard"]["N"]) for page in pages for item in page["Items"]}
+
+
+class ShardWorker:
+    """One reconciler worker. ``process(repo, pr_number, lease)`` handles one stale PR."""
+
+    def __init__(self, store, owner, shards=SHARDS, ttl=LEASE_SECONDS, poll_interval=1.0, heartbeat=True):
+        self.store = store
+        self.owner = owner
+        self.shards = shards
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+
+    def run(self, run_id, candidates, process, deadline=None):
+        """Work through every shard of ``candidates`` this worker can claim.
+
+        Keeps going until all of them are done for the run, by this or other
+        workers, or until ``deadline`` (epoch seconds). Returns the shards
+        this worker completed.
+        """
+        by_shard = {}
+        for repo, pr_number in candidates:
+            by_shard.setdefault(shard_of(repo, pr_number, self.shards), []).append((repo, pr_number))
+        # Start at a different shard per worker so claims rarely collide.
+        start = shard_of(self.owner, 0, self.shards)
+        order = sorted(by_shard, key=lambda shard: (shard - start) % self.shards)
+
+        mine = []
+        while deadline is None or time.time() < deadline:
+            done = self.store.completed(run_id)  # one query (a Scan on DynamoDB) per pass
+            remaining = [shard for shard in order if shard not in done]
+            if not remaining:
+                break
+            claimed = False
+            for shard in remaining:
+                lease = self.store.acquire(shard, self.owner, run_id, self.ttl)
+                if lease is None:
+                    continue
+                claimed = True
+                if self._work(lease, by_shard[shard], process) and self.store.complete(lease, run_id):
+                    mine.append(shard)
+            if not claimed:
+                time.sleep(self.poll_interval)  # the rest are held by live workers or expiring
+        return mine
+
+    def _work(self, lease, prs, process):
+        # PRs go in sorted order so the checkpoint marks a prefix that is done.
+        for repo, pr_number in sorted(prs):
+            if lease.checkpoint is not None and (repo, pr_number) <= lease.checkpoint:
+                continue  # finished by a previous holder of this shard
+            lease = self.store.renew(lease, self.ttl)
+            if lease is None:
+                return False  # lost the shard: its new owner picks up from the checkpoint
+            if self.heartbeat:
+                with _Heartbeat(self.store, lease, self.ttl) as heartbeat:
+                    process(repo, pr_number, lease)
+                if heartbeat.lease is None:
+                    return False
+                lease = heartbeat.lease
+            else:
+                process(repo, pr_number, lease)
+            lease = lease._replace(checkpoint=(repo, pr_number))
+        return True
+
+
+class _Heartbeat:
+    """Renews ``lease`` every ``ttl / 3`` seconds until the block exits; ``lease`` is None once lost."""
+
+    def __init__(self, store, lease, ttl):
+        self.store = store
+        self.lease = lease
+        self.ttl = ttl
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.lease = self.store.renew(self.lease, self.ttl)
+            if self.lease is None:
+                return
+
+
+def _harness_worker(db_path, owner, run_id, prs, ttl, crash_after, slow_after, pause_after):
+    store = SQLiteLeaseStore(db_path)
+    dispatches = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    done = 0
+
+    def process(repo, pr_number, lease):
+        nonlocal done
+        if crash_after is not None and done == crash_after:
+            os._exit(1)  # die mid-shard, holding the lease
+        started = time.time()
+        time.sleep(3 * ttl if done == slow_after else 0.001)  # stand-in for the GitHub call
+        if done == pause_after:
+            # A pause with the heartbeat stopped: wake once another worker has taken the shard.
+            while store.holds(lease) and time.time() < started + 30 * ttl:
+                time.sleep(ttl / 10)
+        # The dispatch consumer: the holds() check, in the same transaction as the dispatch.
+        dispatches.execute("BEGIN IMMEDIATE")
+        current = dispatches.execute("SELECT token FROM shard_leases WHERE shard = ?", (lease.shard,)).fetchone()
+        if current is not None and current[0] == lease.token:
+            dispatches.execute("INSERT INTO dispatches VALUES (?, ?, ?, ?, ?, ?)",
+                               (repo, pr_number, owner, lease.token, started, time.time()))
+        else:
+            dispatches.execute("INSERT INTO fenced VALUES (?, ?, ?, ?)", (repo, pr_number, owner, lease.token))
+        dispatches.execute("COMMIT")
+        done += 1
+
+    ShardWorker(store, owner, ttl=ttl, poll_interval=0.05, heartbeat=pause_after is None).run(
+        run_id, prs, process, time.time() + 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--prs", type=int, default=2000)
+    parser.add_argument("--ttl", type=float, default=1.0, help="lease seconds (short so crashes recover fast)")
+    parser.add_argument("--crash", action="store_true", help="kill one worker in the middle of a shard")
+    parser.add_argument("--slow", action="store_true", help="one PR takes three lease TTLs")
+    parser.add_argument("--pause", action="store_true",
+                        help="one worker pauses with its heartbeat stopped until its shard is taken over")
+    args = parser.parse_args(argv)
+
+    prs = [(f"codegenie/service-{n % 40}", n) for n in range(args.prs)]
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "leases.db")
+        SQLiteLeaseStore(db_path)
+        sqlite3.connect(db_path, isolation_level=None).execute(
+            "CREATE TABLE dispatches (repo TEXT, pr_number INTEGER, owner TEXT, token INTEGER,"
+            " started REAL, finished REAL)")
+        sqlite3.connect(db_path, isolation_level=None).execute(
+            "CREATE TABLE fenced (repo TEXT, pr_number INTEGER, owner TEXT, token INTEGER)")
+
+        start = time.perf_counter()
+        workers = [
+            multiprocessing.Process(target=_harness_worker, args=(
+                db_path, f"worker-{i}", "run-1", prs, args.ttl,
+                25 if args.crash and i == 0 else None,
+                10 if args.slow and i == 1 else None,
+                10 if args.pause and i == 2 else None))
+            for i in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - start
+
+        rows = sqlite3.connect(db_path).execute(
+            "SELECT repo, pr_number, started, finished FROM dispatches ORDER BY repo, pr_number, started").fetchall()
+        fenced = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM fenced").fetchone()[0]
+
+    counts, overlaps, previous = {}, 0, None
+    for repo, pr_number, started, finished in rows:
+        key = (repo, pr_number)
+        counts[key] = counts.get(key, 0) + 1
+        if previous is not None and previous[0] == key and started < previous[1]:
+            overlaps += 1
+        previous = (key, finished)
+    missing = len(prs) - len(counts)
+    repeated = sum(1 for count in counts.values() if count > 1)
+
+    print(f"  {args.workers} workers, {len(prs)} PRs, {SHARDS} shards: {seconds:.2f}s")
+    print(f"  dispatches {len(rows)}, concurrent duplicates {overlaps}, "
+          f"repeated after takeover {repeated}, missing {missing}, stale tokens fenced off {fenced}")
+    # The slow worker's heartbeat must keep its shard; only the paused worker is fenced off.
+    if overlaps or missing or repeated > (1 if args.crash else 0) or fenced != (1 if args.pause else 0):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
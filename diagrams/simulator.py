@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""Discrete-event simulation of the whole reconciliation loop (logical flow §2, §8, §9; stories 11.3, 12.4).
+
+A synthetic fleet of PRs moves through the §2 state machine on a virtual
+clock. Stand-ins play GitHub, Jenkins, Policy Bot, Approver Bot and
+Automerge Bot, with configurable failure rates (SimConfig): builds that
+fail, hang or fail persistently, bots that drop a request, SOD failures,
+branches that fall behind, merge conflicts, lost webhooks and a Jenkins
+outage. Developers sometimes comment ``/rebuild`` on a failed build, and
+they resolve some NEEDS_INTERVENTION PRs by hand.
+
+The system side is the real code of this directory:
+
+- Webhooks go through the Event Processor fold (webhook_ingest.apply_events)
+  into a versioned StateStore, the StaleIndex and the history summaries.
+  The reconciler has its own StateStore on the same backend; the backend's
+  change stream calls each store's observe() on the other's writes.
+- Every ``reconcile_every`` seconds a reconciler run does the §9 steps.
+  STEP 1 is StaleIndex.stale(). STEP 3a is GitHubPoller.poll(), 50 PRs
+  per GraphQL query. Its requests are answered in process from the
+  simulated PRs (_InProcessPoller), so no HTTP is involved, but every
+  query is built, counted and parsed by the real poller. Drift correction
+  (3b) and classify() (3c and 3d) read the polled PRSnapshot: status,
+  checks, review decision and the bots' labels. For STEP 3e the run puts
+  a command onto the command queue.
+- Commands from the reconciler and from developers pass through the
+  CommandCoalescer and the PriorityScheduler. The CarBridge then
+  validates and routes them. Finally the remediation Dispatcher sends
+  them, with a circuit breaker and a token bucket per dependency.
+
+A run is deterministic for a given seed; only the wall-clock reconciler
+durations vary. The report gives PRs healed per hour, time-to-merge
+percentiles, API calls per PR and reconciler run duration for each fleet
+size. Run duration is also split by §9 step (instrumentation.Metrics).
+To try other §8 thresholds, edit STALE_AFTER_MINUTES in state_machine.py,
+which feeds both the index and the classifier, and rerun. Retry-count
+resets (§14) are not modeled.
+
+    python simulator.py --fleet 1000 10000 100000
+"""
+
+import argparse
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from typing import NamedTuple, Optional
+
+from car_bridge import CarBridge
+from circuit_breaker import BreakerState
+from classification import BUDGET_KEYS, PRFacts, Strategy, Substatus, classify
+from command_dedup import CommandCoalescer
+from event_writer import PREvent
+from fake_github import ALIAS
+from github_poller import GitHubPoller
+from history_summary import EVENT_STATES, SummaryStore
+from instrumentation import RECONCILER_STAGES, Metrics
+from priority_scheduler import PriorityScheduler
+from remediation_dispatch import DEPENDENCIES, Dispatcher, RemediationAction
+from slash_commands import CommandMessage
+from stale_index import StaleIndex
+from state_machine import RETRY_BUDGETS, State
+from state_store import MemoryStateBackend, PRStateRecord, StateStore
+from webhook_ingest import Delivery, apply_events
+
+REPO = "codegenie/service"
+POLL_BATCH = 50  # PRs per GraphQL query
+
+STRATEGY_COMMANDS = {
+    Strategy.RETRY_CHECKS: "/rebuild",
+    Strategy.RETRIGGER_POLICY_BOT: "/recheck-policy",
+    Strategy.RETRIGGER_SOD_CHECK: "/recheck-sod",
+    Strategy.RETRIGGER_APPROVER_BOT: "/recheck-approval",
+    Strategy.RETRIGGER_MERGE: "/merge",
+    Strategy.UPDATE_BRANCH: "/update-branch",
+    Strategy.CLOSE_AND_REOPEN: "/close-and-reopen",
+    Strategy.CLOSE_PR: "/cancel",
+}
+COMMAND_STRATEGIES = {command: strategy for strategy, command in STRATEGY_COMMANDS.items()}
+
+SEVERITIES = ("critical", "high", "medium", "low")
+
+# How GitHub shows each failure substatus: the name of the failing check or status context.
+FAILED_CHECKS = {
+    Substatus.TRANSIENT: "jenkins/infrastructure",
+    Substatus.PERSISTENT: "jenkins/tests",
+    Substatus.SOD_FAILURE: "policy-bot/sod",
+    Substatus.BUILD_FAILURE: "policy-bot/build",
+    Substatus.BRANCH_PROTECTION_FAILURE: "policy-bot/branch-protection",
+    Substatus.OTHER_POLICY_FAILURE: "policy-bot/other",
+}
+FAILED_SUBSTATUSES = {name: substatus for substatus, name in FAILED_CHECKS.items()}
+# Labels the bots put on a PR while they work (§9 STEP 3a: "Labels ... for Policy Bot / Approver Bot signals").
+BOT_LABELS = {State.POLICY_EVALUATING: "policy-bot:evaluating", State.POLICY_PASSED: "policy-bot:passed",
+              State.MERGING: "automerge-bot:merging"}
+LABEL_STATES = {label: state for state, label in BOT_LABELS.items()}
+
+
+class SimConfig(NamedTuple):
+    arrival_hours: float = 24.0       # PRs open uniformly over this period
+    drain_hours: float = 24.0         # then the simulation runs this much longer
+    reconcile_every: float = 300.0    # seconds between reconciler runs
+    tick: float = 10.0                # seconds between command-consumer passes
+    consume_per_tick: int = 50        # commands the consumer routes per pass
+    build_minutes: float = 12.0       # median Jenkins build time
+    p_webhook_loss: float = 0.02
+    p_build_hang: float = 0.03        # build never reports a result
+    p_transient: float = 0.10
+    p_persistent: float = 0.03
+    p_bot_drop: float = 0.05          # a bot ignores one request
+    p_sod_failure: float = 0.03
+    p_sod_recheck_passes: float = 0.8
+    p_behind: float = 0.05
+    p_conflict: float = 0.01
+    p_human_rebuild: float = 0.3      # failed builds a developer /rebuilds by comment
+    p_human_fix: float = 0.5          # NEEDS_INTERVENTION PRs a developer merges by hand
+    outage: Optional[tuple] = (6.0, 2.0)  # Jenkins outage: (start hour, hours)
+    seed: int = 1
+
+
+class _PR:
+    """GitHub's truth about one PR; the State Table may lag behind it."""
+
+    __slots__ = ("number", "lineage", "state", "substatus", "behind", "conflict", "persistent", "build")
+
+    def __init__(self, number, lineage, behind, conflict):
+        self.number = number
+        self.lineage = lineage
+        self.state = None
+        self.substatus = Substatus.NONE
+        self.behind = behind
+        self.conflict = conflict
+        self.persistent = False
+        self.build = 0
+
+
+class _Lineage:
+    """A vulnerability fix across close-and-reopen replacements."""
+
+    __slots__ = ("created_at", "merged_at", "severity", "remediated", "escalated", "by_hand")
+
+    def __init__(self, created_at, severity):
+        self.created_at = created_at
+        self.merged_at = None
+        self.severity = severity
+        self.remediated = False
+        self.escalated = False
+        self.by_hand = False
+
+
+def _pull_request_node(pr):
+    """The ``pullRequest`` node GitHub would return for a simulated PR."""
+    state = pr.state
+    contexts = []
+    if state in (State.CHECKS_RUNNING, State.CHECKS_FAILED):
+        contexts.append({"name": FAILED_CHECKS[pr.substatus] if state is State.CHECKS_FAILED else "jenkins/build",
+                         "conclusion": "FAILURE" if state is State.CHECKS_FAILED else None})
+    elif state is not State.CREATED:
+        contexts.append({"name": "jenkins/build", "conclusion": "SUCCESS"})
+        if state is State.POLICY_FAILED:
+            contexts.append({"context": FAILED_CHECKS[pr.substatus], "state": "FAILURE"})
+        elif state is not State.CHECKS_PASSED:
+            contexts.append({"context": "policy-bot",
+                             "state": "PENDING" if state is State.POLICY_EVALUATING else "SUCCESS"})
+    conclusions = [context.get("conclusion") or context.get("state") for context in contexts]
+    rollup = ("FAILURE" if "FAILURE" in conclusions else "PENDING" if None in conclusions or "PENDING" in conclusions
+              else "SUCCESS")
+    return {
+        "state": state.name if state in (State.MERGED, State.CLOSED) else "OPEN",
+        "headRefOid": f"{pr.number:024x}{pr.build:016x}",
+        "mergeable": "CONFLICTING" if pr.conflict else "MERGEABLE",
+        "mergeStateStatus": "DIRTY" if pr.conflict else "BEHIND" if pr.behind else "CLEAN",
+        "reviewDecision": "APPROVED" if state in (State.APPROVED, State.MERGING, State.MERGED) else "REVIEW_REQUIRED",
+        "labels": {"nodes": [{"name": "codegenie"}] + ([{"name": BOT_LABELS[state]}] if state in BOT_LABELS else [])},
+        "commits": {"nodes": [{"commit": {"statusCheckRollup": {"state": rollup, "contexts": {"nodes": contexts}}
+                                          if contexts else None}}]},
+    }
+
+
+def _observed_state(snapshot):
+    """STEP 3b: the §2 state and substatus that a polled PRSnapshot shows."""
+    if snapshot.status != "OPEN":
+        return State[snapshot.status], Substatus.NONE
+    for label in snapshot.labels:
+        if label in LABEL_STATES:
+            return LABEL_STATES[label], Substatus.NONE
+    if snapshot.review_decision == "APPROVED":
+        return State.APPROVED, Substatus.NONE
+    if snapshot.failed_checks:
+        substatus = FAILED_SUBSTATUSES[snapshot.failed_checks[0]]
+        return (State.POLICY_FAILED if snapshot.failed_checks[0].startswith("policy-bot/")
+                else State.CHECKS_FAILED), substatus
+    if snapshot.checks is None:
+        return State.CREATED, Substatus.NONE
+    return State.CHECKS_RUNNING if snapshot.checks == "PENDING" else State.CHECKS_PASSED, Substatus.NONE
+
+
+class _InProcessPoller(GitHubPoller):
+    """GitHubPoller whose GraphQL requests are answered from the simulated PRs instead of over HTTP."""
+
+    def __init__(self, prs, batch_size=POLL_BATCH):
+        super().__init__("simulated", batch_size=batch_size)
+        self._prs = prs
+
+    async def _post(self, query, variables):
+        self.requests += 1
+        data = {}
+        for alias, _, _, number in ALIAS.findall(query):
+            pr = self._prs.get(int(number))
+            data[alias] = {"pullRequest": _pull_request_node(pr) if pr is not None else None}
+        return {"data": data}
+
+
+def _percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Simulation:
+    def __init__(self, fleet, config=SimConfig(), metrics=None):
+        self.fleet = fleet
+        self.config = config
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.rng = random.Random(config.seed)
+        self.now = 0.0
+        self._queue = []
+        self._sequence = itertools.count()
+        self.prs = {}
+        self.lineages = []
+        self.calls = dict.fromkeys(("github_poll",) + DEPENDENCIES, 0)
+        self.run_seconds = []
+        self.run_candidates = []
+        self.drift_corrections = 0
+        self.anomalies = 0
+        self.rejected_commands = 0
+
+        clock = self.clock
+        # The Event Processor and the reconciler are separate processes with their own caches;
+        # the backend's change stream keeps each one current with the other's writes.
+        backend = MemoryStateBackend()
+        self.store = StateStore(backend, cache_size=max(1000, fleet // 10))
+        self.reconciler_store = StateStore(backend, cache_size=max(1000, fleet // 10))
+        backend.subscribe(self.store.observe)
+        backend.subscribe(self.reconciler_store.observe)
+        self.index = StaleIndex()
+        self.summaries = SummaryStore()
+        self.dispatcher = Dispatcher(self._send, clock=clock, bucket_clock=clock,
+                                     on_exhausted=self._dispatch_exhausted)
+        handlers = {destination: self._to_dispatcher
+                    for destination in ("jenkins", "policy_bot", "sod_validator", "approver_bot",
+                                        "automerge_bot", "github")}
+        handlers["event_processor"] = handlers["command_queue"] = lambda message: None
+        self.bridge = CarBridge(handlers)
+        self.scheduler = PriorityScheduler(clock)
+        self.coalescer = CommandCoalescer(self._enqueue, lambda event: None, clock=clock)
+        self.poller = _InProcessPoller(self.prs)
+        self._loop = asyncio.new_event_loop()
+
+    def clock(self):
+        return self.now
+
+    def _at(self, delay, action, *args):
+        heapq.heappush(self._queue, (self.now + delay, next(self._sequence), action, args))
+
+    def _minutes(self, median):
+        return self.rng.lognormvariate(math.log(median * 60), 0.5)
+
+    def _jenkins_down(self):
+        outage = self.config.outage
+        return outage is not None and outage[0] * 3600 <= self.now < (outage[0] + outage[1]) * 3600
+
+    # GitHub and the bots
+
+    def _emit(self, pr, event_type, substatus=Substatus.NONE):
+        """Something happened on GitHub; its webhook may be lost on the way."""
+        target = EVENT_STATES.get(event_type)
+        if target is not None:
+            pr.state, pr.substatus = target, substatus
+        if target is State.MERGED:
+            self.lineages[pr.lineage].merged_at = self.now
+        if self.rng.random() >= self.config.p_webhook_loss:
+            self._process(pr.number, event_type, substatus)
+
+    def _open(self, lineage, conflict=None):
+        number = len(self.prs)
+        rng = self.rng
+        pr = self.prs[number] = _PR(number, lineage, rng.random() < self.config.p_behind,
+                                    rng.random() < self.config.p_conflict if conflict is None else conflict)
+        self._emit(pr, "PR_OPENED")
+        self._at(rng.uniform(30, 120), self._start_build, pr)
+
+    def _new_lineage(self):
+        self.lineages.append(_Lineage(self.now, self.rng.choice(SEVERITIES)))
+        self._open(len(self.lineages) - 1)
+
+    def _start_build(self, pr):
+        if pr.state in (State.MERGED, State.CLOSED):
+            return
+        pr.build += 1
+        self._emit(pr, "CHECKS_STARTED")
+        self._at(self._minutes(self.config.build_minutes), self._finish_build, pr, pr.build)
+
+    def _finish_build(self, pr, build):
+        if pr.build != build or pr.state is not State.CHECKS_RUNNING:
+            return
+        config, roll = self.config, self.rng.random()
+        if self._jenkins_down():
+            self._emit(pr, "CHECKS_FAILED", Substatus.TRANSIENT)
+        elif pr.persistent:
+            self._emit(pr, "CHECKS_FAILED", Substatus.PERSISTENT)
+        elif roll < config.p_build_hang:
+            return
+        elif roll < config.p_build_hang + config.p_transient:
+            self._emit(pr, "CHECKS_FAILED", Substatus.TRANSIENT)
+        elif roll < config.p_build_hang + config.p_transient + config.p_persistent:
+            pr.persistent = True
+            self._emit(pr, "CHECKS_FAILED", Substatus.PERSISTENT)
+        else:
+            self._emit(pr, "CHECKS_PASSED")
+            self._at(self._minutes(1), self._policy_bot, pr)
+            return
+        if self.rng.random() < config.p_human_rebuild:
+            self._at(self._minutes(10), self._developer_command, pr, "/rebuild")
+
+    def _policy_bot(self, pr):
+        if pr.state not in (State.CHECKS_PASSED, State.POLICY_EVALUATING, State.POLICY_FAILED):
+            return
+        if self.rng.random() < self.config.p_bot_drop:
+            return
+        self._emit(pr, "POLICY_STARTED")
+        self._at(self._minutes(2), self._policy_verdict, pr, self.config.p_sod_failure)
+
+    def _policy_verdict(self, pr, p_sod_failure):
+        if pr.state is not State.POLICY_EVALUATING:
+            return
+        if self.rng.random() < p_sod_failure:
+            self._emit(pr, "POLICY_FAILED", Substatus.SOD_FAILURE)
+            return
+        self._emit(pr, "POLICY_PASSED")
+        self._at(self._minutes(3), self._approver_bot, pr)
+
+    def _sod_validator(self, pr):
+        if pr.state not in (State.POLICY_FAILED, State.APPROVED):
+            return
+        self._emit(pr, "POLICY_STARTED")
+        self._at(self._minutes(2), self._policy_verdict, pr, 1 - self.config.p_sod_recheck_passes)
+
+    def _approver_bot(self, pr):
+        if pr.state is not State.POLICY_PASSED or self.rng.random() < self.config.p_bot_drop:
+            return
+        self._emit(pr, "APPROVAL_GRANTED")
+        self._at(self._minutes(1), self._automerge_bot, pr)
+
+    def _automerge_bot(self, pr):
+        if pr.state is not State.APPROVED or pr.behind or pr.conflict:
+            return  # GitHub blocks the merge; the PR sits in APPROVED
+        if self.rng.random() < self.config.p_bot_drop:
+            return
+        self._emit(pr, "MERGE_ATTEMPTED")
+        self._at(self.rng.uniform(10, 60), self._emit, pr, "MERGE_SUCCEEDED")
+
+    def _developer_command(self, pr, command):
+        if pr.state in (State.MERGED, State.CLOSED):
+            return
+        pr.persistent = False  # they pushed a fix first
+        self.coalescer.submit(CommandMessage(pr.number, REPO, command, "pr-comment", "developer", self.now))
+
+    def _developer_merge(self, pr):
+        if pr.state not in (State.MERGED, State.CLOSED):
+            self.lineages[pr.lineage].by_hand = True
+            self._emit(pr, "PR_MERGED")
+
+    # Event Processor (§13)
+
+    def _process(self, pr_number, event_type, substatus=Substatus.NONE, state=None):
+        delivery = Delivery(None, REPO, pr_number, event_type, self.now)
+        anomalies_seen = [0]  # from the last run of change(); update() may run it more than once
+
+        def change(record):
+            if record is None:
+                new_state, last, anomalies = apply_events(None, None, [delivery])
+                return PRStateRecord(REPO, pr_number, new_state, last, self.now) if new_state is not None else None
+            if state is not None:
+                new_state, last, anomalies = state, self.now, 0
+            else:
+                new_state, last, anomalies = apply_events(record.current_state, record.last_event_timestamp,
+                                                          [delivery])
+            anomalies_seen[0] = anomalies
+            if (new_state, last) == (record.current_state, record.last_event_timestamp):
+                return None
+            return record._replace(current_state=new_state, last_event_timestamp=last,
+                                   state_substatus=substatus if substatus or new_state != record.current_state
+                                   else record.state_substatus)
+
+        record = self.store.update(REPO, pr_number, change)
+        self.anomalies += anomalies_seen[0]
+        if record is None:
+            return
+        self.index.update(REPO, pr_number, record.current_state, record.last_event_timestamp)
+        self.summaries.record(PREvent(REPO, pr_number, self.now, event_type, "github-webhook"), state)
+
+    # Reconciler (§9)
+
+    def _reconcile(self):
+        start = time.perf_counter()
+        metrics, timer = self.metrics, self.metrics.run()
+        lap = timer.lap
+        candidates = self.index.stale(self.now)
+        metrics.count("stale_candidates", len(candidates))
+        lap("query")
+        for name, breaker in self.dispatcher.breakers.items():
+            if breaker.state is BreakerState.OPEN:
+                metrics.count("runs_with_breaker_open", dependency=name)
+        lap("breaker")
+        requests = self.poller.requests
+        snapshots = self._loop.run_until_complete(
+            self.poller.poll([(REPO, candidate.pr_number) for candidate in candidates]))
+        self.calls["github_poll"] += self.poller.requests - requests
+        lap("github_poll")
+        for candidate in candidates:
+            pr = self.prs[candidate.pr_number]
+            snapshot = snapshots[(REPO, pr.number)]
+            record = self.reconciler_store.get(REPO, pr.number)
+            # STEP 3b: the poll shows GitHub's truth; correct drift and re-evaluate later.
+            state, substatus = _observed_state(snapshot)
+            if state is not record.current_state or substatus != (record.state_substatus or Substatus.NONE):
+                self.drift_corrections += 1
+                metrics.count("drift_corrected")
+                self._process(pr.number, "STATE_DRIFT_CORRECTED", substatus, state=state)
+                lap("drift")
+                continue
+            lap("drift")
+            summary = self.summaries.get(REPO, pr.number)
+            facts = PRFacts(record.current_state, record.state_substatus or Substatus.NONE,
+                            self.now - record.last_event_timestamp, snapshot.merge_conflict, snapshot.behind_base,
+                            summary.bot_responded() if summary else False, record.retry_counts)
+            strategy = classify(facts).strategy
+            lap("classify")
+            if strategy is Strategy.NEEDS_INTERVENTION:
+                metrics.count("escalations")
+                self._escalate(pr)
+                lap("budget")
+                continue
+            # The staleness clock restarts at remediation (last_remediation_at).
+            self.index.update(REPO, pr.number, record.current_state, self.now)
+            if strategy is Strategy.NO_ACTION:
+                lap("record")
+                continue
+            self.reconciler_store.update(REPO, pr.number, lambda r, key=BUDGET_KEYS.get(strategy): (
+                r.bump_retry(key) if key else r)._replace(last_remediation_at=self.now,
+                                                          remediation_action=strategy.name))
+            lap("record")
+            metrics.count("remediations", strategy=strategy.name)
+            self.coalescer.submit(CommandMessage(pr.number, REPO, STRATEGY_COMMANDS[strategy], "reconciler",
+                                                 "reconciler", self.now))
+            lap("dispatch")
+        timer.finish()
+        self.run_seconds.append(time.perf_counter() - start)
+        self.run_candidates.append(len(candidates))
+        self._at(self.config.reconcile_every, self._reconcile)
+
+    def _escalate(self, pr):
+        self.lineages[pr.lineage].escalated = True
+        self._process(pr.number, "ESCALATED_NEEDS_INTERVENTION")
+        self.index.remove(REPO, pr.number)
+        if self.rng.random() < self.config.p_human_fix:
+            self._at(self._minutes(240), self._developer_merge, pr)
+
+    # Command queue → Car Bridge → Dispatcher
+
+    def _enqueue(self, command):
+        lineage = self.lineages[self.prs[command.pr_number].lineage]
+        self.scheduler.push(command, command.source, lineage.severity, self.now - lineage.created_at)
+
+    def _consume(self):
+        self.coalescer.expire(self.now)
+        for _ in range(self.config.consume_per_tick):
+            command = self.scheduler.pop()
+            if command is None:
+                break
+            record = self.reconciler_store.get(REPO, command.pr_number)
+            routed = self.bridge.route(command.to_bridge(), record.current_state if record else None)
+            self.rejected_commands += not routed.accepted
+        self.dispatcher.dispatch_ready()
+        self._at(self.config.tick, self._consume)
+
+    def _to_dispatcher(self, message):
+        self.dispatcher.submit(RemediationAction(message.repo, message.pr_number, COMMAND_STRATEGIES[message.name]))
+
+    def _dispatch_exhausted(self, action, attempts):
+        """The dependency failed every attempt: spend the strategy's budget, so a still-stale PR escalates."""
+        key = BUDGET_KEYS.get(action.strategy)
+        if key is not None:
+            self.reconciler_store.update(REPO, action.pr_number, lambda r: r._replace(
+                retry_counts={**r.retry_counts, key: max(r.retry_counts.get(key, 0), RETRY_BUDGETS[key])}))
+
+    def _send(self, action):
+        """A remediation call reaches its dependency; False if the dependency fails it."""
+        pr = self.prs[action.pr_number]
+        strategy = action.strategy
+        if strategy is Strategy.RETRY_CHECKS:
+            self.calls["jenkins"] += 1
+            if self._jenkins_down():
+                return False
+            self._at(30, self._start_build, pr)
+        elif strategy is Strategy.RETRIGGER_POLICY_BOT:
+            self.calls["policy_bot"] += 1
+            self._at(30, self._policy_bot, pr)
+        elif strategy is Strategy.RETRIGGER_SOD_CHECK:
+            self.calls["sod_validator"] += 1
+            self._at(30, self._sod_validator, pr)
+        elif strategy is Strategy.RETRIGGER_APPROVER_BOT:
+            self.calls["approver_bot"] += 1
+            self._at(30, self._approver_bot, pr)
+        elif strategy is Strategy.RETRIGGER_MERGE:
+            self.calls["automerge_bot"] += 1
+            self._at(30, self._automerge_bot, pr)
+        elif strategy is Strategy.UPDATE_BRANCH:
+            self.calls["github"] += 1
+            pr.behind = False
+            self._at(30, self._start_build, pr)
+        elif strategy in (Strategy.CLOSE_AND_REOPEN, Strategy.CLOSE_PR):
+            self.calls["github"] += 1
+            if pr.state in (State.MERGED, State.CLOSED):
+                return True
+            self._emit(pr, "PR_CLOSED")
+            if strategy is Strategy.CLOSE_AND_REOPEN:
+                self._open(pr.lineage, conflict=False)
+        self.lineages[pr.lineage].remediated = True
+        return True
+
+    def run(self):
+        config = self.config
+        for _ in range(self.fleet):
+            self._at(self.rng.uniform(0, config.arrival_hours * 3600), self._new_lineage)
+        self._at(config.reconcile_every, self._reconcile)
+        self._at(config.tick, self._consume)
+        end = (config.arrival_hours + config.drain_hours) * 3600
+        queue = self._queue
+        while queue and queue[0][0] <= end:
+            self.now, _, action, args = heapq.heappop(queue)
+            action(*args)
+        self._loop.close()
+        self.now = end
+        return self.report()
+
+    def report(self):
+        hours = self.now / 3600
+        merged = [l for l in self.lineages if l.merged_at is not None]
+        healed = [l for l in merged if l.remediated and not l.by_hand]
+        to_merge = [(l.merged_at - l.created_at) / 60 for l in merged]
+        return {
+            "prs": len(self.lineages),
+            "merged": len(merged),
+            "healed": len(healed),
+            "by_hand": sum(l.by_hand for l in merged),
+            "needs_intervention": sum(l.escalated and l.merged_at is None for l in self.lineages),
+            "healed_per_hour": len(healed) / hours,
+            "merge_minutes": {q: _percentile(to_merge, q) for q in (0.5, 0.9, 0.99)},
+            "api_calls_per_pr": {name: count / max(1, len(self.lineages)) for name, count in self.calls.items()},
+            "run_ms": {q: _percentile(self.run_seconds, q) * 1000 for q in (0.5, 0.99, 1.0)},
+            "max_candidates": max(self.run_candidates, default=0),
+            "stage_ms": {stage: (self.metrics.histograms[stage].quantile(0.99) or 0) / 1e6
+                         for stage in RECONCILER_STAGES},
+            "drift_corrections": self.drift_corrections,
+            "rejected_commands": self.rejected_commands,
+            "coalesced_commands": self.coalescer.coalesced,
+        }
+
+
+def _format_minutes(minutes):
+    return f"{minutes:.0f}m" if minutes < 120 else f"{minutes / 60:.1f}h"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-outage", action="store_true", help="no Jenkins outage")
+    args = parser.parse_args(argv)
+
+    config = SimConfig(seed=args.seed, outage=None if args.no_outage else SimConfig().outage)
+    for fleet in args.fleet:
+        start = time.perf_counter()
+        r = Simulation(fleet, config).run()
+        calls = r["api_calls_per_pr"]
+        merge = r["merge_minutes"]
+        print(f"  {fleet:,} PRs, {config.arrival_hours + config.drain_hours:.0f}h simulated"
+              f" in {time.perf_counter() - start:.1f}s")
+        print(f"    merged {r['merged']:,} (healed by remediation {r['healed']:,}, by hand {r['by_hand']:,}),"
+              f" needs intervention {r['needs_intervention']:,}")
+        print(f"    healed/hour {r['healed_per_hour']:.1f}   time to merge p50 {_format_minutes(merge[0.5])}"
+              f"  p90 {_format_minutes(merge[0.9])}  p99 {_format_minutes(merge[0.99])}")
+        print(f"    API calls/PR {sum(calls.values()):.2f}: "
+              + ", ".join(f"{name} {value:.2f}" for name, value in calls.items() if value))
+        print(f"    reconciler run p50 {r['run_ms'][0.5]:.2f} ms  p99 {r['run_ms'][0.99]:.2f} ms"
+              f"  max {r['run_ms'][1.0]:.2f} ms  (up to {r['max_candidates']:,} candidates)")
+        print("    p99 by step: " + ", ".join(f"{stage} {ms:.2f} ms" for stage, ms in r["stage_ms"].items()))
+        print(f"    drift corrected {r['drift_corrections']:,}, commands coalesced {r['coalesced_commands']:,},"
+              f" rejected by Car Bridge {r['rejected_commands']:,}")
+
+
+if __name__ == "__main__":
+    main()
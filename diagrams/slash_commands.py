@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Slash-command detection in PR comments (logical flow §11, §18; story 9.3).
+
+The Car Bridge routes every ``issue_comment`` webhook here. Most comments
+are not commands, and some are large bot-generated reports, so
+parse_comment() works in three steps:
+
+1. It looks only at the first ``scan_limit`` bytes of the body, as UTF-8.
+2. It rejects the body unless a line there starts with ``/``: either the
+   first character is ``/`` or the text contains ``"\\n/"``. Both are
+   single C-level scans.
+3. It runs one compiled alternation over the eight supported commands
+   (car_bridge.COMMAND_STATES), anchored at line starts.
+
+A command must start its line and end at whitespace or the end of the
+line. That end is checked against the whole body, so a longer word cut
+off by the scan limit (``/rebuildx``) is not read as a command. Unrecognized commands (``/retest``) and quoted replies
+(``> /rebuild``) are ignored. The first match becomes a CommandMessage in
+the §11 format, with ``source = "pr-comment"``.
+
+Run this module to time the scanner over a corpus of realistic comment
+bodies, against splitting every body into lines:
+
+    python slash_commands.py --comments 10000
+"""
+
+import argparse
+import random
+import re
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from car_bridge import COMMAND, COMMAND_STATES, Message
+
+SUPPORTED_COMMANDS = tuple(COMMAND_STATES)
+SCAN_LIMIT = 4096  # bytes of a comment body (UTF-8) searched for a command
+
+# Longest first, so no command is shadowed by one that is its prefix.
+_COMMAND_RE = re.compile(
+    r"^(" + "|".join(re.escape(c) for c in sorted(SUPPORTED_COMMANDS, key=len, reverse=True)) + r")(?=\s|$)",
+    re.MULTILINE,
+)
+
+
+class CommandMessage(NamedTuple):
+    """A command queue message (§11 Command Message Format)."""
+
+    pr_number: int
+    repo: str
+    command: str
+    source: str
+    requested_by: str
+    timestamp: float
+
+    def to_bridge(self):
+        """The Car Bridge message for this command."""
+        return Message(COMMAND, self.command, self.repo, self.pr_number, self.source, self)
+
+
+def _head(body, scan_limit):
+    """The longest prefix of ``body`` that is at most ``scan_limit`` bytes in UTF-8."""
+    head = body[:scan_limit]
+    if head.isascii():
+        return head
+    return head.encode()[:scan_limit].decode(errors="ignore")
+
+
+def find_command(body, scan_limit=SCAN_LIMIT):
+    """The first supported slash command at the start of a line of ``body``, or None."""
+    head = _head(body, scan_limit)
+    if not head.startswith("/") and "\n/" not in head:
+        return None
+    for match in _COMMAND_RE.finditer(head):
+        end = match.end()
+        # At the end of the scanned head, ``$`` matched the scan limit: the body may go on.
+        if end < len(head) or end == len(body) or body[end].isspace():
+            return match.group(1)
+    return None
+
+
+def parse_comment(repo, pr_number, body, requested_by, timestamp, scan_limit=SCAN_LIMIT):
+    """A CommandMessage for a PR comment that carries a command, else None."""
+    command = find_command(body, scan_limit)
+    if command is None:
+        return None
+    return CommandMessage(pr_number, repo, command, "pr-comment", requested_by, timestamp)
+
+
+def parse_webhook(payload, scan_limit=SCAN_LIMIT):
+    """A CommandMessage for an ``issue_comment`` webhook payload, else None.
+
+    Only newly created comments on pull requests count; edits and issue
+    comments are ignored.
+    """
+    if payload.get("action") != "created" or "pull_request" not in payload["issue"]:
+        return None
+    comment = payload["comment"]
+    command = find_command(comment.get("body") or "", scan_limit)
+    if command is None:
+        return None
+    timestamp = datetime.fromisoformat(comment["created_at"].replace("Z", "+00:00")).timestamp()
+    return CommandMessage(payload["issue"]["number"], payload["repository"]["full_name"], command,
+                          "pr-comment", comment["user"]["login"], timestamp)
+
+
+def find_command_by_lines(body):
+    """Split the whole body into lines and check each; the benchmark baseline."""
+    for line in body.splitlines():
+        if line.startswith("/"):
+            word = line.split(None, 1)[0]
+            if word in COMMAND_STATES:
+                return word
+    return None
+
+
+def _bot_report(rng, rows):
+    lines = ["## Coverage report", "", "| File | Stmts | Miss | Cover |", "|---|---|---|---|"]
+    for n in range(rows):
+        path = f"src/service/module_{n}/handler_{rng.randrange(100)}.py"
+        lines.append(f"| {path} | {rng.randrange(10, 500)} | {rng.randrange(50)} | {rng.randrange(60, 100)}% |")
+    lines += ["", "<details><summary>Build log</summary>", "", "```"]
+    lines += [f"[{n:05d}] /opt/jenkins/workspace/build.sh: step {n} ok" for n in range(rows)]
+    return "\n".join(lines + ["```", "</details>"])
+
+
+def comment_corpus(n, seed=11):
+    """Comment bodies in a rough production mix. Every command falls inside the scan limit."""
+    rng = random.Random(seed)
+    human = [
+        "LGTM", "Thanks! Merging once CI is green.", "nit: rename this variable",
+        "See https://github.com/org/repo/pull/123/files for context.",
+        "Could you update src/app/config.py as well?", "> /rebuild\nDid that work?",
+        "/retest", "Why does this need /tmp access?", "+1",
+    ]
+    commands = ["/rebuild", "/recheck-sod\nSOD check timed out again.", "Jenkins flaked.\n/rebuild",
+                "/merge", "/update-branch please", "/cancel", "/recheck-policy\r\n", "/close-and-reopen"]
+    corpus = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.05:
+            corpus.append(rng.choice(commands))
+        elif roll < 0.30:
+            corpus.append(_bot_report(rng, rng.choice((50, 400, 2000))))
+        else:
+            corpus.append(rng.choice(human))
+    return corpus
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=10_000)
+    parser.add_argument("--scan-limit", type=int, default=SCAN_LIMIT)
+    args = parser.parse_args(argv)
+
+    corpus = comment_corpus(args.comments)
+    megabytes = sum(map(len, corpus)) / 1e6
+    results = {}
+    for label, find in (("fast path", lambda body: find_command(body, args.scan_limit)),
+                        ("split lines", find_command_by_lines)):
+        start = time.perf_counter()
+        results[label] = [find(body) for body in corpus]
+        seconds = time.perf_counter() - start
+        print(f"  {label:<12} {len(corpus) / seconds:12,.0f} comments/s  ({megabytes / seconds:8.1f} MB/s of bodies)")
+    assert results["fast path"] == results["split lines"], "scanners disagree"
+    assert find_command("/rebuildx", scan_limit=8) is None, "the scan limit cut a word into a command"
+    assert find_command("/rebuild now", scan_limit=8) == "/rebuild"
+    assert find_command("é" * 2048 + "\n/rebuild") is None, "the scan limit counted characters, not bytes"
+    found = sum(command is not None for command in results["fast path"])
+    print(f"  {len(corpus)} comments, {megabytes:.1f} MB: {found} commands found by both")
+
+
+if __name__ == "__main__":
+    main()
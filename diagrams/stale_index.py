@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Stale-PR index for reconciler STEP 1 (logical flow §9), using §8 thresholds.
+
+The index holds one min-heap per state. Each heap is keyed on the PR's
+deadline, ``last_event_timestamp + STALE_AFTER_SECONDS[state]``. The
+Event Processor calls update() whenever it writes a PR record. That costs
+O(log n): the old heap entry is left in place and skipped when reached.
+stale() pops the entries whose deadline has passed into a due set, each
+entry once. The due set is kept in deadline order. A run in which k PRs
+become overdue, with d overdue in all, therefore costs O(k log n + d)
+rather than a scan of every active PR. A PR stays a candidate until an
+event moves it. Each heap entry carries a generation, so an entry left
+over from an earlier identical ``(state, timestamp)`` is never mistaken
+for the live one.
+
+The index pays off when few PRs cross their deadline per run, which is
+the normal case: most PRs get their next event in time. If a large share
+of the fleet went overdue every run, k log n would approach a scan.
+
+``stale_after`` is either one threshold table for every repo, indexed by
+State value, or a function from repo to such a table
+(adaptive_thresholds.DwellTracker.stale_after). A PR's deadline is fixed
+when update() records it; later threshold changes apply from its next event.
+
+PRs are keyed by ``(repo, pr_number)`` and timestamps are epoch seconds.
+save() and load() persist the index as JSON.
+
+Run this module to compare stale() with a full scan. Each PR's next event
+arrives before its deadline, except for a ``--hang`` share that stall:
+
+    python stale_index.py --prs 50000 --hang 0.01
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from typing import NamedTuple
+
+from state_machine import ACTIVE_STATES, STALE_AFTER_SECONDS, State
+
+
+class StaleCandidate(NamedTuple):
+    deadline: float
+    repo: str
+    pr_number: int
+    state: State
+    last_event_timestamp: float
+
+
+class StaleIndex:
+    def __init__(self, stale_after=STALE_AFTER_SECONDS):
+        self._stale_after = stale_after if callable(stale_after) else (lambda repo: stale_after)
+        # One heap of (deadline, repo, pr_number, generation) per state, holding PRs not yet due.
+        self._heaps = {state: [] for state in State}
+        self._pending = {state: 0 for state in State}  # live entries per heap
+        # (repo, pr_number) → (state, last_event_timestamp) for every tracked PR.
+        self._records = {}
+        self._deadlines = {}  # (repo, pr_number) → deadline of its live heap entry
+        # (repo, pr_number) → generation of its live heap entry. Re-recording an earlier
+        # (state, timestamp) pushes an entry equal to a superseded one but for this.
+        self._generations = {}
+        self._generation = itertools.count()
+        # PRs whose deadline stale() has already seen pass: key → deadline, in deadline order.
+        self._due = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def get(self, repo, pr_number):
+        """Return ``(state, last_event_timestamp)`` or None."""
+        return self._records.get((repo, pr_number))
+
+    def update(self, repo, pr_number, state, last_event_timestamp):
+        """Record the PR's current state. States that never go stale are dropped."""
+        key = (repo, pr_number)
+        state = State(state)
+        stale_after = self._stale_after(repo)[state]
+        if stale_after == float("inf"):
+            self.remove(repo, pr_number)
+            return
+        if self._records.get(key) == (state, last_event_timestamp):
+            return
+        self.remove(repo, pr_number)
+        self._records[key] = (state, last_event_timestamp)
+        self._deadlines[key] = deadline = last_event_timestamp + stale_after
+        self._generations[key] = generation = next(self._generation)
+        self._pending[state] += 1
+        heap = self._heaps[state]
+        heapq.heappush(heap, (deadline, repo, pr_number, generation))
+        # Superseded entries are skipped lazily; rebuild once they dominate.
+        if len(heap) > 64 and len(heap) > 2 * self._pending[state]:
+            self._compact(state)
+
+    def remove(self, repo, pr_number):
+        key = (repo, pr_number)
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        del self._deadlines[key]
+        del self._generations[key]
+        if self._due.pop(key, None) is None:
+            self._pending[record[0]] -= 1
+
+    def _is_live(self, state, entry):
+        _, repo, pr_number, generation = entry
+        record = self._records.get((repo, pr_number))
+        return record is not None and record[0] is state and self._generations[(repo, pr_number)] == generation
+
+    def _compact(self, state):
+        """Drop superseded entries from one heap, in O(n)."""
+        heap = [entry for entry in self._heaps[state] if self._is_live(state, entry)]
+        heapq.heapify(heap)
+        self._heaps[state] = heap
+
+    def stale(self, now=None, states=ACTIVE_STATES):
+        """PRs whose last event is older than their state's threshold, most overdue first.
+
+        Entries whose deadline has passed move from their heap to the due set,
+        once each. They stay there, and keep being returned, until update() or
+        remove() replaces them.
+        """
+        now = time.time() if now is None else now
+        states = frozenset(states)
+        newly_due = []
+        for state in states:
+            heap = self._heaps[state]
+            while heap and heap[0][0] < now:
+                entry = heapq.heappop(heap)
+                if self._is_live(state, entry):
+                    newly_due.append(entry[:3])
+                    self._pending[state] -= 1
+        if newly_due:
+            self._add_due(sorted(newly_due))
+        candidates = []
+        for key, deadline in self._due.items():
+            if deadline >= now:
+                break
+            state, timestamp = self._records[key]
+            if state in states:
+                candidates.append(StaleCandidate(deadline, key[0], key[1], state, timestamp))
+        return candidates
+
+    def _add_due(self, entries):
+        """Add sorted ``(deadline, repo, pr_number)`` entries, keeping ``_due`` in that order."""
+        due = self._due
+        if due and (entries[0][0], entries[0][1:]) < next(reversed(due.items()))[::-1]:
+            # An entry older than the due set's newest (a late event): merge, O(d).
+            merged = heapq.merge(((d, k) for k, d in due.items()),
+                                 ((d, (repo, pr)) for d, repo, pr in entries))
+            self._due = {key: deadline for deadline, key in merged}
+        else:
+            for deadline, repo, pr_number in entries:
+                due[(repo, pr_number)] = deadline
+
+    def save(self, path):
+        """Write the live records to ``path`` as JSON, atomically."""
+        records = [[repo, pr_number, state.name, timestamp]
+                   for (repo, pr_number), (state, timestamp) in self._records.items()]
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".stale-index-", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(records, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, stale_after=STALE_AFTER_SECONDS):
+        """Rebuild an index from save() output; heaps are built in O(n)."""
+        index = cls(stale_after)
+        with open(path) as f:
+            records = json.load(f)
+        for repo, pr_number, state_name, timestamp in records:
+            state = State[state_name]
+            threshold = index._stale_after(repo)[state]
+            if threshold == float("inf"):
+                continue
+            index._records[(repo, pr_number)] = (state, timestamp)
+            index._deadlines[(repo, pr_number)] = timestamp + threshold
+            index._generations[(repo, pr_number)] = generation = next(index._generation)
+            index._pending[state] += 1
+            index._heaps[state].append((timestamp + threshold, repo, pr_number, generation))
+        for heap in index._heaps.values():
+            heapq.heapify(heap)
+        return index
+
+
+def scan(records, now, states=ACTIVE_STATES):
+    """The naive STEP 1 query: check every record. Used as the benchmark baseline."""
+    states = frozenset(states)
+    return sorted(
+        StaleCandidate(timestamp + STALE_AFTER_SECONDS[state], repo, pr_number, state, timestamp)
+        for (repo, pr_number), (state, timestamp) in records.items()
+        if state in states and now - timestamp > STALE_AFTER_SECONDS[state]
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prs", type=int, default=50_000)
+    parser.add_argument("--hang", type=float, default=0.01, help="chance a PR gets no event before its deadline")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    now = 1_700_000_000.0
+    index = StaleIndex()
+    waiting = [s for s in State if 0 < STALE_AFTER_SECONDS[s] < float("inf")]
+    events = []  # (time, pr_number) of each PR's next event; most arrive before the deadline
+
+    def record(pr_number, state, timestamp):
+        index.update("codegenie", pr_number, state, timestamp)
+        if rng.random() >= args.hang:
+            heapq.heappush(events, (timestamp + STALE_AFTER_SECONDS[state] * rng.uniform(0.1, 0.9), pr_number))
+
+    for n in range(args.prs):
+        state = rng.choice(waiting)
+        record(n, state, now - STALE_AFTER_SECONDS[state] * rng.uniform(0, 0.5))
+
+    index_s = scan_s = 0.0
+    stale_total = 0
+    for _ in range(args.runs):
+        now += 60
+        while events and events[0][0] <= now:
+            at, pr_number = heapq.heappop(events)
+            if index.get("codegenie", pr_number) is not None:
+                record(pr_number, rng.choice(waiting), at)
+
+        start = time.perf_counter()
+        found = index.stale(now)
+        index_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = scan(index._records, now)
+        scan_s += time.perf_counter() - start
+
+        if found != expected:
+            raise SystemExit(f"mismatch: index found {len(found)} stale PRs, scan found {len(expected)}")
+        stale_total += len(found)
+
+        # The reconciler remediates what it found, which moves those PRs on.
+        for candidate in found:
+            record(candidate.pr_number, rng.choice(waiting), now)
+
+    print(f"  {len(index)} tracked PRs, {stale_total / args.runs:.0f} stale per run on average")
+    print(f"  full scan {scan_s / args.runs * 1000:8.2f} ms/run")
+    print(f"  index     {index_s / args.runs * 1000:8.2f} ms/run")
+
+if __name__ == "__main__":
+    main()
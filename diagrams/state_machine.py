@@ -0,0 +1,167 @@
+"""PR lifecycle state machine — the executable form of logical flow §1, §2, §7 and §8.
+
+States, valid transitions, staleness thresholds and retry budgets are defined
+once here. The Event Processor validates a transition with
+is_valid_transition(), a single bitmask test, and state_machine_diagram.py
+draws its edges from TRANSITIONS.
+"""
+
+import enum
+from typing import NamedTuple, Optional
+
+
+class State(enum.IntEnum):
+    """PR lifecycle states. Values are bit positions in the adjacency masks."""
+
+    CREATED = 0
+    CHECKS_RUNNING = 1
+    CHECKS_PASSED = 2
+    CHECKS_FAILED = 3
+    POLICY_EVALUATING = 4
+    POLICY_PASSED = 5
+    POLICY_FAILED = 6
+    APPROVED = 7
+    MERGING = 8
+    MERGED = 9
+    CLOSED = 10
+    NEEDS_INTERVENTION = 11
+
+
+TERMINAL_STATES = frozenset({State.MERGED, State.CLOSED})
+
+# States the reconciler watches: everything except MERGED, CLOSED and
+# NEEDS_INTERVENTION (terminal-ish — waits for a human).
+ACTIVE_STATES = tuple(s for s in State if s not in TERMINAL_STATES and s is not State.NEEDS_INTERVENTION)
+
+# §8 — minutes a PR may sit in a state before the reconciler treats it as stale.
+STALE_AFTER_MINUTES = {
+    State.CREATED: 5,
+    State.CHECKS_RUNNING: 60,
+    State.CHECKS_FAILED: 30,
+    State.POLICY_EVALUATING: 30,
+    State.POLICY_PASSED: 15,
+    State.APPROVED: 10,
+    State.MERGING: 5,
+}
+
+
+def _stale_after_seconds(state):
+    if state in STALE_AFTER_MINUTES:
+        return STALE_AFTER_MINUTES[state] * 60
+    if state is State.CHECKS_PASSED:
+        return STALE_AFTER_MINUTES[State.POLICY_EVALUATING] * 60  # waits for Policy Bot
+    if state is State.POLICY_FAILED:
+        return 0.0  # waits for remediation: stale as soon as it is recorded
+    return float("inf")  # MERGED, CLOSED, NEEDS_INTERVENTION take no automated action
+
+
+# Seconds after last_event_timestamp at which a PR in each state is stale,
+# indexed by State value; inf means never.
+STALE_AFTER_SECONDS = tuple(_stale_after_seconds(s) for s in State)
+
+# §7 — maximum attempts per remediation strategy before escalation.
+RETRY_BUDGETS = {
+    "rebuild": 3,
+    "branch_update": 2,
+    "retrigger_policy_bot": 2,
+    "retrigger_approver_bot": 2,
+    "retrigger_automerge_bot": 2,
+    "retrigger_sod_check": 1,
+    "close_and_reopen": 1,
+}
+
+
+class Transition(NamedTuple):
+    source: State
+    target: State
+    trigger: str
+    kind: str                       # happy · failure · recovery · remediation · close · escalation
+    strategy: Optional[str] = None  # remediation strategy (key of RETRY_BUDGETS)
+    note: str = ""
+
+
+S = State
+
+# §2 — explicit transitions, including the remediation loops that drive them.
+# Several rows may share a (source, target) pair; they differ by trigger.
+TRANSITIONS = (
+    # Happy path
+    Transition(S.CREATED, S.CHECKS_RUNNING, "CI checks begin", "happy"),
+    Transition(S.CHECKS_RUNNING, S.CHECKS_PASSED, "All checks pass", "happy"),
+    Transition(S.CHECKS_PASSED, S.POLICY_EVALUATING, "Policy Bot evaluates", "happy"),
+    Transition(S.POLICY_EVALUATING, S.POLICY_PASSED, "All policies met", "happy"),
+    Transition(S.POLICY_PASSED, S.APPROVED, "Approver Bot approves", "happy"),
+    Transition(S.APPROVED, S.MERGING, "Automerge begins", "happy"),
+    Transition(S.MERGING, S.MERGED, "Merge succeeds", "happy"),
+
+    # Failure branches
+    Transition(S.CHECKS_RUNNING, S.CHECKS_FAILED, "Check fails / timeout", "failure"),
+    Transition(S.POLICY_EVALUATING, S.POLICY_FAILED, "Policy violated\n(SOD · foreign commit · etc.)", "failure"),
+
+    # Merge failure paths
+    Transition(S.MERGING, S.CHECKS_RUNNING, "Branch behind\n→ auto-update", "recovery"),
+    Transition(S.MERGING, S.CLOSED, "Merge conflicts", "failure"),
+
+    # Self-healing remediation (§10)
+    Transition(S.CHECKS_FAILED, S.CHECKS_RUNNING, "Rebuild", "remediation", "rebuild"),
+    Transition(S.CHECKS_FAILED, S.CHECKS_RUNNING, "Update Branch", "remediation", "branch_update"),
+    Transition(S.CHECKS_FAILED, S.CLOSED, "Close & Reopen", "remediation", "close_and_reopen", "conflicts"),
+    Transition(S.CHECKS_PASSED, S.POLICY_EVALUATING, "Retrigger Policy Bot", "remediation", "retrigger_policy_bot"),
+    Transition(S.POLICY_FAILED, S.POLICY_EVALUATING, "Retrigger Policy", "remediation", "retrigger_policy_bot"),
+    Transition(S.POLICY_FAILED, S.POLICY_EVALUATING, "Recheck SOD", "remediation", "retrigger_sod_check"),
+    Transition(S.POLICY_PASSED, S.APPROVED, "Retrigger Approver", "remediation", "retrigger_approver_bot"),
+    Transition(S.APPROVED, S.MERGING, "Retrigger Automerge", "remediation", "retrigger_automerge_bot"),
+    Transition(S.APPROVED, S.POLICY_EVALUATING, "Recheck SOD", "remediation", "retrigger_sod_check",
+               "2-approval repos"),
+
+    # Permanent policy failure → close (no reopen)
+    Transition(S.POLICY_FAILED, S.CLOSED, "Permanent failure\n(foreign commit · invalid file)\nCodeGenie closes",
+               "close"),
+
+    # Escalation
+    Transition(S.CHECKS_FAILED, S.NEEDS_INTERVENTION, "Persistent failure /\nbudget exhausted", "escalation"),
+    Transition(S.POLICY_FAILED, S.NEEDS_INTERVENTION, "Unknown failure /\nbudget exhausted", "escalation"),
+)
+
+# §2 "Any non-terminal state → …" rows, valid from every active state.
+ANY_ACTIVE_TARGETS = (S.CLOSED, S.NEEDS_INTERVENTION, S.CHECKS_RUNNING)
+
+# §1 — a human resolves NEEDS_INTERVENTION by merging or closing the PR.
+INTERVENTION_TARGETS = (S.MERGED, S.CLOSED)
+
+del S
+
+
+def _build_successor_masks():
+    masks = [0] * len(State)
+    for t in TRANSITIONS:
+        masks[t.source] |= 1 << t.target
+    wildcard = sum(1 << target for target in ANY_ACTIVE_TARGETS)
+    for state in ACTIVE_STATES:
+        masks[state] |= wildcard
+    for target in INTERVENTION_TARGETS:
+        masks[State.NEEDS_INTERVENTION] |= 1 << target
+    return tuple(masks)
+
+
+# _SUCCESSOR_MASKS[s] has bit t set iff s → t is a valid transition.
+_SUCCESSOR_MASKS = _build_successor_masks()
+
+
+def is_valid_transition(source, target):
+    """Return whether ``source → target`` is allowed, in constant time.
+
+    Accepts ``State`` members or their int values. Invalid transitions are
+    not an error here: the Event Processor logs them as anomalous (§13 STEP 3).
+    """
+    return (_SUCCESSOR_MASKS[source] >> target) & 1 == 1
+
+
+def successors(state):
+    """All states reachable from ``state`` in one valid transition."""
+    mask = _SUCCESSOR_MASKS[state]
+    return frozenset(s for s in State if mask >> s & 1)
+
+
+def is_terminal(state):
+    return state in TERMINAL_STATES
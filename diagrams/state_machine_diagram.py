@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
-"""PR Lifecycle State Machine diagram — all 12 states with self-healing loops."""
+"""PR Lifecycle State Machine diagram — all 12 states with self-healing loops.
+
+Edges, staleness thresholds and retry budgets come from state_machine.py.
+"""
 
-import os
 import graphviz
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+from rendering import parse_args, render
+from state_machine import RETRY_BUDGETS, STALE_AFTER_MINUTES, TRANSITIONS, State
 
 FONT = "Helvetica Neue,Helvetica,Arial"
 
@@ -25,6 +26,41 @@ EDGE_HEAL_ORANGE = "#e17055"
 EDGE_REOPEN = "#6c5ce7"
 EDGE_ESCALATE = "#9b1b1b"
 
+# Edge styles by transition kind; remediation edges are colored by strategy.
+KIND_STYLES = {
+    "happy": dict(color=EDGE_HAPPY, fontcolor=EDGE_HAPPY, penwidth="2.5", style="bold"),
+    "failure": dict(color=EDGE_FAIL, fontcolor=EDGE_FAIL, penwidth="1.5"),
+    "recovery": dict(color=EDGE_HEAL_ORANGE, fontcolor=EDGE_HEAL_ORANGE, penwidth="1.5", style="dashed"),
+    "close": dict(color=EDGE_ESCALATE, fontcolor=EDGE_ESCALATE, penwidth="1.5"),
+    "escalation": dict(color=EDGE_ESCALATE, fontcolor=EDGE_ESCALATE, penwidth="1.5"),
+}
+STRATEGY_COLORS = {
+    "rebuild": EDGE_HEAL_BLUE,
+    "branch_update": EDGE_HEAL_BLUE,
+    "close_and_reopen": EDGE_REOPEN,
+}
+
+# Pairs drawn without rank constraints even on first appearance.
+UNCONSTRAINED = {(State.APPROVED, State.POLICY_EVALUATING)}
+
+
+def stale(state):
+    return f"⏱ stale: {STALE_AFTER_MINUTES[state]} min"
+
+
+def edge_label(t):
+    if t.kind != "remediation":
+        return t.trigger
+    label = f"🔄 {t.trigger} (max {RETRY_BUDGETS[t.strategy]})"
+    return f"{label}\n({t.note})" if t.note else label
+
+
+def edge_style(t):
+    if t.kind != "remediation":
+        return KIND_STYLES[t.kind]
+    color = STRATEGY_COLORS.get(t.strategy, EDGE_HEAL_ORANGE)
+    return dict(color=color, fontcolor=color, penwidth="1.5", style="dashed")
+
 
 def create_state_machine():
     g = graphviz.Digraph("pr_state_machine", format="png")
@@ -45,25 +81,25 @@ def create_state_machine():
     g.attr("node", fontname=FONT, fontsize="11", style="filled,rounded", shape="box", penwidth="2")
     g.attr("edge", fontname=FONT, fontsize="9")
 
-    # ── States ──────────────────────────────────────────────
+    # ── States ──────────────────────────────────────────
 
-    g.node("CREATED", "CREATED\n⏱ stale: 5 min",
+    g.node("CREATED", f"CREATED\n{stale(State.CREATED)}",
            fillcolor=INIT_PURPLE, fontcolor="#ffffff")
-    g.node("CHECKS_RUNNING", "CHECKS_RUNNING\n⏱ stale: 60 min",
+    g.node("CHECKS_RUNNING", f"CHECKS_RUNNING\n{stale(State.CHECKS_RUNNING)}",
            fillcolor=ACTIVE_BLUE, fontcolor="#ffffff")
     g.node("CHECKS_PASSED", "CHECKS_PASSED\nwaits for Policy Bot",
            fillcolor=PASS_GREEN, fontcolor="#2d3436")
-    g.node("CHECKS_FAILED", "CHECKS_FAILED\n⏱ stale: 30 min",
+    g.node("CHECKS_FAILED", f"CHECKS_FAILED\n{stale(State.CHECKS_FAILED)}",
            fillcolor=FAIL_RED, fontcolor="#ffffff")
-    g.node("POLICY_EVALUATING", "POLICY_EVALUATING\n⏱ stale: 30 min\n(can run at any pre-merge stage)",
+    g.node("POLICY_EVALUATING", f"POLICY_EVALUATING\n{stale(State.POLICY_EVALUATING)}\n(can run at any pre-merge stage)",
            fillcolor=ACTIVE_BLUE, fontcolor="#ffffff")
-    g.node("POLICY_PASSED", "POLICY_PASSED\n⏱ stale: 15 min",
+    g.node("POLICY_PASSED", f"POLICY_PASSED\n{stale(State.POLICY_PASSED)}",
            fillcolor=PASS_GREEN, fontcolor="#2d3436")
     g.node("POLICY_FAILED", "POLICY_FAILED",
            fillcolor=FAIL_RED, fontcolor="#ffffff")
-    g.node("APPROVED", "APPROVED\n⏱ stale: 10 min\n(SOD checked here for 2-approval repos)",
+    g.node("APPROVED", f"APPROVED\n{stale(State.APPROVED)}\n(SOD checked here for 2-approval repos)",
            fillcolor=PASS_GREEN, fontcolor="#2d3436")
-    g.node("MERGING", "MERGING\n⏱ stale: 5 min",
+    g.node("MERGING", f"MERGING\n{stale(State.MERGING)}",
            fillcolor=ACTIVE_BLUE, fontcolor="#ffffff")
 
     # Terminal states — double border
@@ -74,77 +110,21 @@ def create_state_machine():
     g.node("NEEDS_INTERVENTION", "NEEDS INTERVENTION\nawaits human",
            fillcolor=ALERT_RED, fontcolor="#ffffff", peripheries="2", penwidth="3")
 
-    # ── Happy Path (bold blue) ──────────────────────────────
-
-    happy = dict(color=EDGE_HAPPY, fontcolor=EDGE_HAPPY, penwidth="2.5", style="bold")
-    g.edge("CREATED", "CHECKS_RUNNING", label="CI checks begin", **happy)
-    g.edge("CHECKS_RUNNING", "CHECKS_PASSED", label="All checks pass", **happy)
-    g.edge("CHECKS_PASSED", "POLICY_EVALUATING", label="Policy Bot evaluates", **happy)
-    g.edge("POLICY_EVALUATING", "POLICY_PASSED", label="All policies met", **happy)
-    g.edge("POLICY_PASSED", "APPROVED", label="Approver Bot approves", **happy)
-    g.edge("APPROVED", "MERGING", label="Automerge begins", **happy)
-    g.edge("MERGING", "MERGED", label="Merge succeeds", **happy)
-
-    # ── Failure Branches (solid red) ────────────────────────
-
-    fail = dict(color=EDGE_FAIL, fontcolor=EDGE_FAIL, penwidth="1.5")
-    g.edge("CHECKS_RUNNING", "CHECKS_FAILED", label="Check fails / timeout", **fail)
-    g.edge("POLICY_EVALUATING", "POLICY_FAILED", label="Policy violated\n(SOD · foreign commit · etc.)", **fail)
-
-    # ── Merge Failure Paths ─────────────────────────────────
-
-    g.edge("MERGING", "CHECKS_RUNNING", label="Branch behind\n→ auto-update",
-           color=EDGE_HEAL_ORANGE, fontcolor=EDGE_HEAL_ORANGE, penwidth="1.5", style="dashed")
-    g.edge("MERGING", "CLOSED", label="Merge conflicts",
-           color=EDGE_FAIL, fontcolor=EDGE_FAIL, penwidth="1.5")
-
-    # ── Self-Healing: Rebuild / Update Branch (dashed blue) ─
-
-    heal_blue = dict(color=EDGE_HEAL_BLUE, fontcolor=EDGE_HEAL_BLUE, penwidth="1.5", style="dashed")
-    g.edge("CHECKS_FAILED", "CHECKS_RUNNING",
-           label="🔄 Rebuild (max 3)", **heal_blue)
-    g.edge("CHECKS_FAILED", "CHECKS_RUNNING",
-           label="🔄 Update Branch (max 2)",
-           color=EDGE_HEAL_BLUE, fontcolor=EDGE_HEAL_BLUE, penwidth="1.5", style="dashed",
-           constraint="false")
-
-    # ── Self-Healing: Close & Reopen (dashed purple) ────────
-
-    heal_purple = dict(color=EDGE_REOPEN, fontcolor=EDGE_REOPEN, penwidth="1.5", style="dashed")
-    g.edge("CHECKS_FAILED", "CLOSED", label="🔄 Close & Reopen\n(max 1 · conflicts)", **heal_purple)
-    g.edge("CLOSED", "CREATED", label="New PR created\nfor same vulnerability", **heal_purple)
-
-    # ── Self-Healing: Bot Retriggers (dashed orange) ────────
-
-    heal_orange = dict(color=EDGE_HEAL_ORANGE, fontcolor=EDGE_HEAL_ORANGE, penwidth="1.5", style="dashed")
-    g.edge("CHECKS_PASSED", "POLICY_EVALUATING",
-           label="🔄 Retrigger Policy Bot (max 2)", constraint="false", **heal_orange)
-    g.edge("POLICY_FAILED", "POLICY_EVALUATING",
-           label="🔄 Retrigger Policy (max 2)", **heal_orange)
-    g.edge("POLICY_FAILED", "POLICY_EVALUATING",
-           label="🔄 Recheck SOD (max 1)", constraint="false", **heal_orange)
-    g.edge("POLICY_PASSED", "APPROVED",
-           label="🔄 Retrigger Approver (max 2)", constraint="false", **heal_orange)
-    g.edge("APPROVED", "MERGING",
-           label="🔄 Retrigger Automerge (max 2)", constraint="false", **heal_orange)
-
-    # ── Self-Healing: SOD Recheck from APPROVED (dashed orange) ─
-    g.edge("APPROVED", "POLICY_EVALUATING",
-           label="🔄 Recheck SOD (max 1)\n(2-approval repos)", constraint="false", **heal_orange)
-
-    # ── Permanent Policy Failure → Close (no reopen) ────────
-
-    g.edge("POLICY_FAILED", "CLOSED",
-           label="Permanent failure\n(foreign commit · invalid file)\nCodeGenie closes",
-           color=EDGE_ESCALATE, fontcolor=EDGE_ESCALATE, penwidth="1.5")
+    # ── Transitions (state_machine.TRANSITIONS) ─────────
 
-    # ── Escalation (solid dark red) ─────────────────────────
+    drawn = set()
+    for t in TRANSITIONS:
+        pair = (t.source, t.target)
+        attrs = dict(edge_style(t))
+        # Repeated pairs and the SOD recheck loop would otherwise stretch the ranks.
+        if pair in drawn or pair in UNCONSTRAINED:
+            attrs["constraint"] = "false"
+        drawn.add(pair)
+        g.edge(t.source.name, t.target.name, label=edge_label(t), **attrs)
 
-    esc = dict(color=EDGE_ESCALATE, fontcolor=EDGE_ESCALATE, penwidth="1.5")
-    g.edge("CHECKS_FAILED", "NEEDS_INTERVENTION",
-           label="Persistent failure /\nbudget exhausted", **esc)
-    g.edge("POLICY_FAILED", "NEEDS_INTERVENTION",
-           label="Unknown failure /\nbudget exhausted", **esc)
+    # Not a transition of the same record: the replacement PR starts its own lifecycle.
+    g.edge("CLOSED", "CREATED", label="New PR created\nfor same vulnerability",
+           color=EDGE_REOPEN, fontcolor=EDGE_REOPEN, penwidth="1.5", style="dashed")
 
     # ── Legend ──────────────────────────────────────────────
 
@@ -183,11 +163,9 @@ def create_state_machine():
     return g
 
 
-def main():
-    g = create_state_machine()
-    for fmt in ["png", "svg"]:
-        g.format = fmt
-        g.render(filename=os.path.join(OUTPUT_DIR, "state_machine"), cleanup=True)
+def main(argv=None):
+    args = parse_args(argv, __doc__)
+    render(create_state_machine(), "state_machine", args.formats, force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""State Table access with optimistic concurrency and a hot-record cache (logical flow §4, §9, §13).
+
+The Event Processor (§13 STEP 4) and the reconciler (§9 STEP 3b/3e)
+update the same PR State record. A plain read-modify-write lets one
+overwrite the other. Every record therefore carries a ``version``.
+StateStore.update() reads the record and applies a change function. It then
+writes conditionally: only if the stored version is still the one it
+read. On a conflict it re-reads from storage and retries, up to
+``max_attempts`` times, with jittered backoff, and then raises
+VersionConflict.
+
+Reads go through an LRU cache of hot records, so a webhook burst for one
+PR reads storage once. The store's own writes refresh the cache. Writes by
+other processes reach it through the table's change stream: observe() drops
+a cached record that is older than a version seen there. A stale cached
+record is never written back, because its version fails the condition.
+When ``change`` decides a cached record needs no write, update() re-reads
+it from storage and asks again, so a no-op is never decided on stale data.
+
+MemoryStateBackend is for tests and local runs. Its subscribe() stands in
+for the change stream: every write calls each subscriber with
+``(repo, pr_number, version)``, e.g. another StateStore's observe().
+DynamoDBStateBackend imports boto3 lazily and uses a
+``ConditionExpression`` on ``version``; in production a DynamoDB Streams
+consumer calls observe().
+
+Run this module to compare plain and versioned writes under contention,
+and cached and uncached reads for webhook bursts:
+
+    python state_store.py --threads 8 --updates 400
+"""
+
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+from typing import Mapping, NamedTuple, Optional
+
+from state_machine import State
+
+
+class VersionConflict(Exception):
+    """The record changed since it was read; raised by update() once retries run out."""
+
+
+class PRStateRecord(NamedTuple):
+    """One State Table record (§4)."""
+
+    repo: str
+    pr_number: int
+    current_state: State
+    last_event_timestamp: float
+    created_at: float
+    branch: str = ""
+    base_branch: str = "main"
+    vulnerability_id: Optional[str] = None
+    state_substatus: Optional[str] = None
+    retry_counts: Mapping[str, int] = {}
+    last_remediation_at: Optional[float] = None
+    remediation_action: Optional[str] = None
+    ttl: Optional[float] = None
+    version: int = 0  # 0 = never written
+
+    def bump_retry(self, key):
+        """A copy with ``retry_counts[key]`` incremented."""
+        counts = dict(self.retry_counts)
+        counts[key] = counts.get(key, 0) + 1
+        return self._replace(retry_counts=counts)
+
+
+class MemoryStateBackend:
+    def __init__(self, latency=0.0):
+        self.latency = latency  # seconds each way, to model a remote store
+        self._records = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.reads = 0
+        self.writes = 0
+
+    def subscribe(self, observer):
+        """Call ``observer(repo, pr_number, version)`` after every write, like a change stream."""
+        self._subscribers.append(observer)
+
+    def get(self, repo, pr_number):
+        with self._lock:
+            self.reads += 1
+            record = self._records.get((repo, pr_number))
+        if self.latency:
+            time.sleep(self.latency)
+        return record
+
+    def put(self, record, expected_version=None):
+        """Store ``record``. If ``expected_version`` is given, only when the stored version matches."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if expected_version is not None:
+                current = self._records.get((record.repo, record.pr_number))
+                if (current.version if current else 0) != expected_version:
+                    raise VersionConflict(f"{record.repo}#{record.pr_number}")
+            self._records[(record.repo, record.pr_number)] = record
+            self.writes += 1
+        for observer in self._subscribers:
+            observer(record.repo, record.pr_number, record.version)
+
+
+class DynamoDBStateBackend:
+    """State Table in DynamoDB: partition key ``pr`` ("repo#number")."""
+
+    def __init__(self, table_name, client=None):
+        if client is None:
+            import boto3  # optional dependency, only needed against AWS
+            client = boto3.client("dynamodb")
+        self.table_name = table_name
+        self._client = client
+        self._conditional_failed = client.exceptions.ConditionalCheckFailedException
+
+    def get(self, repo, pr_number):
+        item = self._client.get_item(TableName=self.table_name, Key={"pr": {"S": f"{repo}#{pr_number}"}},
+                                     ConsistentRead=True).get("Item")
+        if item is None:
+            return None
+        data = json.loads(item["record"]["S"])
+        return PRStateRecord(**dict(data, current_state=State[data["current_state"]],
+                                    version=int(item["version"]["N"])))
+
+    def put(self, record, expected_version=None):
+        data = record._asdict()
+        data["current_state"] = record.current_state.name
+        del data["version"]
+        kwargs = {}
+        if expected_version is not None:
+            kwargs = {
+                "ConditionExpression": "attribute_not_exists(pr) OR version = :expected",
+                "ExpressionAttributeValues": {":expected": {"N": str(expected_version)}},
+            }
+        try:
+            self._client.put_item(TableName=self.table_name, Item={
+                "pr": {"S": f"{record.repo}#{record.pr_number}"},
+                "version": {"N": str(record.version)},
+                "record": {"S": json.dumps(data)},
+            }, **kwargs)
+        except self._conditional_failed:
+            raise VersionConflict(f"{record.repo}#{record.pr_number}") from None
+
+
+class StateStore:
+    def __init__(self, backend, cache_size=10_000, max_attempts=5, backoff=0.005):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._cache = collections.OrderedDict()  # (repo, pr_number) → record, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    def _remember(self, record):
+        key = (record.repo, record.pr_number)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.version > record.version:
+                return  # a newer version is already cached
+            self._cache[key] = record
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, repo, pr_number, fresh=False):
+        """The PR's record, from the cache unless ``fresh``; None if there is none."""
+        key = (repo, pr_number)
+        if not fresh:
+            with self._lock:
+                record = self._cache.get(key)
+                if record is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return record
+        self.misses += 1
+        record = self.backend.get(repo, pr_number)
+        if record is not None:
+            self._remember(record)
+        return record
+
+    def update(self, repo, pr_number, change):
+        """Apply ``change(record)`` and write it conditionally; return the stored record.
+
+        ``change`` receives the current record, or None if the PR has none,
+        and returns the new record. It returns None to leave the record alone.
+        It may run several times, so it must not have side effects.
+        """
+        record, fresh = self.get(repo, pr_number), False
+        attempt = 0
+        while attempt < self.max_attempts:
+            updated = change(record)
+            if updated is None:
+                if fresh:
+                    return record
+                # The cached record may be stale: decide again on the stored one.
+                record, fresh = self.get(repo, pr_number, fresh=True), True
+                continue
+            expected = record.version if record is not None else 0
+            updated = updated._replace(version=expected + 1)
+            try:
+                self.backend.put(updated, expected_version=expected)
+            except VersionConflict:
+                self.conflicts += 1
+                attempt += 1
+                if attempt < self.max_attempts:
+                    time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+                record, fresh = self.get(repo, pr_number, fresh=True), True
+                continue
+            self._remember(updated)
+            return updated
+        raise VersionConflict(f"{repo}#{pr_number}: gave up after {self.max_attempts} attempts")
+
+    def observe(self, repo, pr_number, version=None):
+        """Event stream hook: drop the cached record if it is older than ``version`` (or always, if None)."""
+        key = (repo, pr_number)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and (version is None or cached.version < version):
+                del self._cache[key]
+
+
+def _contention(threads, updates, versioned):
+    """Event Processor and reconciler threads bump retry counts on a few shared PRs."""
+    backend = MemoryStateBackend(latency=0.0002)
+    prs = 4
+    for pr_number in range(prs):
+        backend.put(PRStateRecord("codegenie/service", pr_number, State.CHECKS_FAILED, 0.0, 0.0, version=1))
+
+    def worker(seed):
+        rng = random.Random(seed)
+        store = StateStore(backend, max_attempts=1000)  # one per process in production
+        for _ in range(updates):
+            pr_number = rng.randrange(prs)
+            if versioned:
+                store.update("codegenie/service", pr_number, lambda r: r.bump_retry("rebuild"))
+            else:
+                record = backend.get("codegenie/service", pr_number)
+                backend.put(record.bump_retry("rebuild"))
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    stored = sum(backend.get("codegenie/service", n).retry_counts.get("rebuild", 0) for n in range(prs))
+    return threads * updates - stored
+
+
+def _burst_reads(prs, events_per_pr, cached):
+    backend = MemoryStateBackend()
+    store = StateStore(backend, cache_size=prs if cached else 0)
+    for pr_number in range(prs):
+        backend.put(PRStateRecord("codegenie/service", pr_number, State.CREATED, 0.0, 0.0, version=1))
+    for pr_number in range(prs):
+        for n in range(events_per_pr):
+            store.update("codegenie/service", pr_number,
+                         lambda r, t=float(n): r._replace(current_state=State.CHECKS_RUNNING, last_event_timestamp=t))
+    return backend.reads
+
+
+def _two_stores():
+    """Two processes' stores on one backend: reads see the other's writes once the stream is wired."""
+    backend = MemoryStateBackend()
+    processor, reconciler = StateStore(backend), StateStore(backend)
+    processor.update("codegenie/service", 1, lambda r: PRStateRecord("codegenie/service", 1, State.CREATED, 0.0, 0.0))
+    assert reconciler.get("codegenie/service", 1).current_state is State.CREATED  # now cached
+    processor.update("codegenie/service", 1, lambda r: r._replace(current_state=State.CHECKS_RUNNING))
+    # Unwired, the cache is stale, but a no-op update still decides on the stored record.
+    no_op = reconciler.update("codegenie/service", 1, lambda r: None)
+    assert no_op.current_state is State.CHECKS_RUNNING, no_op
+    backend.subscribe(reconciler.observe)
+    processor.update("codegenie/service", 1, lambda r: r._replace(current_state=State.CHECKS_FAILED))
+    assert reconciler.get("codegenie/service", 1).current_state is State.CHECKS_FAILED
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--updates", type=int, default=400, help="updates per thread")
+    parser.add_argument("--prs", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=12, help="webhook events per PR")
+    args = parser.parse_args(argv)
+
+    total = args.threads * args.updates
+    for label, versioned in (("plain put", False), ("versioned", True)):
+        lost = _contention(args.threads, args.updates, versioned)
+        print(f"  {label:<10} {total} concurrent retry-count updates: {lost} lost")
+    for label, cached in (("uncached", False), ("cached", True)):
+        reads = _burst_reads(args.prs, args.burst, cached)
+        print(f"  {label:<10} {args.prs} PRs × {args.burst} webhook updates: {reads} storage reads")
+    _two_stores()
+    print("  two stores on one backend: no-op updates re-read; observe() keeps the other's cache current")
+
+
+if __name__ == "__main__":
+    main()
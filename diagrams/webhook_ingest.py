@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Webhook ingestion in front of the Event Processor (logical flow §13).
+
+§13 STEP 6 detects duplicate deliveries only after the State Table lookup
+and the transition check, so every GitHub redelivery still costs a read
+and a write. WebhookIngestor moves that work to the front and batches
+what remains:
+
+1. IdempotencyIndex drops duplicates before any storage read. It is keyed
+   on the ``X-GitHub-Delivery`` ID, which GitHub keeps when it redelivers,
+   or on the STEP 6 composite key when there is no ID. It is an exact set
+   of the keys processed in the last ``ttl`` seconds, at most ``capacity``
+   of them, dropped oldest first. A duplicate whose key has already been
+   dropped gets through, and STEP 6 still catches it.
+2. Deliveries are grouped into per-PR micro-batches, each in arrival
+   order. The batcher flushes after ``max_pending`` events or
+   ``flush_interval`` seconds. A burst of check_run events for one PR then
+   becomes one State Table read-modify-write (apply_events()).
+
+A key enters the index only once its batch has been processed. If
+``process_batch`` raises, that batch and every batch not yet processed
+stay queued for the next flush, so their redeliveries are still dropped
+while queued and never lost.
+
+Run this module to replay a webhook trace through the per-event path and
+through the ingestor. ``--trace`` reads JSONL records with ``delivery_id``,
+``repo``, ``pr_number``, ``event_type`` and ``timestamp``; without it, a
+trace with check_run bursts and a redelivery storm is generated:
+
+    python webhook_ingest.py --prs 2000 --redeliver 0.5
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import NamedTuple, Optional
+
+from history_summary import EVENT_STATES
+from state_machine import State, is_valid_transition
+
+
+class Delivery(NamedTuple):
+    delivery_id: Optional[str]  # X-GitHub-Delivery; None for sources without one
+    repo: str
+    pr_number: int
+    event_type: str
+    timestamp: float
+
+    @property
+    def key(self):
+        """Idempotency key: the delivery ID, else the §13 STEP 6 composite key."""
+        if self.delivery_id is not None:
+            return self.delivery_id
+        return f"{self.repo}#{self.pr_number}#{self.event_type}#{self.timestamp!r}"
+
+
+class IdempotencyIndex:
+    """Keys recorded in the last ``ttl`` seconds, at most ``capacity`` of them, oldest dropped first."""
+
+    def __init__(self, capacity=100_000, ttl=3600.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self._recent = collections.OrderedDict()  # key → recorded at, oldest first
+
+    def __len__(self):
+        return len(self._recent)
+
+    def _expire(self, now):
+        recent = self._recent
+        while recent and (len(recent) > self.capacity or now - next(iter(recent.values())) >= self.ttl):
+            recent.popitem(last=False)
+
+    def seen(self, key):
+        """Whether ``key`` was recorded within the TTL."""
+        self._expire(self.clock())
+        return key in self._recent
+
+    def record(self, keys):
+        """Record ``keys`` as processed."""
+        now = self.clock()
+        recent = self._recent
+        for key in keys:
+            recent.pop(key, None)
+            recent[key] = now
+        self._expire(now)
+
+
+class WebhookIngestor:
+    """Deduplicates deliveries and hands ``process_batch(repo, pr_number, deliveries)`` one call per PR."""
+
+    def __init__(self, process_batch, index=None, max_pending=500, flush_interval=0.05, clock=time.monotonic):
+        self.process_batch = process_batch
+        self.index = index if index is not None else IdempotencyIndex(clock=clock)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._batches = {}  # (repo, pr_number) → deliveries in arrival order; dict keeps first-arrival order
+        self._queued = set()  # keys of the deliveries in _batches
+        self._pending = 0
+        self._oldest = None
+        self.batches = 0
+        self.duplicates = 0
+
+    def ingest(self, delivery):
+        """Queue ``delivery``; False if it was a duplicate and dropped."""
+        key = delivery.key
+        if key in self._queued or self.index.seen(key):
+            self.duplicates += 1
+            return False
+        self._queued.add(key)
+        self._batches.setdefault((delivery.repo, delivery.pr_number), []).append(delivery)
+        self._pending += 1
+        if self._oldest is None:
+            self._oldest = self.clock()
+        if self._pending >= self.max_pending:
+            self.flush()
+        return True
+
+    def poll(self):
+        """Flush if the oldest queued delivery has waited ``flush_interval``; call it from the receive loop."""
+        if self._oldest is not None and self.clock() - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Process every queued batch. If one raises, it and the rest stay queued and the error propagates."""
+        batches, self._batches = list(self._batches.items()), {}
+        oldest, self._pending, self._oldest = self._oldest, 0, None
+        for n, ((repo, pr_number), deliveries) in enumerate(batches):
+            try:
+                self.process_batch(repo, pr_number, deliveries)
+            except Exception:
+                self._requeue(batches[n:], oldest)
+                raise
+            keys = [d.key for d in deliveries]
+            self.index.record(keys)
+            self._queued.difference_update(keys)
+            self.batches += 1
+
+    def _requeue(self, batches, oldest):
+        queued, self._batches = self._batches, dict(batches)
+        for pr, deliveries in queued.items():
+            self._batches.setdefault(pr, []).extend(deliveries)
+        self._pending = sum(map(len, self._batches.values()))
+        self._oldest = oldest if oldest is not None else self.clock()
+
+
+def apply_events(state, last_event_timestamp, deliveries):
+    """Fold deliveries into a PR's ``(state, last_event_timestamp)`` as §13 STEPS 2–4 do.
+
+    Returns the new pair and the number of anomalous transitions. Events
+    that imply the current state only refresh the timestamp. MERGED and
+    CLOSED PRs ignore late events.
+    """
+    anomalies = 0
+    for d in deliveries:
+        target = EVENT_STATES.get(d.event_type)
+        if target is None:
+            continue
+        if state is None:
+            if d.event_type == "PR_OPENED":
+                state, last_event_timestamp = target, d.timestamp
+            continue
+        if state in (State.MERGED, State.CLOSED):
+            break
+        if target == state:
+            last_event_timestamp = d.timestamp
+        elif is_valid_transition(state, target):
+            state, last_event_timestamp = target, d.timestamp
+        else:
+            anomalies += 1
+    return state, last_event_timestamp, anomalies
+
+
+class _StateTable:
+    """State Table subset in SQLite, counting reads and writes."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE pr_state (repo TEXT, pr_number INTEGER, current_state INTEGER,"
+                        " last_event_timestamp REAL, PRIMARY KEY (repo, pr_number))")
+        self.db.execute("CREATE TABLE deliveries (key TEXT PRIMARY KEY)")
+        self.reads = self.writes = self.anomalies = 0
+
+    def get(self, repo, pr_number):
+        self.reads += 1
+        row = self.db.execute("SELECT current_state, last_event_timestamp FROM pr_state"
+                              " WHERE repo = ? AND pr_number = ?", (repo, pr_number)).fetchone()
+        return (State(row[0]), row[1]) if row else (None, None)
+
+    def put(self, repo, pr_number, state, last_event_timestamp, delivery_keys):
+        self.writes += 1
+        with_state = state is not None
+        self.db.execute("BEGIN")
+        if with_state:
+            self.db.execute("INSERT OR REPLACE INTO pr_state VALUES (?, ?, ?, ?)",
+                            (repo, pr_number, int(state), last_event_timestamp))
+        self.db.executemany("INSERT OR IGNORE INTO deliveries VALUES (?)", [(k,) for k in delivery_keys])
+        self.db.execute("COMMIT")
+
+    def is_duplicate(self, key):
+        self.reads += 1
+        return self.db.execute("SELECT 1 FROM deliveries WHERE key = ?", (key,)).fetchone() is not None
+
+    def snapshot(self):
+        return self.db.execute("SELECT * FROM pr_state ORDER BY repo, pr_number").fetchall()
+
+
+def replay_per_event(table, trace):
+    """Every delivery: State Table read, transition check, STEP 6 duplicate check, write."""
+    for d in trace:
+        state, last = table.get(d.repo, d.pr_number)
+        if table.is_duplicate(d.key):
+            continue
+        state, last, anomalies = apply_events(state, last, [d])
+        table.anomalies += anomalies
+        table.put(d.repo, d.pr_number, state, last, [d.key])
+
+
+def replay_ingested(table, trace, max_pending):
+    def process_batch(repo, pr_number, deliveries):
+        state, last = table.get(repo, pr_number)
+        state, last, anomalies = apply_events(state, last, deliveries)
+        table.anomalies += anomalies
+        table.put(repo, pr_number, state, last, [d.key for d in deliveries])
+
+    ingestor = WebhookIngestor(process_batch, max_pending=max_pending)
+    for d in trace:
+        ingestor.ingest(d)
+    ingestor.flush()
+    return ingestor
+
+
+def synthetic_trace(prs, checks, redeliver, seed=9):
+    """Every PR's lifecycle, with a burst of ``checks`` check_run deliveries.
+
+    A ``redeliver`` share of all deliveries is sent again shortly after.
+    """
+    rng = random.Random(seed)
+    lifecycle = (["PR_OPENED"] + ["CHECKS_STARTED"] * checks
+                 + ["CHECKS_PASSED", "POLICY_STARTED", "POLICY_PASSED", "APPROVAL_GRANTED",
+                    "MERGE_ATTEMPTED", "MERGE_SUCCEEDED"])
+    trace = []
+    for pr_number in range(prs):
+        t = rng.uniform(0, 600)
+        for n, event_type in enumerate(lifecycle):
+            t += rng.uniform(0.01, 0.2) if event_type == "CHECKS_STARTED" else rng.uniform(1, 30)
+            trace.append((t, Delivery(f"{pr_number}-{n}", "codegenie/service", pr_number, event_type, 1.7e9 + t)))
+    storm = [(t + rng.uniform(0.5, 30), d) for t, d in trace if rng.random() < redeliver]
+    return [d for _, d in sorted(trace + storm, key=lambda pair: pair[0])]
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [Delivery(r.get("delivery_id"), r["repo"], int(r["pr_number"]), r["event_type"], float(r["timestamp"]))
+                for r in map(json.loads, f)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="JSONL webhook trace to replay")
+    parser.add_argument("--prs", type=int, default=2000)
+    parser.add_argument("--checks", type=int, default=12, help="check_run deliveries per PR")
+    parser.add_argument("--redeliver", type=float, default=0.5, help="share of deliveries sent twice")
+    parser.add_argument("--max-pending", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.prs, args.checks, args.redeliver)
+    snapshots = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for label in ("per event", "ingestor"):
+            table = _StateTable(os.path.join(directory, f"{label.replace(' ', '_')}.db"))
+            start = time.perf_counter()
+            if label == "per event":
+                replay_per_event(table, trace)
+                detail = ""
+            else:
+                ingestor = replay_ingested(table, trace, args.max_pending)
+                detail = f"  ({ingestor.duplicates} duplicates dropped before storage)"
+            seconds = time.perf_counter() - start
+            snapshots[label] = table.snapshot()
+            print(f"  {label:<10} {len(trace) / seconds:10,.0f} deliveries/s  {table.reads:7d} reads"
+                  f"  {table.writes:7d} writes{detail}")
+            table.db.close()
+    assert snapshots["per event"] == snapshots["ingestor"], "final State Table differs"
+    print(f"  {len(trace)} deliveries for {len(snapshots['ingestor'])} PRs: same final State Table")
+
+    # A failing batch stays queued with the ones after it; its redelivery is still dropped meanwhile.
+    processed, fail = [], [True]
+
+    def flaky(repo, pr_number, deliveries):
+        if pr_number == 1 and fail:
+            fail.pop()
+            raise RuntimeError("State Table unavailable")
+        processed.extend(d.key for d in deliveries)
+
+    ingestor = WebhookIngestor(flaky, max_pending=100)
+    sample = [Delivery(f"d{n}", "codegenie/service", n % 3, "CHECKS_STARTED", 1.7e9 + n) for n in range(6)]
+    for d in sample:
+        ingestor.ingest(d)
+    try:
+        ingestor.flush()
+    except RuntimeError:
+        pass
+    assert not ingestor.ingest(sample[1]), "a queued delivery was accepted twice"
+    ingestor.flush()
+    assert sorted(processed) == sorted(d.key for d in sample) and all(ingestor.index.seen(d.key) for d in sample)
+    print("  failed batch: requeued with the batches after it, processed once on the next flush")
+
+
+if __name__ == "__main__":
+    main()